@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+import sys
+
+from benchmarks.programs import PROGRAMS, generate
+from benchmarks.runner import DEFAULT_THRESHOLD, ENGINES, compare, \
+    run_benchmarks
+
+
+parser = argparse.ArgumentParser(
+    prog="python -m benchmarks",
+    description="Generates large Piet programs with known behavior, runs "
+    "them and reports how fast they load and run, comparing the results "
+    "with a baseline, if given")
+
+parser.add_argument("names", metavar="NAME", nargs="*",
+                    choices=[[], *PROGRAMS],
+                    help="benchmarks to run (default: all of "
+                    f"{', '.join(PROGRAMS)})")
+
+parser.add_argument("-e", "--engine", choices=ENGINES, default="table",
+                    help="execution engine (default: table)")
+
+parser.add_argument("-r", "--repeat", type=int, default=3,
+                    help="runs of every benchmark, the fastest of which is "
+                    "reported (default: 3)")
+
+parser.add_argument("--quick", action="store_true",
+                    help="use small programs, to check that everything "
+                    "works")
+
+parser.add_argument("--no-memory", action="store_true",
+                    help="don't measure the peak memory, which takes "
+                    "another, slower run")
+
+parser.add_argument("-o", "--output", metavar="FILE", type=str,
+                    help="save the results as JSON to FILE")
+
+parser.add_argument("-b", "--baseline", metavar="FILE", type=str,
+                    help="compare the results with ones saved to FILE")
+
+parser.add_argument("-t", "--threshold", type=float,
+                    default=DEFAULT_THRESHOLD,
+                    help="relative change reported as a regression "
+                    f"(default: {DEFAULT_THRESHOLD})")
+
+parser.add_argument("--save-images", metavar="DIR", type=str,
+                    help="also save the generated programs as PNG to DIR")
+
+
+def main(args):
+    if args.repeat <= 0:
+        sys.exit("Invalid number of runs (must be positive)")
+    baseline = None
+    if args.baseline is not None:
+        try:
+            with open(args.baseline) as file:
+                baseline = json.load(file)
+        except (OSError, ValueError) as e:
+            sys.exit(f"Couldn't read baseline - {e}")
+
+    benchmarks = list(generate(args.names, args.quick))
+    if args.save_images is not None:
+        os.makedirs(args.save_images, exist_ok=True)
+        for benchmark in benchmarks:
+            benchmark.to_image().save(
+                os.path.join(args.save_images, f"{benchmark.name}.png"))
+
+    results = run_benchmarks(benchmarks, args.engine, args.repeat,
+                             not args.no_memory)
+    for name, result in results["benchmarks"].items():
+        memory = "" if result["peak_memory"] is None \
+            else f", peak memory {result['peak_memory'] / 2 ** 20:.1f} MiB"
+        phases = ", ".join(f"{phase} {seconds:.3f}s"
+                           for phase, seconds in result["phases"].items())
+        print(f"{name}: {result['steps']} steps, "
+              f"{result['steps_per_second'] or 0:.0f} steps/s, "
+              f"load {result['load_time']:.3f}s{memory} ({phases})"
+              + ("" if result["correct"] else ", WRONG RESULT"))
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if baseline is not None:
+        if baseline.get("engine") != results["engine"]:
+            print(f"[SYS] the baseline was run with the "
+                  f"{baseline.get('engine')} engine")
+        lines, regressed = compare(results, baseline, args.threshold)
+        print("compared with the baseline:")
+        for line in lines:
+            print("  " + line)
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(parser.parse_args())
@@ -0,0 +1,303 @@
+import io
+import math
+
+import numpy as np
+from PIL import Image
+
+from piet_vitvit.piet_colors import HEX_COLORS, HEX_WHITE, HEX_BLACK, \
+    COLOR_WHITE, COLOR_BLACK
+from piet_vitvit.piet_engine import COMMAND_NAMES
+
+
+# RGB of every color index
+PALETTE = np.array([[int(hex_code[i:i + 2], 16) for i in (1, 3, 5)]
+                    for hex_code in [*HEX_COLORS, HEX_WHITE, HEX_BLACK]],
+                   dtype=np.uint8)
+
+# color of the first block of every program
+START_COLOR = 6
+
+
+class PietBenchmark:
+    def __init__(self, name, matrix, limit, output=None, stack=None):
+        # a program as a matrix of color indices, run for at most limit
+        # steps, and, if known, the output and the stack it ends with
+        self.name = name
+        self.matrix = matrix
+        self.limit = limit
+        self.output = output
+        self.stack = stack
+
+    def to_image(self, codel_size=1):
+        pixels = PALETTE[self.matrix]
+        if codel_size > 1:
+            pixels = pixels.repeat(codel_size, 0).repeat(codel_size, 1)
+        return Image.fromarray(pixels, "RGB")
+
+    def to_png(self, codel_size=1):
+        data = io.BytesIO()
+        self.to_image(codel_size).save(data, "PNG")
+        return data.getvalue()
+
+
+def huge_block(size=1000, limit=200000):
+    # a size x size image of one block, but for its last column, which is
+    # another block; the execution moves between them forever, pushing the
+    # size of the large one and popping it
+    matrix = np.full((size, size), START_COLOR, dtype=np.uint8)
+    matrix[:, -1] = _get_next_color(START_COLOR, "push")
+    return PietBenchmark("huge_block", matrix, limit)
+
+
+def nested_loops(count=300):
+    # count times an outer loop runs an inner one count times, with
+    # [inner count, outer counter, inner counter] on the stack, and
+    # prints the inner count at the end
+    canvas = _Canvas()
+    left = canvas.start(count, ["push", "dup", "dup"])
+    # inner loop: decrements its counter, and once it is 0, turns down,
+    # far enough from the ring's side for the outer loop's exit to fit
+    x, color = canvas.chain(left, 0, START_COLOR, ["push", "pop"] + _TEST,
+                            first=True)
+    turn = x - 1
+    # outer loop: drops the inner counter, decrements its own, and unless
+    # it is 0, pushes the inner count again and goes back to the inner loop
+    # through the ring's left side
+    _, y, outer = canvas.line(turn, 1, 0, 1, color, ["pop"] + _TEST)
+    canvas.exit(turn, y - 1, -1, 0, outer, ["pop", "outnum"])
+    commands = ["push", "dup", "add", "push", "roll", "dup",
+                "push", "dup", "dup", "add", "add", "push", "roll"]
+    # the ring's left side is entered with push and left with pop
+    target = _get_prev_color(_get_prev_color(START_COLOR, "pop"), "push")
+    bottom = y + len(commands) - 1
+    while True:
+        steps = bottom - y + 1 + turn - left - 1
+        padding = _pad(_follow(outer, commands), steps - len(commands),
+                       target)
+        if padding is not None:
+            break
+        bottom += 1
+    commands += padding + ["push"]
+    _, _, outer = canvas.line(turn, y, 0, 1, outer,
+                              commands[:bottom - y + 1])
+    canvas.line(turn - 1, bottom, -1, 0, outer,
+                commands[bottom - y + 1:-1])
+    canvas.ring(left, x, color, turn + 2, bottom + 2)
+    return PietBenchmark("nested_loops", canvas.get_matrix(),
+                         count * count * 30 + count * 60 + 100,
+                         str(count).encode(), [])
+
+
+def white_corridors(count=5000, length=1000):
+    # a loop run count times, turning at two of its corners by sliding
+    # through white corridors of the given length
+    canvas = _Canvas()
+    left = canvas.start(count, ["push"])
+    x, color = canvas.chain(left, 0, START_COLOR, _TEST, first=True)
+    bottom = canvas.exit(x - 1, 0, 0, 1, color, ["pop", "pop"]) + 2
+    right = canvas.ring(left, x, color, x + 2, bottom)
+    # a slide ends with DP turned once it reaches a colored codel
+    canvas.fill(right + 1, 0, length, 1, COLOR_WHITE)
+    canvas.fill(right + length, 1, 1, 1, START_COLOR)
+    canvas.fill(right, bottom + 1, 1, length, COLOR_WHITE)
+    canvas.fill(right - 1, bottom + length, 1, 1, START_COLOR)
+    return PietBenchmark("white_corridors", canvas.get_matrix(),
+                         count * 30 + 100, b"", [])
+
+
+def deep_rolls(count=2000, depth=1000):
+    # count times rolls the top depth values of the stack, filled with
+    # copies of count, down by one and back up, keeping the counter on top
+    canvas = _Canvas()
+    left = canvas.start(count, ["push"] + ["dup"] * depth)
+    x, color = canvas.chain(left, 0, START_COLOR, _TEST, first=True)
+    bottom = canvas.exit(x - 1, 0, 0, 1, color, ["pop", "pop"])
+    # the large blocks are kept apart from the exit
+    x, color = canvas.chain(x, 0, color, [
+        "push", "pop", "push", ("pop", depth), "push", "push", "roll",
+        "push", ("pop", depth), "push", "dup", "push", "sub", "roll"])
+    canvas.ring(left, x, color, x + 1,
+                max(bottom, _get_height(depth) - 1) + 2)
+    return PietBenchmark("deep_rolls", canvas.get_matrix(),
+                         count * 40 + depth + 100, b"", [count] * (depth - 1))
+
+
+def printer(count=20000):
+    # prints the numbers from count - 1 down to 1, a line each
+    canvas = _Canvas()
+    left = canvas.start(count, ["push"])
+    x, color = canvas.chain(left, 0, START_COLOR, _TEST, first=True)
+    bottom = canvas.exit(x - 1, 0, 0, 1, color, ["pop", "pop"])
+    x, color = canvas.chain(x, 0, color, [
+        "dup", "outnum", "push", ("pop", ord("\n")), "push", "outchar"])
+    canvas.ring(left, x, color, x + 1,
+                max(bottom, _get_height(ord("\n")) - 1) + 2)
+    output = "".join(f"{number}\n" for number in range(count - 1, 0, -1))
+    return PietBenchmark("printer", canvas.get_matrix(), count * 30 + 100,
+                         output.encode(), [])
+
+
+# programs and the sizes they are generated with by default and for a
+# quick check
+PROGRAMS = {
+    "huge_block": (huge_block, {}, {"size": 60, "limit": 1000}),
+    "nested_loops": (nested_loops, {}, {"count": 10}),
+    "white_corridors": (white_corridors, {}, {"count": 20, "length": 30}),
+    "deep_rolls": (deep_rolls, {}, {"count": 30, "depth": 20}),
+    "printer": (printer, {}, {"count": 50}),
+    }
+
+
+def generate(names=None, quick=False):
+    for name in names or PROGRAMS:
+        function, options, quick_options = PROGRAMS[name]
+        yield function(**(quick_options if quick else options))
+
+
+# decrements the counter on top of the stack and turns clockwise once it
+# is 0
+_TEST = ["push", "sub", "dup", "not", "pointer"]
+
+# commands, which leave the stack as it was
+_NEUTRAL = [["push", "pop"], ["dup", "pop"], ["push", "not", "pop"],
+            ["push", "push", "add", "pop"], ["push", "dup", "add", "pop"]]
+
+
+class _Canvas:
+    # codels of a program being laid out, black unless set; the execution
+    # goes along chains of blocks, turning clockwise wherever it can't go
+    # straight, and white never takes it anywhere
+    def __init__(self):
+        self.codels = {}
+
+    def fill(self, x, y, width, height, color):
+        for row in range(y, y + height):
+            for col in range(x, x + width):
+                if (col, row) in self.codels:
+                    raise ValueError(f"codel {col, row} is already set")
+                self.codels[(col, row)] = color
+
+    def block(self, x, y, size, color):
+        # a block of size codels, with its top-left one at (x, y) and its
+        # top row full, returns the x after it and its height
+        width = math.isqrt(size - 1) + 1
+        self.fill(x, y, width, size // width, color)
+        self.fill(x, y + size // width, size % width, 1, color)
+        return x + width, _get_height(size)
+
+    def start(self, size, commands):
+        # the first block, of the given size, followed by the commands,
+        # and neutral ones leading to a codel of the same color, which
+        # starts the main loop, returns its x
+        x, _ = self.block(0, 0, size, START_COLOR)
+        color = _follow(START_COLOR, commands)
+        length = 2
+        while _pad(color, length, START_COLOR) is None:
+            length += 1
+        commands = commands + _pad(color, length, START_COLOR)
+        x, _ = self.chain(x, 0, START_COLOR, commands[:-1])
+        return x
+
+    def chain(self, x, y, color, commands, first=False):
+        # blocks to the right of a block of the given color, each entered
+        # with a command, which may be given with the size of the block
+        # it enters; with first, the chain starts with a codel of that
+        # color at (x, y); returns the x after the chain and its last color
+        if first:
+            self.fill(x, y, 1, 1, color)
+            x += 1
+        for command in commands:
+            command, size = command if isinstance(command, tuple) \
+                else (command, 1)
+            color = _get_next_color(color, command)
+            x, _ = self.block(x, y, size, color)
+        return x, color
+
+    def line(self, x, y, dx, dy, color, commands):
+        # one-codel blocks from (x, y) on in the given direction, returns
+        # the codel after them and the last color
+        for command in commands:
+            color = _get_next_color(color, command)
+            self.fill(x, y, 1, 1, color)
+            x, y = x + dx, y + dy
+        return x, y, color
+
+    def exit(self, x, y, dx, dy, color, commands):
+        # leaves the block at (x, y) in the given direction along one-codel
+        # blocks into a 3 x 3 one, entered at the middle of a side, so that
+        # there is no way out of it; returns its bottom row
+        x, y, color = self.line(x + dx, y + dy, dx, dy, color,
+                                commands[:-1])
+        x, y = x + dx, y + dy
+        self.fill(x - 1, y - 1, 3, 3, _get_next_color(color, commands[-1]))
+        return y + 1
+
+    def ring(self, left, x, color, right, bottom):
+        # closes the chain along the top row from (left, 0) to x, ending
+        # with the given color, into a loop around the rectangle from
+        # (left, 0) to at least (right, bottom), each of its other sides
+        # one block; the commands added leave the stack as it was, and the
+        # left side is entered with push and left with pop; returns the
+        # right side's x
+        first = self.codels[(left, 0)]
+        steps = max(right - x + 1, 1)
+        while True:
+            padding = _pad(color, steps + 4, first)
+            if padding is not None:
+                break
+            steps += 1
+        right = x + steps - 1
+        x, _, color = self.line(x, 0, 1, 0, color, padding[:steps])
+        sides = [(right, 1, 1, bottom - 1), (right, bottom, 1, 1),
+                 (left + 1, bottom, right - left - 1, 1), (left, bottom, 1, 1)]
+        for command, side in zip(padding[steps:], sides):
+            color = _get_next_color(color, command)
+            self.fill(*side, color)
+        self.fill(left, 1, 1, bottom - 1, _get_next_color(color, "push"))
+        return right
+
+    def get_matrix(self):
+        cols = max(x for x, y in self.codels) + 1
+        rows = max(y for x, y in self.codels) + 1
+        matrix = np.full((rows, cols), COLOR_BLACK, dtype=np.uint8)
+        for (x, y), color in self.codels.items():
+            matrix[y, x] = color
+        return matrix
+
+
+def _pad(color, length, target):
+    # neutral commands, as many as given, after which the color changes to
+    # the target one, or None if there are none
+    paths = [{color: []}]
+    for size in range(1, length + 1):
+        paths.append({})
+        for commands in _NEUTRAL:
+            if len(commands) > size:
+                continue
+            for last, path in paths[size - len(commands)].items():
+                paths[size].setdefault(_follow(last, commands),
+                                       path + commands)
+    return paths[length].get(target)
+
+
+def _follow(color, commands):
+    for command in commands:
+        color = _get_next_color(color, command)
+    return color
+
+
+def _get_height(size):
+    width = math.isqrt(size - 1) + 1
+    return -(-size // width)
+
+
+def _get_next_color(color, command):
+    d_hue, d_light = divmod(COMMAND_NAMES.index("piet_" + command), 3)
+    light, hue = divmod(color, 6)
+    return (light + d_light) % 3 * 6 + (hue + d_hue) % 6
+
+
+def _get_prev_color(color, command):
+    d_hue, d_light = divmod(COMMAND_NAMES.index("piet_" + command), 3)
+    light, hue = divmod(color, 6)
+    return (light - d_light) % 3 * 6 + (hue - d_hue) % 6
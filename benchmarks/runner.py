@@ -0,0 +1,154 @@
+import io
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+
+from PIL import Image
+
+from piet_vitvit.piet_api import PietProgram
+from piet_vitvit.piet_blocks import PietBlocks
+from piet_vitvit.piet_engine import PietEngine, PietTransitions
+from piet_vitvit.piet_image import decode_codels
+from piet_vitvit.piet_interpreter import PietInterpreter
+from piet_vitvit.piet_jit import PietJIT
+from piet_vitvit.piet_optimizer import PietOptimizer
+from piet_vitvit.piet_slides import PietSlides
+from piet_vitvit.piet_vm import PietTrapped, PietVM
+
+
+ENGINES = ("table", "optimized", "jit", "step")
+# a relative change of a measure, past which it is reported as a regression
+DEFAULT_THRESHOLD = 0.1
+
+
+def run_benchmark(benchmark, engine="table", repeat=1, memory=True):
+    # the fastest of the given number of runs, and the peak memory of one
+    # more run, traced by tracemalloc, which slows it down
+    png = benchmark.to_png()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f"{benchmark.name}.png")
+        with open(path, "wb") as file:
+            file.write(png)
+        best = None
+        for _ in range(repeat):
+            phases, vm, steps = _measure(png, path, benchmark.limit, engine)
+            if best is None or sum(phases.values()) < sum(best[0].values()):
+                best = phases, vm, steps
+        peak = None
+        if memory:
+            tracemalloc.start()
+            try:
+                _measure(png, path, benchmark.limit, engine)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+    phases, vm, steps = best
+    output = vm.output.stream.getvalue()
+    load_time = sum(seconds for phase, seconds in phases.items()
+                    if phase != "run")
+    return {
+        "steps": steps,
+        "correct": (benchmark.output is None or output == benchmark.output)
+        and (benchmark.stack is None or vm.stack == benchmark.stack),
+        "steps_per_second": round(steps / phases["run"], 1)
+        if phases["run"] else None,
+        "load_time": round(load_time, 6),
+        "peak_memory": peak,
+        "phases": {phase: round(seconds, 6)
+                   for phase, seconds in phases.items()},
+        }
+
+
+def run_benchmarks(benchmarks, engine="table", repeat=1, memory=True):
+    return {
+        "engine": engine,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "benchmarks": {benchmark.name: run_benchmark(benchmark, engine,
+                                                     repeat, memory)
+                       for benchmark in benchmarks},
+        }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    # lines describing every benchmark found in both, and whether any of
+    # them got slower, or uses more memory, by more than the threshold
+    lines = []
+    regressed = False
+    for name, result in results["benchmarks"].items():
+        if name not in baseline["benchmarks"]:
+            continue
+        old = baseline["benchmarks"][name]
+        changes = []
+        for measure, worse in (("steps_per_second", -1), ("load_time", 1),
+                               ("peak_memory", 1)):
+            if not result.get(measure) or not old.get(measure):
+                continue
+            change = result[measure] / old[measure] - 1
+            flag = ""
+            if change * worse > threshold:
+                flag = " !"
+                regressed = True
+            changes.append(f"{measure} {change:+.1%}{flag}")
+        if not result["correct"]:
+            changes.append("wrong result !")
+            regressed = True
+        lines.append(f"{name}: " + ", ".join(changes))
+    return lines, regressed
+
+
+def _measure(png, path, limit, engine):
+    # returns the time every phase took, the VM and the steps done
+    phases = {}
+    started = time.perf_counter()
+    if engine == "step":
+        interpreter = PietInterpreter(path)
+        vm = interpreter.pvm = _get_vm()
+        phases["load"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        try:
+            for _ in range(limit):
+                interpreter.piet_step()
+        except PietTrapped:
+            pass
+        vm.output.flush()
+        phases["run"] = time.perf_counter() - started
+        return phases, vm, interpreter.step
+
+    matrix = decode_codels(Image.open(io.BytesIO(png)), 1)
+    phases["decode"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    rows, cols = matrix.shape
+    blocks = PietBlocks(matrix, cols, rows)
+    phases["blocks"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    program = PietProgram(PietTransitions(matrix, blocks,
+                                          PietSlides(matrix)))
+    phases["transitions"] = time.perf_counter() - started
+
+    vm = _get_vm()
+    table_engine = PietEngine(program.transitions, vm, *program.start_codel)
+    if engine == "optimized":
+        table_engine.optimizer = PietOptimizer(program.transitions)
+    elif engine == "jit":
+        table_engine.jit = PietJIT(program.transitions)
+    started = time.perf_counter()
+    try:
+        table_engine.run(limit)
+    except PietTrapped:
+        pass
+    phases["run"] = time.perf_counter() - started
+    return phases, vm, table_engine.step
+
+
+def _get_vm():
+    vm = PietVM(io.BytesIO(), io.BytesIO())
+    vm.input.interactive = False
+    vm.output.flush_policy = "full"
+    return vm
@@ -1,18 +1,139 @@
 import argparse
+import asyncio
+import json
+import os
 import sys
 
 
+# exit status of a program stopped by --detect-cycles
+EXIT_CYCLE = 3
+
+
 def log_error(message):
     print("<ERROR>: " + message)
     sys.exit(1)
 
 
 try:
-    from piet_vitvit import piet_interpreter
+    from piet_vitvit.piet_batch import read_manifest, run_batch
+    from piet_vitvit.piet_breakpoints import PietBreakpoints
+    from piet_vitvit.piet_cache import CACHE_DIR, PietCache
+    from piet_vitvit.piet_compiler import compile_program
+    from piet_vitvit.piet_engine import COMMAND_NAMES, PietBreak, \
+        PietCycle, PietEngine, PietTransitions
+    from piet_vitvit.piet_io import FLUSH_POLICIES, PietInput
+    from piet_vitvit.piet_jit import PietJIT
+    from piet_vitvit.piet_optimizer import PietOptimizer
+    from piet_vitvit.piet_prefix import PREFIX_STEPS, evaluate_prefix
+    from piet_vitvit.piet_recorder import KEYFRAME_EVERY, PietRecorder, \
+        PietReplay
+    from piet_vitvit.piet_server import PietServer
+    from piet_vitvit.piet_snapshot import SNAPSHOT_SUFFIX, \
+        PietSnapshotWriter, get_digest, load_snapshot
+    from piet_vitvit.piet_vm import PietMemoryExceeded, PietTrapped, \
+        PietVM
 except Exception as e:
     log_error(f"Couldn't find Piet interpreter module - {e}")
 
 
+def parse_codel(text):
+    try:
+        x, y = (int(part) for part in text.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"expected X,Y, got {text!r}") from None
+    return x, y
+
+
+batch_parser = argparse.ArgumentParser(
+    prog="piet_interpreter_task.py batch",
+    description="Runs Piet programs, listed in a manifest, in parallel, "
+    "printing a JSON line with the result of each one as it finishes")
+
+batch_parser.add_argument("manifest", metavar="MANIFEST", type=str,
+                          help="file with a JSON object per line: "
+                          "{\"image\": PATH, \"codel_size\": 1, "
+                          "\"input\": PATH, \"limit\": 10000}, "
+                          "or - to read it from the standard input")
+
+batch_parser.add_argument("-j", "--jobs", type=int, default=None,
+                          help="number of worker processes "
+                          "(default: number of CPUs)")
+
+batch_parser.add_argument("-l", "--limit", type=int, default=10000,
+                          help="maximum steps of a program, unless the "
+                          "manifest says otherwise (default: 10000)")
+
+batch_parser.add_argument("-t", "--timeout", type=float, default=None,
+                          help="maximum seconds a program may run, unless "
+                          "the manifest says otherwise (default: none)")
+
+batch_parser.add_argument("--no-cache", action="store_true",
+                          help="don't use the cache of compiled programs")
+
+
+serve_parser = argparse.ArgumentParser(
+    prog="piet_interpreter_task.py serve",
+    description="Runs Piet programs sent over HTTP: POST /run with a JSON "
+    "object {\"image\": BASE64, \"codel_size\": 1, \"input\": TEXT, "
+    "\"limit\": STEPS, \"timeout\": SECONDS}, GET /metrics for "
+    "statistics")
+
+serve_parser.add_argument("--host", type=str, default="127.0.0.1",
+                          help="address to listen on (default: 127.0.0.1)")
+
+serve_parser.add_argument("--port", type=int, default=8080,
+                          help="port to listen on (default: 8080)")
+
+serve_parser.add_argument("--unix", metavar="PATH", type=str,
+                          help="listen on a unix socket at PATH instead")
+
+serve_parser.add_argument("-j", "--jobs", type=int, default=None,
+                          help="number of worker processes "
+                          "(default: number of CPUs)")
+
+serve_parser.add_argument("-q", "--queue", type=int, default=64,
+                          help="programs that may wait for a worker, "
+                          "others are refused with 503 (default: 64)")
+
+serve_parser.add_argument("--cache-size", type=int, default=128,
+                          help="compiled programs kept in memory "
+                          "(default: 128)")
+
+serve_parser.add_argument("-l", "--limit", type=int, default=10000,
+                          help="maximum steps of a program (default: 10000)")
+
+serve_parser.add_argument("-t", "--timeout", type=float, default=10.0,
+                          help="maximum seconds a program may run "
+                          "(default: 10)")
+
+
+replay_parser = argparse.ArgumentParser(
+    prog="piet_interpreter_task.py replay",
+    description="Goes back and forth through the steps of a program "
+    "recorded with --record, without running it: ENTER or n goes to the "
+    "next step, p to the previous one, g STEP to any step, q quits")
+
+replay_parser.add_argument("trace", metavar="TRACE", type=str,
+                           help="file the program was recorded to")
+
+replay_parser.add_argument("-g", "--goto", metavar="STEP", type=int,
+                           help="step to start at (default: the first one)")
+
+
+def open_interpreter(args, lazy=False):
+    # imported only when needed, so that cached programs run without PIL
+    try:
+        from piet_vitvit import piet_interpreter
+    except Exception as e:
+        log_error(f"Couldn't find Piet interpreter module - {e}")
+    try:
+        return piet_interpreter.PietInterpreter(args.filename, args.size,
+                                                args.tiled or None, lazy)
+    except FileNotFoundError:
+        log_error(f"Couldn't find Piet code image at PATH provided")
+
+
 parser = argparse.ArgumentParser(
     description="Executes a program, written in Piet language")
 
@@ -31,47 +152,588 @@ parser.add_argument("-l", "--limit", type=int, default=10000,
 parser.add_argument("-d", "--debug", action="store_true",
                     help="run the code in debug mode")
 
-parser.add_argument("-bp", "--breakpoint", type=int, default=1,
+parser.add_argument("-e", "--engine", choices=["table", "step"],
+                    default="table",
+                    help="execution engine: precomputed transition table, "
+                    "or the step-by-step reference interpreter, which is "
+                    "always used in debug mode (default: table)")
+
+parser.add_argument("--tiled", action="store_true",
+                    help="decode the image in tiles, only where the "
+                    "program goes (default: only for very large images)")
+
+parser.add_argument("-c", "--compile", metavar="OUT", type=str,
+                    help="instead of running the code, compile it into a "
+                    "standalone Python module at path OUT")
+
+parser.add_argument("-a", "--analyze", action="store_true",
+                    help="instead of running the code, find the blocks it "
+                    "can reach and report the unreachable area, trap states "
+                    "and blocks with no exit")
+
+parser.add_argument("--cfg", metavar="OUT", type=str,
+                    help="with --analyze, save the graph of the reachable "
+                    "blocks to OUT, as JSON if it ends with .json, "
+                    "otherwise in the DOT format")
+
+parser.add_argument("-i", "--input", metavar="FILE", type=str,
+                    help="read the program's input from FILE instead of "
+                    "the standard input")
+
+parser.add_argument("--flush", choices=FLUSH_POLICIES,
+                    help="when to flush the program's output: after every "
+                    "command, after a newline, or once the buffer is full "
+                    "(default: after a newline in a terminal, otherwise "
+                    "once the buffer is full)")
+
+parser.add_argument("-O", "--optimize", action="store_true",
+                    help="replace straight runs of stack commands with "
+                    "superinstructions, folding constants (table engine only)")
+
+parser.add_argument("-J", "--jit", action="store_true",
+                    help="compile hot loops into Python functions, which run "
+                    "them while their guards hold (table engine only)")
+
+parser.add_argument("--report", action="store_true",
+                    help="print how many commands the superinstructions "
+                    "eliminated, or how many steps the compiled loops did, "
+                    "when the execution ends")
+
+parser.add_argument("--detect-cycles", action="store_true",
+                    help="stop as soon as the program is found to loop "
+                    "forever without input or output, with exit status "
+                    f"{EXIT_CYCLE} (table engine only)")
+
+parser.add_argument("--max-depth", metavar="N", type=int,
+                    help="end the program once its stack holds more than N "
+                    "values")
+
+parser.add_argument("--max-bits", metavar="N", type=int,
+                    help="end the program once a value on its stack takes "
+                    "more than N bits")
+
+parser.add_argument("--checkpoint-every", metavar="N", type=int,
+                    help="save the state of the program every N steps, to "
+                    "be resumed with --resume if the run is cut short")
+
+parser.add_argument("--checkpoint", metavar="FILE", type=str,
+                    help="where to save the state of the program "
+                    f"(default: PATH{SNAPSHOT_SUFFIX})")
+
+parser.add_argument("--resume", metavar="FILE", type=str,
+                    help="continue the program from the state saved in FILE "
+                    "with --checkpoint-every, reading the same input")
+
+parser.add_argument("--record", metavar="FILE", type=str,
+                    help="record every step of the program to FILE, to be "
+                    "gone through with the replay command (table engine "
+                    "only)")
+
+parser.add_argument("--keyframe-every", metavar="N", type=int,
+                    default=KEYFRAME_EVERY,
+                    help="with --record, save the whole stack every N "
+                    f"steps, to go to any step faster (default: "
+                    f"{KEYFRAME_EVERY})")
+
+parser.add_argument("--no-cache", action="store_true",
+                    help="don't use the cache of compiled programs")
+
+parser.add_argument("--clear-cache", action="store_true",
+                    help="remove all compiled programs from the cache "
+                    "before running")
+
+parser.add_argument("--profile", action="store_true",
+                    help="count the steps in every block and of every "
+                    "command, time them and the stack high-water mark, "
+                    "and print a report when the execution ends")
+
+parser.add_argument("--heat-map", metavar="FILE", type=str,
+                    help="with --profile, save the image with its blocks "
+                    "colored by how often they were visited to FILE (PNG)")
+
+parser.add_argument("-bp", "--breakpoint", type=int,
                     help="step, from which the interpreter will"
-                    "start running in debug mode if enabled (default: 1)")
+                    "start running in debug mode if enabled (default: 1, "
+                    "or none with the breakpoints below)")
 
+parser.add_argument("--break-at", metavar="X,Y", type=parse_codel,
+                    action="append", default=[],
+                    help="start debug mode before a step in the block of "
+                    "the codel at X,Y (can be repeated)")
 
-def run(inter: piet_interpreter.PietInterpreter, debug: bool, bp: int):
-    if debug:
-        log_debug_mode_on(debug, bp)
-    try:
-        for step in range(1, args.limit):
-            if debug and step == bp:
-                inter.start_debug()
-            interpreter.piet_step()
-    except RecursionError as e:
-        log_error(f"Provided Piet code has an overly deep recursion "
-                  f"(or a block with too many codels) - {e}")
+parser.add_argument("--break-on", metavar="COMMAND", action="append",
+                    default=[], choices=[name[len("piet_"):]
+                                         for name in COMMAND_NAMES],
+                    help="start debug mode before the command is executed, "
+                    "for example roll (can be repeated)")
+
+parser.add_argument("--break-depth", metavar="N", type=int,
+                    help="start debug mode once the stack holds more than N "
+                    "values")
+
+parser.add_argument("--break-top", metavar="VALUE", type=int,
+                    help="start debug mode once VALUE is on top of the "
+                    "stack")
+
+parser.add_argument("--break-output", metavar="BYTE", type=int,
+                    help="start debug mode before the program writes BYTE "
+                    "(0-255) to the output")
+
+
+def load_engine(args, cache: PietCache):
+    # the engine runs limit - 1 steps, and the steps before the first input
+    # are run at most as many times, once, when the program is compiled
+    steps = args.limit - 1
+    prefix_steps = min(PREFIX_STEPS, steps)
+    try:
+        with open(args.filename, "rb") as file:
+            key = cache.get_key(file.read(), args.size, prefix_steps)
+    except FileNotFoundError:
+        log_error(f"Couldn't find Piet code image at PATH provided")
+
+    transitions = cache.load(key)
+    if transitions is not None:
+        engine = PietEngine(transitions, PietVM(), *transitions.start_codel)
+        prefix = transitions.prefix
     else:
-        print("Steps limit reached")
+        engine = PietEngine.from_interpreter(open_interpreter(args,
+                                                              lazy=True))
+        prefix = evaluate_prefix(engine.transitions, engine.codel,
+                                 prefix_steps)
+        cache.store(key, engine.transitions, engine.state, engine.codel,
+                    prefix)
+    # the run starts where the prefix ends, unless the stack could have
+    # grown past the memory limits in it, every step is recorded, or a
+    # cycle in it has to be found at the step it starts
+    if prefix is not None and prefix.fits(steps) and args.record is None \
+            and args.max_depth is None and args.max_bits is None \
+            and not args.detect_cycles:
+        prefix.start(engine)
+    return engine
+
+
+def run(args, inter, engine: PietEngine, breakpoints=None):
+    debug, bp = args.debug, args.breakpoint
+    if debug:
+        log_debug_mode_on(debug, bp, breakpoints)
+    pvm = engine.pvm if engine is not None else inter.pvm
+    setup_io(args, pvm)
+    if args.resume is not None:
+        resume(args, inter)
+    if engine is None and (args.engine == "table"
+                           or breakpoints is not None):
+        engine = PietEngine.from_interpreter(inter)
+    profiler = start_profile(args, inter, engine)
+    writer = None
+    if args.checkpoint_every is not None:
+        writer = PietSnapshotWriter(
+            args.checkpoint or args.filename + SNAPSHOT_SUFFIX,
+            get_image_digest(args))
+    if args.record is not None:
+        engine.recorder = start_recording(args)
+    try:
+        if engine is not None:
+            run_engine(args, inter, engine, writer, breakpoints)
+        if inter is not None:
+            for step in range(inter.step + 1, args.limit):
+                if debug and step == bp:
+                    inter.start_debug()
+                inter.piet_step()
+                if writer is not None \
+                        and inter.step % args.checkpoint_every == 0:
+                    save_checkpoint(writer, inter.step,
+                                    (inter.curr_x, inter.curr_y), pvm)
+        if writer is not None:
+            # so that the run can go on with a larger limit
+            if inter is not None:
+                save_checkpoint(writer, inter.step,
+                                (inter.curr_x, inter.curr_y), pvm)
+            else:
+                save_checkpoint(writer, engine.step, engine.codel, pvm)
+    except PietTrapped:
+        end_output(pvm)
+        sys.exit("trapped")
+    except PietCycle as e:
+        end_output(pvm)
+        print(f"[SYS] Endless loop detected at step {e.step} "
+              f"(repeats every {e.period} steps)")
+        sys.exit(EXIT_CYCLE)
+    except PietMemoryExceeded as e:
+        end_output(pvm)
+        sys.exit(f"memory limit exceeded: {e}")
+    finally:
+        end_output(pvm)
+        if profiler is not None:
+            log_profile(args, inter, profiler)
+        if engine is not None and engine.recorder is not None:
+            stop_recording(args, engine.recorder)
+    print("Steps limit reached")
+
+
+def run_engine(args, inter, engine: PietEngine, writer=None,
+               breakpoints=None):
+    debug, bp = args.debug, args.breakpoint
+    if args.optimize:
+        engine.optimizer = PietOptimizer(engine.transitions)
+    if args.jit:
+        engine.jit = PietJIT(engine.transitions)
+    engine.detect_cycles = args.detect_cycles
+    engine.breakpoints = breakpoints
+    last_step = min(bp, args.limit) - 1 if debug else args.limit - 1
+    try:
+        if writer is None:
+            engine.run(last_step - engine.step)
+        every = args.checkpoint_every
+        while writer is not None and engine.step < last_step:
+            engine.run(min(every - engine.step % every,
+                           last_step - engine.step))
+            if engine.step % every == 0:
+                save_checkpoint(writer, engine.step, engine.codel,
+                                engine.pvm)
+    except PietBreak as e:
+        end_output(engine.pvm)
+        print(f"[SYS] Breakpoint hit before STEP {e.step + 1}: {e.reason}")
+        inter.start_debug()
+    finally:
+        if inter is not None:
+            engine.sync(inter)
+        if args.report:
+            end_output(engine.pvm)
+            log_report(engine)
+
+
+def get_image_digest(args):
+    try:
+        with open(args.filename, "rb") as file:
+            return get_digest(file.read(), args.size)
+    except OSError as e:
+        log_error(f"Couldn't read Piet code image - {e}")
+
+
+def resume(args, inter):
+    try:
+        snapshot = load_snapshot(args.resume)
+    except (OSError, ValueError) as e:
+        log_error(f"Couldn't load the saved state - {e}")
+    if snapshot.digest != get_image_digest(args):
+        log_error("The saved state belongs to another program")
+    inter.step = snapshot.step
+    inter.curr_x, inter.curr_y = snapshot.codel
+    snapshot.restore(inter.pvm)
+
+
+def save_checkpoint(writer, step, codel, pvm: PietVM):
+    try:
+        writer.save(step, *codel, pvm)
+    except OSError as e:
+        log_error(f"Couldn't save the state of the program - {e}")
+
+
+def start_recording(args):
+    try:
+        return PietRecorder(args.record, args.keyframe_every)
+    except OSError as e:
+        log_error(f"Couldn't create the trace - {e}")
+
+
+def stop_recording(args, recorder: PietRecorder):
+    try:
+        recorder.close()
+    except OSError as e:
+        log_error(f"Couldn't save the trace - {e}")
+    print(f"[SYS] {recorder.step or 0} steps recorded to {args.record}")
+
+
+def setup_io(args, pvm: PietVM):
+    pvm.output.flush_policy = args.flush
+    pvm.limit_memory(args.max_depth, args.max_bits)
+    if args.input is not None:
+        try:
+            stream = open(args.input, "rb")
+        except OSError as e:
+            log_error(f"Couldn't open input file - {e}")
+        pvm.input = PietInput(stream, output=pvm.output)
+
+
+def end_output(pvm: PietVM):
+    # the program's output doesn't have to end with a newline
+    pvm.output.flush()
+    if not pvm.output.line_start:
+        print()
+        pvm.output.line_start = True
+
+
+def compile_to(inter, path: str):
+    transitions = PietTransitions(inter.matrix, inter.blocks, inter.slides)
+    start_state = transitions.get_start_state(
+        inter.curr_x, inter.curr_y, inter.pvm.dp, inter.pvm.cc)
+    source = compile_program(transitions, start_state,
+                             inter.filename, inter.codel_size)
+    try:
+        with open(path, "w") as file:
+            file.write(source)
+    except OSError as e:
+        log_error(f"Couldn't write compiled program - {e}")
+    print(f"[SYS] Compiled to {path}")
+
+
+def analyze(args, inter):
+    # imported only when needed, as it depends on numpy
+    from piet_vitvit.piet_analysis import PietAnalysis
+    transitions = PietTransitions(inter.matrix, inter.blocks, inter.slides)
+    analysis = PietAnalysis(transitions, transitions.get_start_state(
+        inter.curr_x, inter.curr_y, inter.pvm.dp, inter.pvm.cc))
+    print(analysis.get_report())
+    if args.cfg is None:
+        return
+    graph = analysis.to_json() if args.cfg.endswith(".json") \
+        else analysis.to_dot()
+    try:
+        with open(args.cfg, "w") as file:
+            file.write(graph + "\n")
+    except OSError as e:
+        log_error(f"Couldn't save the graph - {e}")
+    print(f"[CFG] graph saved to {args.cfg}")
+
+
+def log_report(engine: PietEngine):
+    jit = engine.jit
+    if jit is not None:
+        compiled = sum(trace is not None for trace in jit.traces.values())
+        print(f"[SYS] {engine.step} steps, {compiled} loops compiled, "
+              f"{jit.entered} entered ({jit.refused} more times the stack "
+              f"was too short), {jit.steps} steps "
+              f"({get_share(jit.steps, engine.step)}) done in them, "
+              f"{jit.exits} guards failed "
+              f"({get_share(jit.exits, jit.entered)} of the entries)")
+        return
+    optimizer = engine.optimizer
+    if optimizer is None:
+        print(f"[SYS] {engine.step} steps, no commands eliminated")
+        return
+    compiled = sum(run is not None for run in optimizer.runs.values())
+    print(f"[SYS] {engine.step} steps, {compiled} superinstructions "
+          f"compiled, {optimizer.fused} executed, "
+          f"{optimizer.eliminated} commands eliminated")
+
+
+def get_share(part, whole):
+    return f"{part / whole:.1%}" if whole else "-"
+
 
+def start_profile(args, inter, engine: PietEngine):
+    if not args.profile:
+        return None
+    # imported only when needed, as it depends on PIL
+    from piet_vitvit.piet_profiler import PietProfiler
+    profiler = PietProfiler()
+    inter.profiler = profiler
+    if engine is not None:
+        engine.profiler = profiler
+    return profiler
 
-def log_debug_mode_on(debug, bp):
+
+def log_profile(args, inter, profiler):
+    print(profiler.get_report(inter.blocks))
+    if args.heat_map is not None:
+        try:
+            profiler.get_heat_map(inter.image, inter.blocks,
+                                  inter.codel_size).save(args.heat_map, "PNG")
+        except OSError as e:
+            log_error(f"Couldn't save the heat map - {e}")
+        print(f"[PROFILE] heat map saved to {args.heat_map}")
+
+
+def get_breakpoints(args):
+    if not (args.break_at or args.break_on or args.break_depth is not None
+            or args.break_top is not None or args.break_output is not None):
+        return None
+    if args.break_output is not None and not 0 <= args.break_output < 256:
+        log_error("Invalid output breakpoint (must be a byte, 0-255)")
+    return PietBreakpoints(args.break_at, args.break_on, args.break_depth,
+                           args.break_top, args.break_output)
+
+
+def check_breakpoints(inter, breakpoints: PietBreakpoints):
+    for x, y in breakpoints.codels:
+        if not (0 <= x < inter.cols and 0 <= y < inter.rows):
+            log_error(f"Invalid breakpoint codel {x, y} (outside of the "
+                      f"{inter.cols}x{inter.rows} codel image)")
+
+
+def log_debug_mode_on(debug, bp, breakpoints=None):
     print("[SYS] DEBUG MODE")
+    if breakpoints is not None:
+        print("[SYS] Once a breakpoint is hit, the program will be\n"
+              "[SYS] executed step by step, awaiting your input\n"
+              "[SYS] before moving forward.")
+        return
     print(f"[SYS] Starting from breakpoint (STEP {bp}), the program\n"
             "[SYS] will be executed step by step, awaiting your input\n"
             "[SYS] before moving forward.")
 
 
-if __name__ == "__main__":
+def replay(args):
+    try:
+        trace = PietReplay(args.trace)
+    except (OSError, ValueError) as e:
+        log_error(f"Couldn't load the trace - {e}")
+    print(f"[SYS] steps {trace.first_step}-{trace.last_step} recorded")
+    with trace:
+        if args.goto is not None:
+            trace.seek(args.goto)
+        while True:
+            log_replay_step(trace)
+            try:
+                line = input("[n]ext, [p]revious, [g]o to STEP, [q]uit: ")
+            except EOFError:
+                break
+            command, _, step = line.strip().partition(" ")
+            moved = True
+            try:
+                if command in ("", "n"):
+                    moved = trace.forward()
+                elif command == "p":
+                    moved = trace.back()
+                elif command == "g" and step.strip().isdigit():
+                    trace.seek(int(step))
+                elif command == "q":
+                    break
+                else:
+                    print("[SYS] Unknown command")
+            except (OSError, ValueError) as e:
+                log_error(f"Couldn't read the trace - {e}")
+            if not moved:
+                print("[SYS] No more steps recorded that way")
+
+
+def log_replay_step(trace: PietReplay):
+    print("-" * 40)
+    print(f"[SYS] STEP {trace.step}")
+    command = trace.get_command_name()
+    if command is not None:
+        output = f" (wrote {trace.output!r})" if trace.output else ""
+        print(f"[INTER] command: {command}{output}")
+    print(f"[INTER] block: {trace.block}")
+    print(f"[VM] DP: {trace.dp.name}")
+    print(f"[VM] CC: {trace.cc.name}")
+    print(f"[VM] stack: {trace.stack}")
+
+
+def batch(args):
+    try:
+        if args.manifest == "-":
+            jobs = read_manifest(sys.stdin)
+        else:
+            with open(args.manifest) as file:
+                jobs = read_manifest(file, os.path.dirname(args.manifest))
+    except (OSError, ValueError) as e:
+        log_error(f"Couldn't read manifest - {e}")
+    if args.jobs is not None and args.jobs <= 0:
+        log_error("Invalid number of jobs (must be positive)")
+
+    cache_dir = None if args.no_cache else CACHE_DIR
+    for result in run_batch(jobs, args.jobs, cache_dir, args.timeout,
+                            args.limit):
+        print(json.dumps(result), flush=True)
+
+
+def serve(args):
+    for name in ("jobs", "queue", "cache_size", "limit", "timeout"):
+        value = getattr(args, name)
+        if value is not None and value <= 0:
+            log_error(f"Invalid {name.replace('_', ' ')} (must be positive)")
+    try:
+        asyncio.run(serve_forever(args))
+    except KeyboardInterrupt:
+        pass
+
+
+async def serve_forever(args):
+    server = PietServer(args.jobs, args.queue, args.cache_size, args.limit,
+                        args.timeout)
+    try:
+        listener = await server.start(args.host, args.port, args.unix)
+    except OSError as e:
+        log_error(f"Couldn't start the server - {e}")
+    where = args.unix or f"http://{args.host}:{args.port}"
+    print(f"[SYS] Serving on {where}", flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(args):
     print()
-    args = parser.parse_args()
     if args.size <= 0:
         log_error("Invalid codel size (must be positive)")
     if args.limit <= 0:
         log_error("Invalid steps limit (must be positive)")
+    breakpoints = get_breakpoints(args)
+    if breakpoints is not None:
+        args.debug = True
+    if args.breakpoint is None:
+        args.breakpoint = args.limit if breakpoints is not None else 1
     if args.breakpoint <= 0:
         log_error("Invalid breakpoint (must be positive)")
+    if args.max_depth is not None and args.max_depth <= 0 \
+            or args.max_bits is not None and args.max_bits <= 0:
+        log_error("Invalid memory limit (must be positive)")
+    if args.checkpoint_every is not None and args.checkpoint_every <= 0:
+        log_error("Invalid checkpoint interval (must be positive)")
+    if args.heat_map is not None:
+        args.profile = True
+    if args.cfg is not None:
+        args.analyze = True
+    if args.profile and (args.optimize or args.detect_cycles
+                         or breakpoints is not None):
+        log_error("Profiling can't be combined with -O, --detect-cycles "
+                  "or breakpoints")
+    if args.detect_cycles and args.engine != "table":
+        log_error("Detecting cycles needs the table engine")
+    if args.jit and (args.engine != "table" or args.optimize
+                     or args.detect_cycles):
+        log_error("JIT needs the table engine and can't be combined with "
+                  "-O or --detect-cycles")
+    if args.keyframe_every <= 0:
+        log_error("Invalid keyframe interval (must be positive)")
+    if args.record is not None and (args.engine != "table" or args.debug
+                                    or args.optimize or args.detect_cycles
+                                    or args.profile):
+        log_error("Recording needs the table engine and can't be combined "
+                  "with debug mode, -O, --detect-cycles or profiling")
 
-    try:
-        interpreter = piet_interpreter.PietInterpreter(args.filename,
-                                                       args.size)
-    except FileNotFoundError:
-        log_error(f"Couldn't find Piet code image at PATH provided")
+    if args.clear_cache:
+        PietCache().clear()
+
+    engine = interpreter = None
+    if args.engine == "table" and not (args.debug or args.compile
+                                       or args.analyze or args.no_cache
+                                       or args.profile or args.resume):
+        engine = load_engine(args, PietCache())
+    else:
+        # only the reachable blocks are labeled for the static passes
+        interpreter = open_interpreter(args, lazy=bool(args.compile
+                                                       or args.analyze))
 
-    run(interpreter, args.debug, args.breakpoint)
+    if args.analyze:
+        analyze(args, interpreter)
+    if args.compile:
+        compile_to(interpreter, args.compile)
+    elif not args.analyze:
+        if breakpoints is not None:
+            check_breakpoints(interpreter, breakpoints)
+        run(args, interpreter, engine, breakpoints)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["batch"]:
+        batch(batch_parser.parse_args(sys.argv[2:]))
+    elif sys.argv[1:2] == ["serve"]:
+        serve(serve_parser.parse_args(sys.argv[2:]))
+    elif sys.argv[1:2] == ["replay"]:
+        replay(replay_parser.parse_args(sys.argv[2:]))
+    else:
+        main(parser.parse_args())
@@ -0,0 +1,3 @@
+from piet_vitvit.piet_api import compile, PietProgram, PietResult, \
+    REASON_TRAPPED, REASON_LIMIT, REASON_TIMEOUT, REASON_CYCLE, \
+    REASON_ERROR, REASON_MEMORY
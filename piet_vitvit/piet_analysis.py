@@ -0,0 +1,151 @@
+import json
+
+import numpy as np
+
+from piet_vitvit.piet_colors import COLOR_WHITE
+from piet_vitvit.piet_engine import COMMAND_NONE, COMMAND_TRAP, \
+    get_command_name, get_state, split_state
+from piet_vitvit.piet_image import PietTiles
+
+
+class PietAnalysis:
+    def __init__(self, transitions, start_state):
+        # the (block, DP, CC) states reachable from the start one, with
+        # pointer and switch leading to any DP and CC; with lazily labeled
+        # PietBlocks, nothing but those blocks and their neighbors is
+        # labeled
+        self.transitions = transitions
+        self.start_state = start_state
+        self.entries = transitions.explore(start_state)
+        self.blocks = sorted({state // 8 for state in self.entries})
+        # states, from which the execution can't move anywhere, and ones
+        # that failed to resolve, with the error
+        self.traps = sorted(state for state, entry in self.entries.items()
+                            if not isinstance(entry, Exception)
+                            and entry[0] == COMMAND_TRAP)
+        self.errors = {state: entry for state, entry in self.entries.items()
+                       if isinstance(entry, Exception)}
+        # blocks, every reachable state of which is a trap
+        trapped = set(self.traps)
+        self.dead_ends = [block for block in self.blocks
+                          if all(state in trapped
+                                 for state in range(block * 8, block * 8 + 8)
+                                 if state in self.entries)]
+
+    def get_successors(self, state):
+        # the states execution can go to from the state
+        entry = self.entries[state]
+        if isinstance(entry, Exception) or entry[0] == COMMAND_TRAP:
+            return []
+        command, next_state, value, codel, block, dp, cc = entry
+        if command == COMMAND_NONE:
+            return [get_state(block, dp, cc)]
+        if next_state < 0:
+            return [get_state(block, 0, 0) + dc for dc in range(8)]
+        return [next_state]
+
+    def get_area(self):
+        # codels of the reachable blocks, other than black ones execution
+        # may start on, and of all colored blocks of the image, or, when it
+        # is read tile by tile, of the tiles labeling the reachable blocks
+        # read, so that the rest of the image isn't decoded for it
+        blocks = self.transitions.blocks.blocks
+        reachable = sum(blocks[index].size for index in self.blocks
+                        if blocks[index].color < COLOR_WHITE)
+        return reachable, _count_colored(self.transitions.matrix)
+
+    def get_report(self):
+        blocks = self.transitions.blocks.blocks
+        reachable, colored = self.get_area()
+        unreachable = colored - reachable
+        lines = [f"[CFG] {len(self.entries)} states in {len(self.blocks)} "
+                 f"blocks reachable"]
+        share = f" ({unreachable / colored:.1%})" if colored else ""
+        lines.append(f"[CFG] unreachable area: {unreachable} of {colored} "
+                     f"colored codels{share}{_get_tiles_read(self)}")
+        lines.append(f"[CFG] trap states: {len(self.traps)}")
+        for state in self.traps:
+            block, dp, cc = split_state(state)
+            lines.append(f"[CFG]   block {block} at "
+                         f"{blocks[block].get_exit(0, -1)}, DP {dp.name}, "
+                         f"CC {cc.name}")
+        lines.append(f"[CFG] blocks with no exit: {len(self.dead_ends)}")
+        for block in self.dead_ends:
+            lines.append(f"[CFG]   block {block} at "
+                         f"{blocks[block].get_exit(0, -1)}, "
+                         f"{blocks[block].size} codels")
+        for state, error in sorted(self.errors.items()):
+            lines.append(f"[CFG] state {state} fails: {error}")
+        return "\n".join(lines)
+
+    def to_json(self):
+        blocks = self.transitions.blocks.blocks
+        reachable, colored = self.get_area()
+        states = []
+        for state in sorted(self.entries):
+            entry = self.entries[state]
+            block, dp, cc = split_state(state)
+            states.append({
+                "state": state, "block": block, "dp": dp.name,
+                "cc": cc.name,
+                "command": "ERROR" if isinstance(entry, Exception)
+                else get_command_name(entry[0]),
+                "next": self.get_successors(state)})
+        return json.dumps({
+            "start": self.start_state,
+            "blocks": [{"block": index, "color": int(blocks[index].color),
+                        "size": blocks[index].size,
+                        "codel": blocks[index].get_exit(0, -1)}
+                       for index in self.blocks],
+            "states": states,
+            "traps": self.traps,
+            "dead_ends": self.dead_ends,
+            "reachable_codels": reachable,
+            "colored_codels": colored,
+            }, indent=1)
+
+    def to_dot(self):
+        # a node for every block, and an edge for every command between
+        # them, labeled with the command and the states it is taken in
+        blocks = self.transitions.blocks.blocks
+        lines = ["digraph piet {", "    node [shape=box];",
+                 "    start [shape=point];",
+                 f"    start -> b{self.start_state // 8};"]
+        for index in self.blocks:
+            style = ", style=bold" if index in self.dead_ends else ""
+            lines.append(f"    b{index} [label=\"block {index}\\n"
+                         f"{blocks[index].get_exit(0, -1)}, "
+                         f"{blocks[index].size} codels\"{style}];")
+        edges = {}
+        for state in sorted(self.entries):
+            entry = self.entries[state]
+            if isinstance(entry, Exception) or entry[0] == COMMAND_TRAP:
+                continue
+            name = get_command_name(entry[0])
+            for next_state in self.get_successors(state):
+                key = state // 8, next_state // 8, name
+                edges.setdefault(key, []).append(state % 8)
+        for (block, next_block, name), dcs in sorted(edges.items()):
+            lines.append(f"    b{block} -> b{next_block} [label=\"{name} "
+                         f"{','.join(map(str, sorted(set(dcs))))}\"];")
+        lines.append("}")
+        return "\n".join(lines)
+
+
+def _count_colored(matrix):
+    if not isinstance(matrix, PietTiles):
+        return int(np.count_nonzero(matrix < COLOR_WHITE))
+    # tiles evicted since are decoded again, but no others
+    return sum(int(np.count_nonzero(matrix.get_tile(row, col)
+                                    < COLOR_WHITE))
+               for row, col in sorted(matrix.read))
+
+
+def _get_tiles_read(analysis):
+    matrix = analysis.transitions.matrix
+    if not isinstance(matrix, PietTiles):
+        return ""
+    rows, cols = matrix.shape
+    size = matrix.tile_size
+    return (f" in {len(matrix.read)} of "
+            f"{-(-rows // size) * -(-cols // size)} tiles read")
@@ -0,0 +1,133 @@
+import io
+import time
+
+from piet_vitvit.piet_engine import PietCycle, PietEngine, PietTransitions
+from piet_vitvit.piet_prefix import PREFIX_STEPS, evaluate_prefix
+from piet_vitvit.piet_vm import CC, DP, PietMemoryExceeded, PietTrapped, \
+    PietVM
+
+
+REASON_TRAPPED = "trapped"
+REASON_LIMIT = "limit"
+REASON_TIMEOUT = "timeout"
+REASON_CYCLE = "cycle"
+REASON_MEMORY = "memory"
+REASON_ERROR = "error"
+
+# steps between checks of the time left
+TIMEOUT_CHECK_STEPS = 10000
+
+
+def compile(image_bytes, codel_size=1, cache=None, tiled=None,
+            prefix_steps=PREFIX_STEPS):
+    # with a PietCache, the program is loaded from it or stored into it;
+    # a large image, or any if tiled, is decoded only where the program
+    # can go, and up to prefix_steps steps before it reads any input are
+    # run here instead of in every run; runs of fewer steps don't use them,
+    # so prefix_steps is best kept within the steps of the runs
+    if cache is not None:
+        key = cache.get_key(image_bytes, codel_size, prefix_steps)
+        transitions = cache.load(key)
+        if transitions is not None:
+            return PietProgram(transitions, *transitions.start_codel,
+                               prefix_steps)
+    program = _decode(image_bytes, codel_size, tiled, prefix_steps)
+    if cache is not None:
+        cache.store(key, program.transitions, program.start_state,
+                    program.start_codel, program.prefix)
+    return program
+
+
+def _decode(image_bytes, codel_size, tiled=None, prefix_steps=PREFIX_STEPS):
+    # PIL and numpy are imported only here, so that programs loaded from
+    # the cache run without them
+    from PIL import Image
+    from piet_vitvit.piet_blocks import PietBlocks
+    from piet_vitvit.piet_image import open_codels
+    from piet_vitvit.piet_slides import PietSlides
+
+    image = Image.open(io.BytesIO(image_bytes))
+    matrix = open_codels(image, codel_size, tiled)
+    rows, cols = matrix.shape
+    # only the blocks the program can reach are labeled
+    blocks = PietBlocks(matrix, cols, rows, getattr(matrix, "tile_size",
+                                                    None), lazy=True)
+    return PietProgram(PietTransitions(matrix, blocks, PietSlides(matrix)),
+                       prefix_steps=prefix_steps)
+
+
+class PietResult:
+    def __init__(self, output, reason, steps, stack, error=None):
+        self.output = output
+        self.reason = reason
+        self.steps = steps
+        self.stack = stack
+        self.error = error
+
+    def __repr__(self):
+        return (f"PietResult(reason={self.reason!r}, steps={self.steps}, "
+                f"output={self.output!r}, stack={self.stack!r})")
+
+
+class PietProgram:
+    def __init__(self, transitions, x=0, y=0, prefix_steps=PREFIX_STEPS):
+        # every state the program can reach is resolved beforehand, so
+        # that runs, possibly in several threads, only read the table
+        self.transitions = transitions
+        self.start_codel = x, y
+        self.start_state = transitions.get_start_state(x, y, DP.RIGHT,
+                                                       CC.LEFT)
+        transitions.explore(self.start_state)
+        # PietPrefix, which every run starts from, loaded with the program
+        # or run here
+        self.prefix = getattr(transitions, "prefix", None)
+        if self.prefix is None and prefix_steps:
+            self.prefix = evaluate_prefix(transitions, self.start_codel,
+                                          prefix_steps)
+
+    def run(self, input=b"", max_steps=10000, timeout=None,
+            detect_cycles=False, max_depth=None, max_bits=None):
+        if isinstance(input, str):
+            input = input.encode()
+        output = io.BytesIO()
+        vm = PietVM(io.BytesIO(input), output)
+        vm.input.interactive = False
+        vm.limit_memory(max_depth, max_bits)
+        engine = PietEngine(self.transitions, vm, *self.start_codel)
+        # the stack may have grown past the memory limits in the prefix,
+        # and a cycle in it would be found only past it
+        if self.prefix is not None and self.prefix.fits(max_steps) \
+                and not vm.limited and not detect_cycles:
+            self.prefix.start(engine)
+        engine.detect_cycles = detect_cycles
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        reason, error = REASON_LIMIT, None
+        try:
+            while engine.step < max_steps:
+                if deadline is None:
+                    engine.run(max_steps - engine.step)
+                elif time.monotonic() >= deadline:
+                    reason = REASON_TIMEOUT
+                    break
+                else:
+                    engine.run(min(TIMEOUT_CHECK_STEPS,
+                                   max_steps - engine.step))
+        except PietTrapped:
+            reason = REASON_TRAPPED
+        except PietCycle:
+            reason = REASON_CYCLE
+        except PietMemoryExceeded as e:
+            reason, error = REASON_MEMORY, e
+        except Exception as e:
+            reason, error = REASON_ERROR, e
+        vm.output.flush()
+        return PietResult(output.getvalue(), reason, engine.step, vm.stack,
+                          error)
+
+    def run_many(self, inputs, max_steps=10000):
+        # runs the program with every input in lockstep, which is faster
+        # than one run after another when many of them take the same path;
+        # the results are in the order of the inputs
+        from piet_vitvit.piet_lanes import run_lanes
+        return run_lanes(self, inputs, max_steps)
@@ -0,0 +1,122 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from piet_vitvit.piet_api import compile, PietProgram, REASON_ERROR
+from piet_vitvit.piet_cache import PietCache, PietCachedTransitions, get_key
+from piet_vitvit.piet_prefix import PREFIX_STEPS
+
+
+DEFAULT_LIMIT = 10000
+# compiled programs each worker keeps in memory
+WORKER_PROGRAMS = 64
+
+# programs and the on-disk cache of the worker process
+_programs = OrderedDict()
+_cache = None
+
+
+def read_manifest(lines, directory=""):
+    # a manifest is a JSON object per line, with the image path and,
+    # optionally, its codel size, a path to the input, the steps limit,
+    # the timeout in seconds and an id, reported back with the result;
+    # relative paths are relative to the given directory
+    jobs = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"line {number}: {e}") from None
+        if not isinstance(job, dict) or "image" not in job:
+            raise ValueError(f"line {number}: no image given")
+        job.setdefault("id", len(jobs))
+        job["image"] = os.path.join(directory, job["image"])
+        if job.get("input") is not None:
+            job["input"] = os.path.join(directory, job["input"])
+        jobs.append(job)
+    return jobs
+
+
+def run_batch(jobs, workers=None, cache_dir=None, timeout=None,
+              limit=DEFAULT_LIMIT):
+    # yields results as jobs finish, in any order
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(cache_dir,)) as executor:
+        futures = [executor.submit(run_job, job, timeout, limit)
+                   for job in jobs]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def run_job(job, timeout=None, limit=DEFAULT_LIMIT):
+    started = time.monotonic()
+    result = {"id": job["id"], "image": job["image"]}
+    try:
+        with open(job["image"], "rb") as file:
+            image_bytes = file.read()
+        limit = job.get("limit", limit)
+        program = get_program(image_bytes, job.get("codel_size", 1),
+                              prefix_steps=get_prefix_steps(limit))
+        input_bytes = b""
+        if job.get("input") is not None:
+            with open(job["input"], "rb") as file:
+                input_bytes = file.read()
+        outcome = program.run(input_bytes, limit,
+                              job.get("timeout", timeout))
+    except Exception as e:
+        result.update(reason=REASON_ERROR, error=describe_error(e))
+    else:
+        result.update(describe_result(outcome))
+    result["time"] = round(time.monotonic() - started, 6)
+    return result
+
+
+def _init_worker(cache_dir):
+    global _cache
+    if cache_dir is not None:
+        _cache = PietCache(cache_dir)
+
+
+def get_prefix_steps(limit):
+    # steps of the prefix compiled for runs of up to limit steps, the same
+    # as the CLI runs before its limit, so that they share the disk cache
+    return max(0, min(PREFIX_STEPS, limit - 1))
+
+
+def get_program(image_bytes, codel_size, rows=None,
+                prefix_steps=PREFIX_STEPS):
+    # the program compiled in this process before, or the one dumped by
+    # dump_transitions into rows, if given, or a new one
+    key = get_key(image_bytes, codel_size, prefix_steps)
+    if key in _programs:
+        _programs.move_to_end(key)
+        return _programs[key]
+    if rows is not None:
+        transitions = PietCachedTransitions(rows)
+        program = PietProgram(transitions, *transitions.start_codel,
+                              prefix_steps)
+    else:
+        program = compile(image_bytes, codel_size, _cache,
+                          prefix_steps=prefix_steps)
+    _programs[key] = program
+    if len(_programs) > WORKER_PROGRAMS:
+        _programs.popitem(last=False)
+    return program
+
+
+def describe_result(outcome):
+    result = {"reason": outcome.reason, "steps": outcome.steps,
+              "output": outcome.output.decode("utf-8", "replace"),
+              "stack": outcome.stack}
+    if outcome.error is not None:
+        result["error"] = describe_error(outcome.error)
+    return result
+
+
+def describe_error(error):
+    return f"{type(error).__name__}: {error}"
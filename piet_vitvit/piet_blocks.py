@@ -0,0 +1,163 @@
+from bisect import bisect_right
+
+import numpy as np
+
+from piet_vitvit.piet_colors import COLOR_BLACK
+
+
+class PietBlock:
+    def __init__(self, index, color):
+        self.index = index
+        self.color = color
+        self.size = 0
+        # exit codels, indexed by [DP][CC], where CC.LEFT -> 0, CC.RIGHT -> 1
+        self.exits = [[None, None] for dp in range(4)]
+
+    def get_exit(self, dp, cc):
+        return self.exits[dp][cc > 0]
+
+
+class PietBlocks:
+    def __init__(self, matrix, cols, rows, segment_size=None, lazy=False):
+        # with a segment size, such as the tile size of PietTiles, every row
+        # is read in segments of that many codels, and if lazy, blocks are
+        # labeled only once a codel of theirs is looked up
+        self.matrix = matrix
+        self.cols = cols
+        self.rows = rows
+        self.blocks = []
+        self.segment_size = segment_size or max(cols, 1)
+        self.segments = -(-cols // self.segment_size)
+        # every segment of a row is split into runs of same-colored codels,
+        # which are computed on first use and stored, keyed by
+        # y * segments + segment, as (starts, ends, colors, labels)
+        self._runs = {}
+        self._black_blocks = {}
+
+        if lazy:
+            return
+        for y in range(rows):
+            for segment in range(self.segments):
+                starts, ends, colors, labels = self._get_runs(y, segment)
+                for run in range(len(starts)):
+                    if labels[run] < 0 and colors[run] != COLOR_BLACK:
+                        self._label_block(y, segment, run)
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def block_at(self, x, y):
+        segment = x // self.segment_size
+        starts, ends, colors, labels = self._get_runs(y, segment)
+        run = bisect_right(starts, x) - 1
+        if labels[run] < 0 and colors[run] != COLOR_BLACK:
+            self._label_block(y, segment, run)
+        if labels[run] < 0:
+            return self._get_black_block(x, y)
+        return self.blocks[labels[run]]
+
+    def _get_black_block(self, x, y):
+        # black codels are never labeled, but execution may still start on
+        # one, and then that single codel is a block on its own
+        if (x, y) not in self._black_blocks:
+            block = PietBlock(len(self.blocks), COLOR_BLACK)
+            block.size = 1
+            block.exits = [[(x, y), (x, y)] for dp in range(4)]
+            self.blocks.append(block)
+            self._black_blocks[(x, y)] = block
+        return self._black_blocks[(x, y)]
+
+    def _get_runs(self, y, segment=0):
+        key = y * self.segments + segment
+        runs = self._runs.get(key)
+        if runs is None:
+            first = segment * self.segment_size
+            last = min(first + self.segment_size, self.cols) - 1
+            row = self.matrix[y, first:last + 1]
+            bounds = np.flatnonzero(row[1:] != row[:-1]) + 1
+            starts = np.concatenate(([0], bounds))
+            ends = np.concatenate((bounds - 1, [last - first]))
+            runs = self._runs[key] = (
+                (starts + first).tolist(), (ends + first).tolist(),
+                row[starts].tolist(), [-1] * len(starts))
+        return runs
+
+    def _label_block(self, y, segment, run):
+        starts, ends, colors, labels = self._get_runs(y, segment)
+        color = colors[run]
+        block = PietBlock(len(self.blocks), color)
+        self.blocks.append(block)
+        labels[run] = block.index
+
+        # extreme columns with their extreme rows and vice versa, matching
+        # the ordering the step interpreter used to pick the block edge
+        right, right_top, right_bottom = -1, 0, 0
+        left, left_top, left_bottom = self.cols, 0, 0
+        bottom, bottom_left, bottom_right = -1, 0, 0
+        top, top_left, top_right = self.rows, 0, 0
+
+        index = block.index
+        rows = self.rows
+        segments = self.segments
+        pending = [(y, segment, run)]
+        while pending:
+            y, segment, run = pending.pop()
+            starts, ends, colors, labels = self._runs[y * segments + segment]
+            x0, x1 = starts[run], ends[run]
+            block.size += x1 - x0 + 1
+
+            if x1 > right:
+                right, right_top, right_bottom = x1, y, y
+            elif x1 == right:
+                right_top = min(right_top, y)
+                right_bottom = max(right_bottom, y)
+            if x0 < left:
+                left, left_top, left_bottom = x0, y, y
+            elif x0 == left:
+                left_top = min(left_top, y)
+                left_bottom = max(left_bottom, y)
+            if y > bottom:
+                bottom, bottom_left, bottom_right = y, x0, x1
+            elif y == bottom:
+                bottom_left = min(bottom_left, x0)
+                bottom_right = max(bottom_right, x1)
+            if y < top:
+                top, top_left, top_right = y, x0, x1
+            elif y == top:
+                top_left = min(top_left, x0)
+                top_right = max(top_right, x1)
+
+            for ny in y - 1, y + 1:
+                if not 0 <= ny < rows:
+                    continue
+                next_starts, next_ends, next_colors, next_labels = \
+                    self._get_runs(ny, segment)
+                next_run = bisect_right(next_starts, x0) - 1
+                while next_run < len(next_starts) \
+                        and next_starts[next_run] <= x1:
+                    if next_labels[next_run] < 0 \
+                            and next_colors[next_run] == color:
+                        next_labels[next_run] = index
+                        pending.append((ny, segment, next_run))
+                    next_run += 1
+
+            # a run at the edge of a segment may go on in the next one
+            for next_segment, at_edge, next_index in (
+                    (segment - 1, run == 0, -1),
+                    (segment + 1, run == len(starts) - 1, 0)):
+                if not at_edge or not 0 <= next_segment < segments:
+                    continue
+                next_starts, next_ends, next_colors, next_labels = \
+                    self._get_runs(y, next_segment)
+                next_run = next_index % len(next_starts)
+                if next_labels[next_run] < 0 \
+                        and next_colors[next_run] == color:
+                    next_labels[next_run] = index
+                    pending.append((y, next_segment, next_run))
+
+        block.exits = [
+            [(right, right_top), (right, right_bottom)],
+            [(bottom_right, bottom), (bottom_left, bottom)],
+            [(left, left_top), (left, left_bottom)],
+            [(top_right, top), (top_left, top)],
+            ]
@@ -0,0 +1,61 @@
+from piet_vitvit.piet_engine import COMMAND_NAMES, get_command_name
+from piet_vitvit.piet_vm import CC, DP
+
+
+OUTPUT_COMMANDS = (COMMAND_NAMES.index("piet_outnum"),
+                   COMMAND_NAMES.index("piet_outchar"))
+
+
+class PietBreakpoints:
+    def __init__(self, codels=(), commands=(), depth=None, top=None,
+                 output=None):
+        # PietEngine stops before the first step, which starts in the block
+        # of one of the codels or executes one of the commands, given by
+        # their names without "piet_", or at which the stack is deeper than
+        # depth, has top on its top or the byte output is written
+        self.codels = list(codels)
+        self.commands = {COMMAND_NAMES.index("piet_" + name)
+                         for name in commands}
+        self.depth = depth
+        self.top = top
+        self.output = output
+        # whether anything but the step's block and command is checked
+        self.dynamic = depth is not None or top is not None \
+            or output is not None
+
+    def get_blocks(self, transitions):
+        # indices of the blocks of the codels, keyed by them; a program
+        # loaded from the cache keeps no blocks to look the codels up in
+        if self.codels and not hasattr(transitions, "blocks"):
+            raise ValueError("breakpoints at codels need the program "
+                             "decoded from its image, not loaded from the "
+                             "cache")
+        return {transitions.get_start_state(x, y, DP.RIGHT, CC.LEFT) // 8:
+                (x, y) for x, y in self.codels}
+
+    def check_state(self, blocks, block, command):
+        # the reason to stop before a step starting in the block, executing
+        # the command, or None
+        if block in blocks:
+            return f"block of codel {blocks[block]}"
+        if command in self.commands:
+            return f"command {get_command_name(command)}"
+        return None
+
+    def check_stack(self, command, stack):
+        if self.depth is not None and len(stack) > self.depth:
+            return f"stack deeper than {self.depth}"
+        if not stack:
+            return None
+        if self.top is not None and stack[-1] == self.top:
+            return f"{self.top} on top of the stack"
+        if self.output is not None and command in OUTPUT_COMMANDS:
+            try:
+                text = str(stack[-1]) if command == OUTPUT_COMMANDS[0] \
+                    else chr(stack[-1])
+            except (ValueError, OverflowError):
+                # the command fails itself
+                return None
+            if self.output in text.encode("utf-8", "surrogatepass"):
+                return f"output of byte {self.output}"
+        return None
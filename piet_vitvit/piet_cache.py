@@ -0,0 +1,169 @@
+import hashlib
+import mmap
+import os
+import tempfile
+from array import array
+
+from piet_vitvit.piet_engine import PietTransitions, COMPILER_VERSION
+from piet_vitvit.piet_prefix import PREFIX_STEPS, PietPrefix
+from piet_vitvit.piet_vm import CC, DP
+
+
+CACHE_DIR = os.environ.get(
+    "PIET_VITVIT_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "piet_vitvit"))
+CACHE_MAX_SIZE = 256 * 1024 * 1024
+CACHE_SUFFIX = ".pietc"
+
+# a compiled program is a flat array of native 64-bit integers: a header
+# row, then a row for every state, unresolved states having command -1,
+# followed by the bytes of its PietPrefix, if any, padded to whole integers
+CACHE_MAGIC = 0x5049455456495431
+ROW_SIZE = 8
+
+
+class PietCachedTransitions(PietTransitions):
+    def __init__(self, data):
+        # data is anything with the buffer interface, like bytes or mmap
+        self._rows = memoryview(data).cast("q")
+        magic, version, self.start_state, start_x, start_y, states, \
+            prefix_size = self._rows[:7]
+        size = (states + 1) * ROW_SIZE
+        if magic != CACHE_MAGIC or version != COMPILER_VERSION \
+                or len(self._rows) != size + -(-max(prefix_size, 0) // 8):
+            raise ValueError("not a compiled Piet program")
+        self.start_codel = start_x, start_y
+        self.prefix = None
+        if prefix_size >= 0:
+            self.prefix = PietPrefix.from_bytes(
+                self._rows[size:].cast("B")[:prefix_size])
+        self.table = [None] * states
+        self._stay_cycles = {}
+
+    def get_start_state(self, x, y, dp, cc):
+        if (x, y) != self.start_codel:
+            raise ValueError("compiled program starts at another codel")
+        return self.start_state - self.start_state % 8 + dp * 2 + (cc > 0)
+
+    def resolve(self, state):
+        row = (state + 1) * ROW_SIZE
+        command, next_state, value, x, y, block, dp, cc = \
+            self._rows[row:row + ROW_SIZE]
+        if command < 0:
+            raise ValueError(f"state {state} is not compiled")
+        entry = (command, next_state, value, (x, y) if x >= 0 else None,
+                 block, DP(dp), CC(cc))
+        self.table[state] = entry
+        return entry
+
+
+def get_key(image_bytes, codel_size, prefix_steps=PREFIX_STEPS):
+    # the prefix is stored with the program, so its steps are a part of it
+    digest = hashlib.sha256(image_bytes)
+    digest.update(
+        f":{codel_size}:{prefix_steps}:{COMPILER_VERSION}".encode())
+    return digest.hexdigest()
+
+
+def dump_transitions(transitions, start_state, start_codel, prefix=None):
+    # returns the array of rows, loaded back by PietCachedTransitions
+    entries = transitions.explore(start_state)
+    if any(isinstance(entry, Exception) for entry in entries.values()):
+        # such programs fail once they get there, nothing to reuse
+        return None
+
+    states = max(entries) + 1
+    rows = array("q", [-1]) * ((states + 1) * ROW_SIZE)
+    rows[:6] = array("q", [CACHE_MAGIC, COMPILER_VERSION, start_state,
+                           *start_codel, states])
+    for state, entry in entries.items():
+        command, next_state, value, codel, block, dp, cc = entry
+        x, y = codel if codel is not None else (-1, -1)
+        row = (state + 1) * ROW_SIZE
+        rows[row:row + ROW_SIZE] = array(
+            "q", [command, next_state, value, x, y, block, dp, cc])
+    if prefix is not None:
+        data = prefix.to_bytes()
+        rows[6] = len(data)
+        rows.frombytes(data + bytes(-len(data) % 8))
+    return rows
+
+
+class PietCache:
+    def __init__(self, directory=CACHE_DIR, max_size=CACHE_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    def get_key(self, image_bytes, codel_size, prefix_steps=PREFIX_STEPS):
+        return get_key(image_bytes, codel_size, prefix_steps)
+
+    def load(self, key):
+        path = self._get_path(key)
+        try:
+            with open(path, "rb") as file:
+                transitions = PietCachedTransitions(mmap.mmap(
+                    file.fileno(), 0, access=mmap.ACCESS_READ))
+            os.utime(path)
+        except (OSError, ValueError, TypeError):
+            return None
+        return transitions
+
+    def store(self, key, transitions, start_state, start_codel, prefix=None):
+        rows = dump_transitions(transitions, start_state, start_codel,
+                                prefix)
+        if rows is None:
+            return False
+
+        # the cache only saves time, so a program that can't be stored is
+        # run all the same
+        temp_path = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            descriptor, temp_path = tempfile.mkstemp(suffix=".tmp",
+                                                     dir=self.directory)
+            with os.fdopen(descriptor, "wb") as file:
+                rows.tofile(file)
+            os.replace(temp_path, self._get_path(key))
+        except OSError:
+            if temp_path is not None:
+                self._remove(temp_path)
+            return False
+        self._evict()
+        return True
+
+    def clear(self):
+        for path, size, used in self._list_files():
+            self._remove(path)
+
+    def _evict(self):
+        files = sorted(self._list_files(), key=lambda file: file[2])
+        total = sum(size for path, size, used in files)
+        while files and total > self.max_size:
+            path, size, used = files.pop(0)
+            self._remove(path)
+            total -= size
+
+    def _list_files(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        files = []
+        for name in names:
+            if name.endswith(CACHE_SUFFIX):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((path, stat.st_size, stat.st_mtime))
+        return files
+
+    def _get_path(self, key):
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
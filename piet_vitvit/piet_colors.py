@@ -39,3 +39,9 @@ HEX_COLORS = {
 
 HEX_WHITE = "#ffffff"
 HEX_BLACK = "#000000"
+
+# codels are stored as small color indices: 0-17 for the hues above,
+# in the same order (index = light * 6 + hue), then white and black
+COLORS = list(HEX_COLORS.values())
+COLOR_WHITE = 18
+COLOR_BLACK = 19
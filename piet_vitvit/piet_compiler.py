@@ -0,0 +1,163 @@
+import inspect
+
+from piet_vitvit import piet_io
+from piet_vitvit.piet_engine import COMMAND_NAMES, COMMAND_NONE, \
+    COMMAND_TRAP, get_state
+
+
+MODULE_HEADER = '''\
+# Generated by piet_vitvit.piet_compiler from {source}
+# (codel size {codel_size}), do not edit.
+import argparse
+{io_source}
+
+stdout = PietOutput()
+stdin = PietInput(output=stdout)
+stack = []
+push = stack.append
+pop = stack.pop
+
+
+class Idle(Exception):
+    pass
+
+
+def roll():
+    if not stack:
+        return
+    top1 = pop()
+    if not stack:
+        return
+    top2 = pop()
+    num = top1 % top2
+    if top2 <= 0 or num == 0:
+        return
+    depth = min(top2, len(stack))
+    if num >= depth:
+        return
+    if num <= depth - num:
+        moved = stack[-num:]
+        del stack[-num:]
+        start = len(stack) - depth + num
+        stack[start:start] = moved
+    else:
+        start = len(stack) - depth
+        moved = stack[start:start + depth - num]
+        del stack[start:start + depth - num]
+        stack.extend(moved)
+'''
+
+MODULE_FOOTER = '''
+
+def run(limit):
+    block, dc = block_{block}, {dc}
+    try:
+        for step in range(limit):
+            block, dc = block(dc)
+    except Idle:
+        pass
+    finally:
+        stdout.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Executes a compiled Piet program")
+    parser.add_argument("-l", "--limit", type=int, default=10000,
+                        help="maximum steps the program will go through"
+                        "(default: 10000)")
+    args = parser.parse_args()
+    print()
+    run(args.limit - 1)
+    if not stdout.line_start:
+        print()
+    print("Steps limit reached")
+'''
+
+
+def _binary(operator):
+    return ["if stack:",
+            "    a = pop()",
+            "    if stack:",
+            f"        push({operator})"]
+
+
+# inlined PietVM commands, with the same behavior on stack underflow
+COMMAND_SOURCES = {
+    "piet_pass": [],
+    "piet_push": ["push({value})"],
+    "piet_pop": ["if stack:",
+                 "    pop()"],
+    "piet_add": _binary("pop() + a"),
+    "piet_sub": _binary("pop() - a"),
+    "piet_mul": _binary("pop() * a"),
+    "piet_div": _binary("pop() // a"),
+    "piet_mod": _binary("pop() % a"),
+    "piet_not": ["if stack:",
+                 "    push(int(not pop()))"],
+    "piet_gt": _binary("int(pop() > a)"),
+    "piet_pointer": ["if stack:",
+                     "    dc = (dc // 2 + pop()) % 4 * 2 + dc % 2"],
+    "piet_switch": ["if stack:",
+                    "    pop()",
+                    "    dc ^= 1"],
+    "piet_dup": ["if stack:",
+                 "    push(stack[-1])"],
+    "piet_roll": ["roll()"],
+    "piet_innum": ["number = stdin.read_number()",
+                   "if number is not None:",
+                   "    push(number)"],
+    "piet_inchar": ["char = stdin.read_char()",
+                    "if char is not None:",
+                    "    push(char)"],
+    "piet_outnum": ["if stack:",
+                    "    stdout.write(str(pop()))"],
+    "piet_outchar": ["if stack:",
+                     "    stdout.write(chr(pop()))"],
+    }
+
+
+def compile_program(transitions, start_state, source="", codel_size=1):
+    entries = transitions.explore(start_state)
+    # the generated module doesn't depend on the package, so the I/O
+    # classes are copied into it
+    lines = [MODULE_HEADER.format(source=source, codel_size=codel_size,
+                                  io_source=inspect.getsource(piet_io))]
+
+    for block in sorted({state // 8 for state in entries}):
+        lines.append("")
+        lines.append("")
+        lines.append(f"def block_{block}(dc):")
+        for state in range(block * 8, block * 8 + 8):
+            if state in entries:
+                lines.append(f"    if dc == {state % 8}:")
+                lines.extend("        " + line for line in
+                             _compile_state(transitions, state,
+                                            entries[state]))
+
+    lines.append(MODULE_FOOTER.format(block=start_state // 8,
+                                      dc=start_state % 8))
+    return "\n".join(lines)
+
+
+def _compile_state(transitions, state, entry):
+    if isinstance(entry, Exception):
+        # the type of the error may not exist in the generated module
+        message = f"{type(entry).__name__}: {entry}"
+        return [f"raise RuntimeError({message!r})"]
+
+    command, next_state, value, codel, block, dp, cc = entry
+    if command == COMMAND_TRAP:
+        return ["sys.exit(\"trapped\")"]
+    if command == COMMAND_NONE:
+        if transitions.skip_stays(state, 0) is not None:
+            # only white slides follow, which change nothing
+            return ["raise Idle()"]
+        return [f"return block_{block}, {get_state(block, dp, cc) % 8}"]
+
+    source = [line.format(value=value)
+              for line in COMMAND_SOURCES[COMMAND_NAMES[command]]]
+    if next_state < 0:
+        return ([f"dc = {get_state(block, dp, cc) % 8}"] + source
+                + [f"return block_{block}, dc"])
+    return source + [f"return block_{next_state // 8}, {next_state % 8}"]
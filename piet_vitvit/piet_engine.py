@@ -0,0 +1,689 @@
+import threading
+import time
+from collections import defaultdict
+
+from piet_vitvit.piet_colors import COLORS, COLOR_WHITE, COLOR_BLACK
+from piet_vitvit.piet_slides import DP_STEPS
+from piet_vitvit.piet_vm import CC, DP, PIET_COMMANDS, PietTrapped
+
+
+# bumped whenever resolved transitions may change, to invalidate caches
+COMPILER_VERSION = 2
+
+# commands, indexed by hue change * 3 + lightness change, followed by two
+# pseudo-commands: sliding through white without moving to another block,
+# and getting trapped
+COMMAND_NAMES = [name for row in PIET_COMMANDS for name in row]
+COMMAND_NONE = len(COMMAND_NAMES)
+COMMAND_TRAP = COMMAND_NONE + 1
+# internal marker for a move into another colored block
+COMMAND_NEXT = -1
+
+# commands, after which the next state is not known in advance: it depends
+# on the new DP and CC, or has to be checked for a white-only cycle
+BRANCH_COMMANDS = (COMMAND_NAMES.index("piet_pointer"),
+                   COMMAND_NAMES.index("piet_switch"),
+                   COMMAND_NONE)
+
+
+# commands, around which a repeated state doesn't mean an endless loop
+IO_COMMANDS = frozenset(COMMAND_NAMES.index(name) for name in (
+    "piet_innum", "piet_inchar", "piet_outnum", "piet_outchar"))
+
+# values every command pops; the ones it pushes are what is on top of the
+# stack afterwards, and roll rolls the stack below them as well
+COMMAND_POPS = [0] * (COMMAND_TRAP + 1)
+for _name, _pops in (("piet_pop", 1), ("piet_add", 2), ("piet_sub", 2),
+                     ("piet_mul", 2), ("piet_div", 2), ("piet_mod", 2),
+                     ("piet_not", 1), ("piet_gt", 2), ("piet_pointer", 1),
+                     ("piet_switch", 1), ("piet_dup", 1), ("piet_roll", 2),
+                     ("piet_outnum", 1), ("piet_outchar", 1)):
+    COMMAND_POPS[COMMAND_NAMES.index(_name)] = _pops
+
+
+def get_command_name(command):
+    if command == COMMAND_NONE:
+        return "WHITE"
+    if command == COMMAND_TRAP:
+        return "TRAP"
+    return COMMAND_NAMES[command][len("piet_"):].upper()
+
+
+def get_state(block, dp, cc):
+    return block * 8 + dp * 2 + (cc > 0)
+
+
+def split_state(state):
+    return state // 8, DP(state // 2 % 4), CC.RIGHT if state % 2 else CC.LEFT
+
+
+class PietTransitions:
+    def __init__(self, matrix, blocks, slides):
+        self.matrix = matrix
+        self.blocks = blocks
+        self.slides = slides
+        self.rows, self.cols = matrix.shape
+        # transitions, indexed by state (block * 8 + DP * 2 + CC), are
+        # resolved on first use and stored as tuples of:
+        # (command, next state or -1 if it depends on the command,
+        #  block size, entry codel or None if staying, next block, DP, CC)
+        self.table = []
+        # white-only cycles as (states, index the cycle starts at), or None,
+        # keyed by the first state
+        self._stay_cycles = {}
+        # blocks are labeled and states resolved by one thread at a time,
+        # so that a program can run in several threads at once
+        self._lock = threading.RLock()
+
+    def get_start_state(self, x, y, dp, cc):
+        with self._lock:
+            block = self.blocks.block_at(x, y)
+            self._extend_table(block.index)
+        return get_state(block.index, dp, cc)
+
+    def resolve(self, state):
+        with self._lock:
+            return self.table[state] or self._resolve(state)
+
+    def _resolve(self, state):
+        index, dp, cc = split_state(state)
+        block = self.blocks.blocks[index]
+        command, x, y, dp, cc = self._leave_block(block, dp, cc)
+
+        if command == COMMAND_NEXT:
+            next_block = self.blocks.block_at(x, y)
+            command = self._get_command(block.color, next_block.color)
+            codel = x, y
+        else:
+            next_block = block
+            codel = None
+        self._extend_table(next_block.index)
+
+        if command in BRANCH_COMMANDS:
+            next_state = -1
+        else:
+            next_state = get_state(next_block.index, dp, cc)
+        entry = (command, next_state, block.size, codel,
+                 next_block.index, dp, cc)
+        self.table[state] = entry
+        return entry
+
+    def explore(self, start_state):
+        # resolves every state reachable from the start one, with pointer
+        # and switch leading to any DP and CC of the next block, and returns
+        # them with their entries, or errors raised while resolving
+        entries = {}
+        pending = [start_state]
+        while pending:
+            state = pending.pop()
+            if state in entries:
+                continue
+            try:
+                entry = self.table[state] or self.resolve(state)
+            except Exception as e:
+                entries[state] = e
+                continue
+            entries[state] = entry
+
+            command, next_state, value, codel, block, dp, cc = entry
+            if command == COMMAND_TRAP:
+                continue
+            if command == COMMAND_NONE:
+                pending.append(get_state(block, dp, cc))
+            elif next_state < 0:
+                pending.extend(get_state(block, 0, 0) + dc
+                               for dc in range(8))
+            else:
+                pending.append(next_state)
+        return entries
+
+    def skip_stays(self, state, steps):
+        # if nothing but white slides, which stay in the block, can follow
+        # the state, returns the state after the given number of them
+        if state not in self._stay_cycles:
+            self._stay_cycles[state] = self._find_stay_cycle(state)
+        cycle = self._stay_cycles[state]
+        if cycle is None:
+            return None
+        path, start = cycle
+        if steps < len(path):
+            return path[steps]
+        return path[start + (steps - start) % (len(path) - start)]
+
+    def _find_stay_cycle(self, state):
+        # a slide only changes DP and CC, so there are at most 8 states
+        path = []
+        while state not in path:
+            try:
+                entry = self.table[state] or self.resolve(state)
+            except Exception:
+                # the error is raised once the state is actually reached
+                return None
+            if entry[0] != COMMAND_NONE:
+                return None
+            path.append(state)
+            state = get_state(entry[4], entry[5], entry[6])
+        return path, path.index(state)
+
+    def _extend_table(self, index):
+        if len(self.table) < (index + 1) * 8:
+            self.table.extend([None] * ((index + 1) * 8 - len(self.table)))
+
+    def _leave_block(self, block, dp, cc):
+        # the same rotation and white sliding as in PietInterpreter
+        edge_x, edge_y = block.get_exit(dp, cc)
+        iteration = 1
+        while iteration <= 8:
+            step_x, step_y = DP_STEPS[dp]
+            next_x, next_y = edge_x + step_x, edge_y + step_y
+
+            if not (0 <= next_x < self.cols and 0 <= next_y < self.rows) \
+                    or self.matrix[next_y, next_x] == COLOR_BLACK:
+                iteration += 1
+                if iteration % 2:
+                    dp = DP((dp + 1) % 4)
+                else:
+                    cc = CC(cc * -1)
+                if block.color != COLOR_WHITE:
+                    edge_x, edge_y = block.get_exit(dp, cc)
+
+            elif self.matrix[next_y, next_x] == COLOR_WHITE:
+                trapped, x, y, dp, cc = self.slides.slide(
+                    next_x, next_y, dp, cc)
+                if trapped:
+                    return COMMAND_TRAP, x, y, dp, cc
+                return COMMAND_NONE, x, y, dp, cc
+
+            else:
+                return COMMAND_NEXT, next_x, next_y, dp, cc
+        return COMMAND_TRAP, edge_x, edge_y, dp, cc
+
+    def _get_command(self, old, new):
+        old_color = COLORS[old]
+        new_color = COLORS[new]
+        d_hue = (new_color["hue"] - old_color["hue"]) % 6
+        d_light = (new_color["light"] - old_color["light"]) % 3
+        return d_hue * 3 + d_light
+
+
+class PietEngine:
+    def __init__(self, transitions, pvm, x=0, y=0):
+        self.transitions = transitions
+        self.pvm = pvm
+        self.step = 0
+        self.codel = x, y
+        self.state = transitions.get_start_state(x, y, pvm.dp, pvm.cc)
+        # PietOptimizer, whose superinstructions replace straight runs of
+        # stack commands, if set
+        self.optimizer = None
+        # whether to stop with PietCycle once the program is found to loop
+        # forever without input or output
+        self.detect_cycles = False
+        # PietProfiler, counting the steps in every state, if set
+        self.profiler = None
+        # PietBreakpoints, before any of which the engine stops with
+        # PietBreak, if set
+        self.breakpoints = None
+        # PietRecorder, recording every step, if set
+        self.recorder = None
+        # PietJIT, tracing hot loops, if set; it is not used with memory
+        # limits, which every command has to check
+        self.jit = None
+
+        self.ops = [getattr(pvm, name) for name in COMMAND_NAMES]
+        self.ops.append(self._stay)
+        self.ops.append(self._trap)
+
+    @classmethod
+    def from_interpreter(cls, interpreter):
+        transitions = PietTransitions(interpreter.matrix, interpreter.blocks,
+                                      interpreter.slides)
+        engine = cls(transitions, interpreter.pvm,
+                     interpreter.curr_x, interpreter.curr_y)
+        engine.step = interpreter.step
+        return engine
+
+    def run(self, steps):
+        if self.profiler is not None:
+            return self._run_profiled(steps)
+        if self.breakpoints is not None:
+            return self._run_watched(steps)
+        if self.recorder is not None:
+            return self._run_recorded(steps)
+        if self.jit is not None and not self.pvm.limited:
+            return self._run_jitted(steps)
+        if self.optimizer is not None or self.detect_cycles:
+            return self._run_checked(steps)
+        pvm = self.pvm
+        ops = self.ops
+        table = self.transitions.table
+        resolve = self.transitions.resolve
+        skip_stays = self.transitions.skip_stays
+        state = self.state
+        codel = self.codel
+        entry = None
+        done = 0
+
+        try:
+            for done in range(1, steps + 1):
+                entry = table[state] or resolve(state)
+                command, next_state, value, next_codel, block, dp, cc = entry
+                pvm.current_value = value
+                if next_state < 0 and command == COMMAND_NONE:
+                    next_state = get_state(block, dp, cc)
+                    skipped = skip_stays(next_state, steps - done)
+                    if skipped is not None:
+                        state = skipped
+                        done = steps
+                        break
+                elif next_state < 0:
+                    pvm.dp, pvm.cc = dp, cc
+                    ops[command]()
+                    next_state = block * 8 + pvm.dp * 2 + (pvm.cc > 0)
+                else:
+                    ops[command]()
+                if next_codel is not None:
+                    codel = next_codel
+                state = next_state
+        except _Trapped:
+            self._stop(entry[1], codel, done)
+            raise PietTrapped(self.step)
+        except Exception:
+            self._stop(state, codel, done)
+            raise
+        self._stop(state, codel, done)
+
+    def _run_checked(self, steps):
+        # the same loop, but a superinstruction is executed instead of the
+        # commands it replaces, whenever the stack is deep enough for them
+        # to never underflow and the run fits into the steps left, and the
+        # whole state is compared with one saved at growing intervals, as in
+        # Brent's algorithm, to find loops without input or output; with
+        # memory limits, which every command checks on its own, the
+        # commands aren't fused
+        pvm = self.pvm
+        stack = pvm.stack
+        ops = self.ops
+        table = self.transitions.table
+        resolve = self.transitions.resolve
+        skip_stays = self.transitions.skip_stays
+        if self.optimizer is not None and not pvm.limited:
+            runs = self.optimizer.runs
+            get_run = self.optimizer.get_run
+        else:
+            runs = defaultdict(type(None))
+            get_run = runs.__getitem__
+        detect = self.detect_cycles
+        state = self.state
+        codel = self.codel
+        entry = None
+        done = fused = eliminated = 0
+        saved_state, saved_stack, saved_done = -1, None, 0
+        interval = left = 1
+
+        try:
+            while done < steps:
+                if detect:
+                    if state == saved_state and stack == saved_stack:
+                        raise PietCycle(self.step + done,
+                                        done - saved_done)
+                    left -= 1
+                    if not left:
+                        saved_state, saved_stack, saved_done = \
+                            state, stack.copy(), done
+                        interval *= 2
+                        left = interval
+
+                run = runs[state] if state in runs else get_run(state)
+                if run is not None and run.length <= steps - done \
+                        and len(stack) >= run.depth:
+                    try:
+                        run.function(stack)
+                    except ZeroDivisionError:
+                        # left to the commands, to fail at the right step
+                        pass
+                    else:
+                        done += run.length
+                        fused += 1
+                        eliminated += run.length - 1
+                        pvm.current_value = run.value
+                        codel = run.codel
+                        state = run.next_state
+                        continue
+
+                done += 1
+                entry = table[state] or resolve(state)
+                command, next_state, value, next_codel, block, dp, cc = entry
+                pvm.current_value = value
+                if next_state < 0 and command == COMMAND_NONE:
+                    next_state = get_state(block, dp, cc)
+                    skipped = skip_stays(next_state, steps - done)
+                    if skipped is not None:
+                        if detect:
+                            # nothing but white slides follow
+                            path, start = \
+                                self.transitions._stay_cycles[next_state]
+                            raise PietCycle(self.step + done,
+                                            len(path) - start)
+                        state = skipped
+                        done = steps
+                        break
+                elif next_state < 0:
+                    pvm.dp, pvm.cc = dp, cc
+                    ops[command]()
+                    next_state = block * 8 + pvm.dp * 2 + (pvm.cc > 0)
+                else:
+                    ops[command]()
+                    if command in IO_COMMANDS:
+                        # the state may repeat, but the program does not
+                        saved_state = -1
+                        interval = left = 1
+                if next_codel is not None:
+                    codel = next_codel
+                state = next_state
+        except _Trapped:
+            self._stop(entry[1], codel, done)
+            raise PietTrapped(self.step)
+        except Exception:
+            self._stop(state, codel, done)
+            raise
+        finally:
+            if self.optimizer is not None:
+                self.optimizer.fused += fused
+                self.optimizer.eliminated += eliminated
+        self._stop(state, codel, done)
+
+    def _run_profiled(self, steps):
+        # the same loop, counting the steps started in every state, timing
+        # resolution and one command in every profiler.sample_every, and
+        # keeping track of the deepest stack; states resolved before aren't
+        # resolved again, so only the first resolution of each is timed
+        profiler = self.profiler
+        profiler.memoized = True
+        pvm = self.pvm
+        stack = pvm.stack
+        ops = self.ops
+        table = self.transitions.table
+        skip_stays = self.transitions.skip_stays
+        perf_counter = time.perf_counter
+        state = self.state
+        codel = self.codel
+        entry = None
+        done = 0
+        counts = defaultdict(int)
+        every = left = profiler.sample_every
+        max_depth = profiler.max_depth
+
+        def resolve(state):
+            started = perf_counter()
+            try:
+                return self.transitions.resolve(state)
+            finally:
+                profiler.resolving(perf_counter() - started)
+
+        try:
+            for done in range(1, steps + 1):
+                counts[state] += 1
+                entry = table[state] or resolve(state)
+                command, next_state, value, next_codel, block, dp, cc = entry
+                pvm.current_value = value
+                if next_state < 0 and command == COMMAND_NONE:
+                    next_state = get_state(block, dp, cc)
+                    skipped = skip_stays(next_state, steps - done)
+                    if skipped is not None:
+                        # all white slides in the same block
+                        counts[next_state] += steps - done
+                        state = skipped
+                        done = steps
+                        break
+                else:
+                    if next_state < 0:
+                        pvm.dp, pvm.cc = dp, cc
+                    left -= 1
+                    if left:
+                        ops[command]()
+                    else:
+                        left = every
+                        started = perf_counter()
+                        ops[command]()
+                        profiler.sample(command, perf_counter() - started)
+                    if next_state < 0:
+                        next_state = block * 8 + pvm.dp * 2 + (pvm.cc > 0)
+                    if len(stack) > max_depth:
+                        max_depth = len(stack)
+                        profiler.stack_depth(max_depth, self.step + done)
+                if next_codel is not None:
+                    codel = next_codel
+                state = next_state
+        except _Trapped:
+            self._stop(entry[1], codel, done)
+            raise PietTrapped(self.step)
+        except Exception:
+            self._stop(state, codel, done)
+            raise
+        finally:
+            profiler.add_states(counts, table)
+        self._stop(state, codel, done)
+
+    def _run_watched(self, steps):
+        # the same loop, checking the breakpoints before every step; those
+        # on blocks and commands once for every state
+        breakpoints = self.breakpoints
+        blocks = breakpoints.get_blocks(self.transitions)
+        check_state = breakpoints.check_state
+        check_stack = breakpoints.check_stack if breakpoints.dynamic \
+            else None
+        reasons = {}
+        pvm = self.pvm
+        stack = pvm.stack
+        ops = self.ops
+        table = self.transitions.table
+        resolve = self.transitions.resolve
+        skip_stays = self.transitions.skip_stays
+        state = self.state
+        codel = self.codel
+        entry = None
+        done = 0
+
+        try:
+            for done in range(1, steps + 1):
+                entry = table[state] or resolve(state)
+                command, next_state, value, next_codel, block, dp, cc = entry
+                if state in reasons:
+                    reason = reasons[state]
+                else:
+                    reason = reasons[state] = check_state(blocks, state // 8,
+                                                          command)
+                if reason is None and check_stack is not None:
+                    reason = check_stack(command, stack)
+                if reason is not None:
+                    self._stop(state, codel, done - 1)
+                    raise PietBreak(self.step, reason)
+
+                pvm.current_value = value
+                if next_state < 0 and command == COMMAND_NONE:
+                    next_state = get_state(block, dp, cc)
+                    # white slides change neither the block nor the stack
+                    skipped = skip_stays(next_state, steps - done)
+                    if skipped is not None:
+                        state = skipped
+                        done = steps
+                        break
+                elif next_state < 0:
+                    pvm.dp, pvm.cc = dp, cc
+                    ops[command]()
+                    next_state = block * 8 + pvm.dp * 2 + (pvm.cc > 0)
+                else:
+                    ops[command]()
+                if next_codel is not None:
+                    codel = next_codel
+                state = next_state
+        except _Trapped:
+            self._stop(entry[1], codel, done)
+            raise PietTrapped(self.step)
+        except PietBreak:
+            raise
+        except Exception:
+            self._stop(state, codel, done)
+            raise
+        self._stop(state, codel, done)
+
+    def _run_recorded(self, steps):
+        # the same loop, recording the state after every step and the values
+        # its command popped and pushed; white slides are not skipped, as
+        # every one of them is a step of the trace
+        recorder = self.recorder
+        record = recorder.record
+        pvm = self.pvm
+        stack = pvm.stack
+        ops = self.ops
+        pops = COMMAND_POPS
+        table = self.transitions.table
+        resolve = self.transitions.resolve
+        state = self.state
+        codel = self.codel
+        entry = None
+        done = 0
+        recorder.begin(self.step, state, stack)
+
+        try:
+            for done in range(1, steps + 1):
+                entry = table[state] or resolve(state)
+                command, next_state, value, next_codel, block, dp, cc = entry
+                pvm.current_value = value
+                if next_state < 0 and command == COMMAND_NONE:
+                    next_state = get_state(block, dp, cc)
+                    record(next_state, command, (), ())
+                else:
+                    if next_state < 0:
+                        pvm.dp, pvm.cc = dp, cc
+                    start = len(stack) - pops[command]
+                    if start < 0:
+                        start = 0
+                    popped = stack[start:]
+                    ops[command]()
+                    if next_state < 0:
+                        next_state = block * 8 + pvm.dp * 2 + (pvm.cc > 0)
+                    record(next_state, command, popped, stack[start:])
+                if next_codel is not None:
+                    codel = next_codel
+                state = next_state
+        except _Trapped:
+            record(entry[1], COMMAND_TRAP, (), ())
+            self._stop(entry[1], codel, done)
+            raise PietTrapped(self.step)
+        except Exception:
+            self._stop(state, codel, done)
+            raise
+        self._stop(state, codel, done)
+
+    def _run_jitted(self, steps):
+        # the same loop, but the states pointer and switch lead to are
+        # counted, and once one of them is hot, the loop starting there is
+        # recorded for a pass and compiled by PietJIT into a trace, which
+        # then runs it for as long as its guards hold
+        jit = self.jit
+        traces = jit.traces
+        pvm = self.pvm
+        stack = pvm.stack
+        write = pvm.output.write
+        ops = self.ops
+        table = self.transitions.table
+        resolve = self.transitions.resolve
+        skip_stays = self.transitions.skip_stays
+        recording = jit.recording
+        state = self.state
+        codel = self.codel
+        entry = None
+        done = 0
+
+        try:
+            while done < steps:
+                if recording is not None:
+                    if state == jit.start and recording \
+                            or len(recording) > jit.max_length:
+                        recording = jit.stop(state, codel)
+                    else:
+                        recording.append(state)
+                done += 1
+                entry = table[state] or resolve(state)
+                command, next_state, value, next_codel, block, dp, cc = entry
+                pvm.current_value = value
+                if next_state < 0 and command == COMMAND_NONE:
+                    next_state = get_state(block, dp, cc)
+                    skipped = skip_stays(next_state, steps - done)
+                    if skipped is not None:
+                        state = skipped
+                        done = steps
+                        break
+                elif next_state < 0:
+                    pvm.dp, pvm.cc = dp, cc
+                    ops[command]()
+                    state = block * 8 + pvm.dp * 2 + (pvm.cc > 0)
+                    if next_codel is not None:
+                        codel = next_codel
+                    if recording is not None:
+                        continue
+                    trace = traces.get(state, False)
+                    if trace:
+                        taken, exit = trace.function(stack, write,
+                                                     steps - done)
+                        if taken:
+                            done += taken
+                            state, codel = trace.exits[exit]
+                            jit.entered += 1
+                            jit.steps += taken
+                            jit.exits += exit > 0
+                        else:
+                            jit.refused += 1
+                    elif trace is False and jit.arrive(state):
+                        recording = jit.recording
+                    continue
+                else:
+                    ops[command]()
+                if next_codel is not None:
+                    codel = next_codel
+                state = next_state
+        except _Trapped:
+            self._stop(entry[1], codel, done)
+            raise PietTrapped(self.step)
+        except Exception:
+            self._stop(state, codel, done)
+            raise
+        self._stop(state, codel, done)
+
+    def sync(self, interpreter):
+        interpreter.step = self.step
+        interpreter.curr_x, interpreter.curr_y = self.codel
+
+    def _stop(self, state, codel, steps):
+        self.state = state
+        self.codel = codel
+        self.step += steps
+        index, self.pvm.dp, self.pvm.cc = split_state(state)
+        self.pvm.output.flush()
+
+    def _stay(self):
+        pass
+
+    def _trap(self):
+        raise _Trapped()
+
+
+class PietCycle(Exception):
+    def __init__(self, step, period):
+        super().__init__(f"endless loop found at step {step}")
+        self.step = step
+        self.period = period
+
+
+class PietBreak(Exception):
+    # raised by PietEngine before the step, at which a breakpoint is hit
+    def __init__(self, step, reason):
+        super().__init__(f"breakpoint hit after step {step}: {reason}")
+        self.step = step
+        self.reason = reason
+
+
+class _Trapped(Exception):
+    pass
@@ -0,0 +1,142 @@
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from piet_vitvit.piet_colors import HEX_COLORS, HEX_WHITE, HEX_BLACK, \
+    COLOR_WHITE, COLOR_BLACK
+
+
+# every channel of a Piet color is one of 0x00, 0xc0 or 0xff, so a pixel
+# is mapped to a 6-bit code of its channel levels, and the code to a color
+CHANNEL_LEVELS = np.full(256, 3, dtype=np.uint8)
+CHANNEL_LEVELS[0x00] = 0
+CHANNEL_LEVELS[0xc0] = 1
+CHANNEL_LEVELS[0xff] = 2
+
+
+def _get_level_code(hex_code):
+    r, g, b = (int(hex_code[i:i + 2], 16) for i in (1, 3, 5))
+    return CHANNEL_LEVELS[r] * 16 + CHANNEL_LEVELS[g] * 4 + CHANNEL_LEVELS[b]
+
+
+# colors outside of the Piet palette are treated as white
+COLOR_LOOKUP = np.full(64, COLOR_WHITE, dtype=np.uint8)
+for index, hex_code in enumerate(HEX_COLORS):
+    COLOR_LOOKUP[_get_level_code(hex_code)] = index
+COLOR_LOOKUP[_get_level_code(HEX_WHITE)] = COLOR_WHITE
+COLOR_LOOKUP[_get_level_code(HEX_BLACK)] = COLOR_BLACK
+
+
+def decode_codels(image, codel_size=1):
+    pixels = np.asarray(image.convert("RGB"))
+    cols = pixels.shape[1] // codel_size
+    rows = pixels.shape[0] // codel_size
+    codels = pixels[:rows * codel_size:codel_size,
+                    :cols * codel_size:codel_size]
+    levels = CHANNEL_LEVELS[codels]
+    return COLOR_LOOKUP[levels[..., 0] * 16 + levels[..., 1] * 4
+                        + levels[..., 2]]
+
+
+def read_box(image, box):
+    # the part of the image in the box; an image stored uncompressed, row
+    # after row, as BMP, PPM or TGA are, and not loaded yet, is read from
+    # its file in the rows of the box alone, while any other, PNG among
+    # them, is decoded by PIL whole on the first read and kept in memory
+    tile = getattr(image, "tile", None)
+    if not tile or len(tile) != 1 or image.mode not in ("RGB", "RGBA",
+                                                         "L", "P"):
+        return image.crop(box)
+    decoder, extents, offset, args = tile[0]
+    if decoder != "raw" or tuple(extents) != (0, 0, *image.size):
+        return image.crop(box)
+    if isinstance(args, str):
+        args = (args, 0, 1)
+    rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+    try:
+        width = len(Image.new(image.mode, (image.width, 1)).tobytes(
+            "raw", rawmode))
+    except (ValueError, OSError):
+        return image.crop(box)
+    if width % image.width:
+        return image.crop(box)
+    depth = width // image.width
+    stride = stride or width
+
+    left, top, right, bottom = box
+    first = top if orientation > 0 else image.height - bottom
+    image.fp.seek(offset + first * stride)
+    rows = np.frombuffer(image.fp.read((bottom - top) * stride),
+                         dtype=np.uint8).reshape(bottom - top, stride)
+    data = rows[:, left * depth:right * depth].tobytes()
+    band = Image.frombytes(image.mode, (right - left, bottom - top), data,
+                           "raw", rawmode, 0, orientation)
+    if image.mode == "P":
+        band.putpalette(image.palette)
+    return band
+
+
+# images with more codels than this are decoded tile by tile
+TILED_CODELS = 4096 * 4096
+# side of a tile in codels and decoded tiles kept at once
+TILE_SIZE = 256
+MAX_TILES = 256
+
+
+class PietTiles:
+    def __init__(self, image, codel_size=1, tile_size=TILE_SIZE,
+                 max_tiles=MAX_TILES):
+        # color indices of the codels of an image, read like the matrix
+        # returned by decode_codels, but decoded a tile at a time when
+        # first read, keeping the tiles read last; only an uncompressed
+        # image is read from its file a tile at a time, see read_box
+        self.image = image
+        self.codel_size = codel_size
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self.shape = (image.height // codel_size, image.width // codel_size)
+        self.tiles = OrderedDict()
+        self.decoded = 0
+        # every tile decoded so far, kept or not
+        self.read = set()
+
+    def __getitem__(self, key):
+        # a codel, or codels of a row within a tile, at [y, x0:x1]
+        y, x = key
+        size = self.tile_size
+        if isinstance(x, slice):
+            start = x.start or 0
+            tile = self.get_tile(y // size, start // size)
+            return tile[y % size, start % size:(x.stop - 1) % size + 1]
+        return self.get_tile(y // size, x // size)[y % size, x % size]
+
+    def get_tile(self, row, col):
+        key = row, col
+        tile = self.tiles.get(key)
+        if tile is not None:
+            self.tiles.move_to_end(key)
+            return tile
+        size = self.tile_size * self.codel_size
+        rows, cols = self.shape
+        box = (col * size, row * size,
+               min((col + 1) * size, cols * self.codel_size),
+               min((row + 1) * size, rows * self.codel_size))
+        tile = decode_codels(read_box(self.image, box), self.codel_size)
+        self.decoded += 1
+        self.read.add(key)
+        self.tiles[key] = tile
+        if len(self.tiles) > self.max_tiles:
+            self.tiles.popitem(last=False)
+        return tile
+
+
+def open_codels(image, codel_size=1, tiled=None):
+    # the codels of the image, decoded at once, or tile by tile if tiled,
+    # which a large image is if not given
+    rows, cols = image.height // codel_size, image.width // codel_size
+    if tiled is None:
+        tiled = rows * cols > TILED_CODELS
+    if tiled:
+        return PietTiles(image, codel_size)
+    return decode_codels(image, codel_size)
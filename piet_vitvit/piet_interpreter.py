@@ -1,81 +1,65 @@
-import sys
-from operator import itemgetter
+import time
 from os.path import abspath
 from PIL import Image
 
-from piet_vitvit.piet_vm import PietVM, CC, DP
-from piet_vitvit.piet_colors import HEX_COLORS, HEX_WHITE, HEX_BLACK
-
-
-PIET_COMMANDS = [
-    ["piet_pass", "piet_push", "piet_pop"],
-    ["piet_add", "piet_sub", "piet_mul"],
-    ["piet_div", "piet_mod", "piet_not"],
-    ["piet_gt", "piet_pointer", "piet_switch"],
-    ["piet_dup", "piet_roll", "piet_innum"],
-    ["piet_inchar", "piet_outnum", "piet_outchar"],
-    ]
+from piet_vitvit.piet_blocks import PietBlocks
+from piet_vitvit.piet_image import open_codels
+from piet_vitvit.piet_slides import PietSlides
+from piet_vitvit.piet_tracer import ConsoleTracer
+from piet_vitvit.piet_vm import PietVM, CC, DP, PIET_COMMANDS, \
+    PietTrapped
+from piet_vitvit.piet_colors import COLORS, COLOR_WHITE, COLOR_BLACK
+from piet_vitvit.piet_engine import COMMAND_NAMES, COMMAND_NONE, \
+    COMMAND_POPS, COMMAND_TRAP
 
 
 class PietInterpreter:
-    def __init__(self, filename, codel_size=1):
+    def __init__(self, filename, codel_size=1, tiled=None, lazy=False):
         self.pvm = PietVM()
         self.step = 0
         self.curr_x, self.curr_y = 0, 0
         self.edge_x, self.edge_y = 0, 0
         self.next_x, self.next_y = 0, 0
-        self.block = [(0, 0)]
+        self.block = None
         self.seen_white = False
 
         self.filename = filename
         self.codel_size = codel_size
-        self.image = Image.open(abspath(self.filename)).convert("RGB")
-
-        image_size_x, image_size_y = self.image.size
-        self.cols = image_size_x // codel_size
-        self.rows = image_size_y // codel_size
-        self.matrix = [[0 for x in range(self.cols)]
-                       for y in range(self.rows)]
-
-        for x in range(self.cols):
-            for y in range(self.rows):
-                r, g, b = self.image.getpixel((x * codel_size,
-                                               y * codel_size))
-                self.matrix[y][x] = f"#{r:02x}{g:02x}{b:02x}"
-        self.debug = False
+        self.image = Image.open(abspath(self.filename))
+
+        # PietTiles for a large image, or tiled if given, decoded and
+        # labeled only where the execution goes, as are the blocks if lazy
+        self.matrix = open_codels(self.image, codel_size, tiled)
+        self.rows, self.cols = self.matrix.shape
+        tile_size = getattr(self.matrix, "tile_size", None)
+        self.blocks = PietBlocks(self.matrix, self.cols, self.rows,
+                                 tile_size, lazy or tile_size is not None)
+        self.slides = PietSlides(self.matrix)
+        # PietTracer, reported every event of a step, if set
+        self.tracer = None
+        # PietProfiler, counting and timing every step, if set
+        self.profiler = None
 
     def piet_step(self):
+        if self.tracer is not None:
+            return self._traced_step()
+        if self.profiler is not None:
+            return self._profiled_step()
         self.step += 1
-        self._debug_log("-" * 40)
-        self._debug_log(f"START STEP {self.step}")
-        self._debug_action_prompt()
-
         self._piet_get_curr()
-        self._debug_log_state()
-        self._debug_action_prompt()
-
         self._piet_get_next()
-
         self._piet_move()
-        self.pvm.debug_log_stack()
-        self._debug_action_prompt()
-
-        self._debug_log(f"END STEP {self.step}")
-        self._debug_action_prompt()
 
     def start_debug(self):
-        self.debug = True
-        self.pvm.debug = True
+        self.tracer = ConsoleTracer()
 
     def stop_debug(self):
-        self.debug = False
-        self.pvm.debug = False
+        self.tracer = None
 
     def _piet_get_curr(self):
-        self.block = [(self.curr_x, self.curr_y)]
-        self._add_adjacent_to_block(self.curr_x, self.curr_y)
+        self.block = self.blocks.block_at(self.curr_x, self.curr_y)
         self.edge_x, self.edge_y = self._get_block_edge()
-        self.pvm.current_value = len(self.block)
+        self.pvm.current_value = self.block.size
 
     def _piet_get_next(self):
         iteration = 1
@@ -83,31 +67,27 @@ class PietInterpreter:
         while iteration <= 8:
             self.next_x, self.next_y = self._get_next_in_new_block(
                 self.edge_x, self.edge_y)
-            self._debug_log_looking_at_next()
-            self._debug_action_prompt()
 
             if not self._is_valid(self.next_x, self.next_y):
-                self._debug_log("Can't move there. Rotating...")
                 iteration += 1
                 self._turn_dp_and_cc(iteration)
-                if self.matrix[self.edge_y][self.edge_x] != HEX_WHITE:
-                    self.block = [(self.edge_x, self.edge_y)]
-                    self._add_adjacent_to_block(self.edge_x, self.edge_y)
+                if self.block.color != COLOR_WHITE:
                     self.edge_x, self.edge_y = self._get_block_edge()
 
-            elif self.matrix[self.next_y][self.next_x] == HEX_WHITE:
-                self._debug_log("Entered WHITE. Passing through...")
-                if not self.seen_white:
-                    self.seen_white = True
-                    iteration = 1
-                self.edge_x, self.edge_y = self.next_x, self.next_y
+            elif self.matrix[self.next_y, self.next_x] == COLOR_WHITE:
+                self.seen_white = True
+                trapped, self.edge_x, self.edge_y, self.pvm.dp, \
+                    self.pvm.cc = self.slides.slide(
+                        self.next_x, self.next_y, self.pvm.dp, self.pvm.cc)
+                if trapped:
+                    break
+                self.next_x, self.next_y = self.edge_x, self.edge_y
+                return
 
             else:
-                self._debug_log("Moving there...")
                 return
-        else:
-            self._debug_log("Execution trapped!")
-            sys.exit("trapped")
+        self.pvm.output.flush()
+        raise PietTrapped(self.step)
 
     def _piet_move(self):
         if not self.seen_white:
@@ -115,26 +95,104 @@ class PietInterpreter:
             self._do_command(command)
             self.curr_x, self.curr_y = self.next_x, self.next_y
 
+    def _traced_step(self):
+        # the same step, reporting every event to the tracer
+        tracer = self.tracer
+        self.step += 1
+        tracer.step_started(self.step)
+
+        self._piet_get_curr()
+        tracer.block_entered(self.curr_x, self.curr_y, self.block,
+                             self.pvm.current_value, self.pvm.stack)
+
+        self._traced_get_next()
+
+        if not self.seen_white:
+            tracer.color_shifted(
+                COLORS[self.matrix[self.curr_y, self.curr_x]],
+                COLORS[self.matrix[self.next_y, self.next_x]])
+            stack = self.pvm.stack
+            before = stack.copy()
+            command = self._get_command()
+            start = max(0, len(stack)
+                        - COMMAND_POPS[COMMAND_NAMES.index(command)])
+            self._do_command(command)
+            self.pvm.output.flush()
+            tracer.command_executed(command, self.pvm.current_value,
+                                    before[start:], stack[start:],
+                                    self.pvm.dp, self.pvm.cc)
+            if stack != before:
+                tracer.stack_changed(stack)
+            self.curr_x, self.curr_y = self.next_x, self.next_y
+        tracer.step_finished(self.step)
+
+    def _profiled_step(self):
+        profiler = self.profiler
+        self.step += 1
+        self._piet_get_curr()
+        index = self.block.index
+        started = time.perf_counter()
+        try:
+            self._piet_get_next()
+        except PietTrapped:
+            profiler.count(index, COMMAND_TRAP)
+            raise
+        finally:
+            profiler.resolving(time.perf_counter() - started)
+
+        if self.seen_white:
+            profiler.count(index, COMMAND_NONE)
+            return
+        command = self._get_command()
+        started = time.perf_counter()
+        self._do_command(command)
+        command = COMMAND_NAMES.index(command)
+        profiler.sample(command, time.perf_counter() - started)
+        profiler.count(index, command)
+        profiler.stack_depth(len(self.pvm.stack), self.step)
+        self.curr_x, self.curr_y = self.next_x, self.next_y
+
+    def _traced_get_next(self):
+        tracer = self.tracer
+        iteration = 1
+        self.seen_white = False
+        while iteration <= 8:
+            self.next_x, self.next_y = self._get_next_in_new_block(
+                self.edge_x, self.edge_y)
+            tracer.edge_chosen(self.edge_x, self.edge_y, self.next_x,
+                               self.next_y, self.pvm.dp, self.pvm.cc)
+
+            if not self._is_valid(self.next_x, self.next_y):
+                iteration += 1
+                self._turn_dp_and_cc(iteration)
+                tracer.rotated(iteration, self.pvm.dp, self.pvm.cc)
+                if self.block.color != COLOR_WHITE:
+                    self.edge_x, self.edge_y = self._get_block_edge()
+
+            elif self.matrix[self.next_y, self.next_x] == COLOR_WHITE:
+                self.seen_white = True
+                trapped, self.edge_x, self.edge_y, self.pvm.dp, \
+                    self.pvm.cc = self.slides.slide(
+                        self.next_x, self.next_y, self.pvm.dp, self.pvm.cc)
+                if trapped:
+                    break
+                self.next_x, self.next_y = self.edge_x, self.edge_y
+                tracer.white_slid(self.next_x, self.next_y,
+                                  self.pvm.dp, self.pvm.cc)
+                return
+
+            else:
+                return
+        tracer.trapped()
+        self.pvm.output.flush()
+        raise PietTrapped(self.step)
+
     def _is_valid(self, x, y):
         return 0 <= x < self.cols and 0 <= y < self.rows \
-            and self.matrix[y][x] != HEX_BLACK
-
-    def _add_adjacent_to_block(self, x, y):
-        for dx, dy in (0, -1), (0, 1), (-1, 0), (1, 0):
-            if (x + dx, y + dy) not in self.block \
-                and self._is_valid(x + dx, y + dy) \
-                    and self.matrix[y][x] == self.matrix[y + dy][x + dx]:
-                self.block.append((x + dx, y + dy))
-                self._add_adjacent_to_block(x + dx, y + dy)
+            and self.matrix[y, x] != COLOR_BLACK
 
     def _get_block_edge(self):
-        key1 = 1 - self.pvm.dp % 2
-        key2 = 1 - key1
-        rev1 = not(self.pvm.dp % 2 - int(self.pvm.cc < 0))
-        rev2 = self.pvm.dp < 2
-        self.block.sort(key=itemgetter(key1), reverse=rev1)
-        self.block.sort(key=itemgetter(key2), reverse=rev2)
-        return self.block[0]
+        return self.block.get_exit(self.pvm.dp, self.pvm.cc)
 
     def _get_next_in_new_block(self, x, y):
         if self.pvm.dp == DP.RIGHT:
@@ -152,12 +210,10 @@ class PietInterpreter:
             self.pvm.dp = DP((self.pvm.dp + 1) % 4)
         else:
             self.pvm.cc = CC(self.pvm.cc * -1)
-        self._debug_log
 
     def _get_command(self):
-        old_color = HEX_COLORS[self.matrix[self.curr_y][self.curr_x]]
-        new_color = HEX_COLORS[self.matrix[self.next_y][self.next_x]]
-        self._debug_log_color_shift(old_color, new_color)
+        old_color = COLORS[self.matrix[self.curr_y, self.curr_x]]
+        new_color = COLORS[self.matrix[self.next_y, self.next_x]]
 
         d_hue = new_color["hue"] - old_color["hue"]
         d_light = new_color["light"] - old_color["light"]
@@ -167,29 +223,5 @@ class PietInterpreter:
         piet_command = getattr(self.pvm, command)
         piet_command()
 
-    def _debug_log(self, message):
-        if self.debug:
-            print(f"[INTER] {message}")
-
-    def _debug_log_state(self):
-        self._debug_log("CURRENT STATE:")
-        self._debug_log(f"pos: {self.curr_x, self.curr_y}")
-        self._debug_log(f"block: {self.block}")
-        self.pvm.debug_log_value()
-        self.pvm.debug_log_stack()
-
-    def _debug_log_looking_at_next(self):
-        self.pvm.debug_log_direction()
-        self._debug_log(f"current edge: {self.edge_x, self.edge_y}")
-        self._debug_log(f"looking at: {self.next_x, self.next_y}")
-
-    def _debug_log_color_shift(self, old, new):
-        self._debug_log(f"{old['light'].name} {old['hue'].name} -> "
-                        f"{new['light'].name} {new['hue'].name}")
-
-    def _debug_action_prompt(self):
-        if (self.debug):
-            input("...")
-
     def _dispose(self):
         del self
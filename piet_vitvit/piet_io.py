@@ -0,0 +1,148 @@
+import codecs
+import io
+import sys
+
+
+FLUSH_ALWAYS = "always"
+FLUSH_LINE = "line"
+FLUSH_FULL = "full"
+FLUSH_POLICIES = (FLUSH_ALWAYS, FLUSH_LINE, FLUSH_FULL)
+
+BUFFER_SIZE = 8192
+READ_SIZE = 65536
+
+
+class PietOutput:
+    def __init__(self, stream=None, flush=None, buffer_size=BUFFER_SIZE):
+        # a text or binary stream, sys.stdout at the moment of flushing if
+        # None, and when to flush it: after every write, after a newline or
+        # once the buffer is full, depending on whether it is a terminal
+        # if not given
+        self.stream = stream
+        self.flush_policy = flush
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.size = 0
+        # whether nothing, or a newline, was written last
+        self.line_start = True
+
+    def write(self, text):
+        self.buffer.append(text)
+        self.size += len(text)
+        self.line_start = text.endswith("\n")
+        if self.flush_policy is None:
+            self.flush_policy = FLUSH_LINE if self._get_stream().isatty() \
+                else FLUSH_FULL
+        if self.size >= self.buffer_size \
+                or self.flush_policy == FLUSH_ALWAYS \
+                or self.flush_policy == FLUSH_LINE and "\n" in text:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        text = "".join(self.buffer)
+        self.buffer.clear()
+        self.size = 0
+        stream = self._get_stream()
+        if isinstance(stream, io.TextIOBase):
+            stream.write(text)
+        else:
+            stream.write(text.encode("utf-8", "surrogatepass"))
+        stream.flush()
+
+    def _get_stream(self):
+        return sys.stdout if self.stream is None else self.stream
+
+
+class PietInput:
+    def __init__(self, stream=None, interactive=None, output=None):
+        # a text or binary stream, sys.stdin at the moment of reading if
+        # None, read in chunks, or line by line after a prompt written to
+        # the output if interactive, which it is for a terminal if not given
+        self.stream = stream
+        self.interactive = interactive
+        self.output = output
+        self.buffer = ""
+        self.position = 0
+        self.ended = False
+        # bytes, or characters of a text stream, read from the stream
+        self.offset = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+
+    def read_char(self, prompt="Reading character: "):
+        if not self._fill(prompt):
+            return None
+        char = self.buffer[self.position]
+        self.position += 1
+        return ord(char)
+
+    def read_number(self, prompt="Reading number: "):
+        # skips whitespace and reads the next token, which is skipped too,
+        # if it is not a number
+        while self._fill(prompt) and self.buffer[self.position].isspace():
+            self.position += 1
+        token = []
+        while self._fill(prompt) \
+                and not self.buffer[self.position].isspace():
+            token.append(self.buffer[self.position])
+            self.position += 1
+        try:
+            return int("".join(token))
+        except ValueError:
+            return None
+
+    def get_state(self):
+        # what was read from the stream, the text read but not used yet and
+        # the bytes of a character not decoded yet
+        return (self.offset, self.buffer[self.position:],
+                self._decoder.getstate()[0], self.ended)
+
+    def set_state(self, state):
+        # continues reading a stream from its start as if get_state was
+        # called with it; a terminal is only read further
+        offset, text, pending, ended = state
+        stream = sys.stdin if self.stream is None else self.stream
+        if self.interactive is None:
+            self.interactive = stream.isatty()
+        if not self.interactive:
+            _skip(stream, offset)
+        self.offset = offset
+        self.buffer = text
+        self.position = 0
+        self.ended = ended
+        self._decoder.setstate((pending, 0))
+
+    def _fill(self, prompt):
+        # returns whether there is anything left to read
+        while self.position >= len(self.buffer):
+            if self.ended:
+                return False
+            stream = sys.stdin if self.stream is None else self.stream
+            if self.interactive is None:
+                self.interactive = stream.isatty()
+            if self.interactive:
+                if self.output is not None:
+                    self.output.write(prompt)
+                    self.output.flush()
+                data = stream.readline()
+            else:
+                data = stream.read(READ_SIZE)
+            self.ended = not data
+            self.offset += len(data)
+            if isinstance(data, bytes):
+                data = self._decoder.decode(data, self.ended)
+            self.buffer = data
+            self.position = 0
+        return True
+
+
+def _skip(stream, size):
+    if not isinstance(stream, io.TextIOBase) and stream.seekable():
+        stream.seek(size, io.SEEK_CUR)
+        return
+    while size > 0:
+        data = stream.read(min(size, READ_SIZE))
+        if not data:
+            break
+        size -= len(data)
@@ -0,0 +1,182 @@
+from collections import defaultdict
+
+from piet_vitvit.piet_engine import COMMAND_NAMES, COMMAND_NONE
+from piet_vitvit.piet_optimizer import FUSED_COMMANDS, _SymbolicStack
+from piet_vitvit.piet_vm import CC, roll
+
+
+# arrivals at a state after pointer or switch, past which the loop starting
+# there is recorded
+HOT_LOOP = 50
+# steps in one pass of a loop, past which it is left to the engine
+MAX_TRACE_LENGTH = 1000
+
+POINTER = COMMAND_NAMES.index("piet_pointer")
+SWITCH = COMMAND_NAMES.index("piet_switch")
+ROLL = COMMAND_NAMES.index("piet_roll")
+OUTNUM = COMMAND_NAMES.index("piet_outnum")
+OUTCHAR = COMMAND_NAMES.index("piet_outchar")
+
+
+class PietTrace:
+    def __init__(self, length, depth, exits, source, constants):
+        # the trace runs whole passes of a loop of the given number of
+        # steps, as long as the stack holds at least depth values, and
+        # returns the steps done and the exit it left the loop through:
+        # the state and codel the engine goes on from, the first being the
+        # start of the loop, the rest failed guards in it
+        self.length = length
+        self.depth = depth
+        self.exits = exits
+        self.source = source
+        namespace = dict(constants)
+        namespace["roll"] = roll
+        exec(source, namespace)
+        self.function = namespace["trace"]
+
+
+class PietJIT:
+    def __init__(self, transitions, hot=HOT_LOOP):
+        self.transitions = transitions
+        self.hot = hot
+        self.max_length = MAX_TRACE_LENGTH
+        # traces or None, for loops that can't be traced, keyed by the
+        # state they start at
+        self.traces = {}
+        self.arrivals = defaultdict(int)
+        # the start of the loop being recorded, and the states it went
+        # through since
+        self.start = None
+        self.recording = None
+        # traces entered, steps done in them, and how many times a guard
+        # failed in them, or the stack was too short to enter them
+        self.entered = 0
+        self.steps = 0
+        self.exits = 0
+        self.refused = 0
+
+    def arrive(self, state):
+        # counts an arrival at the state after pointer or switch, and
+        # returns whether the loop starting there has to be recorded
+        self.arrivals[state] += 1
+        if self.arrivals[state] < self.hot:
+            return False
+        self.start = state
+        self.recording = []
+        return True
+
+    def stop(self, state, codel):
+        # ends the recording at the state, compiling it if it went around
+        # the loop, and returns None, for the engine to stop recording
+        start, states = self.start, self.recording
+        self.start = self.recording = None
+        trace = None
+        if state == start and len(states) <= self.max_length:
+            trace = self._compile(states, codel)
+        self.traces[start] = trace
+        return None
+
+    def _compile(self, states, codel):
+        table = self.transitions.table
+        exits = [(states[0], codel)]
+        # exits, keyed by the position in the loop they leave it at
+        positions = {0: 0}
+        body = []
+        height = depth = 0
+        segment = None
+        constants = {}
+
+        def leave(position):
+            if position not in positions:
+                positions[position] = len(exits)
+                exits.append((states[position], codels[position]))
+            return f"return done + {position}, {positions[position]}"
+
+        def flush():
+            nonlocal depth, height
+            if segment is None or not (segment.depth or segment.items):
+                return
+            depth = max(depth, segment.depth - height)
+            height += len(segment.items) - segment.depth
+            # dividing by zero raises before the stack is changed
+            body.append("try:")
+            body.extend("    " + line for line in segment.get_lines())
+            body.append("except ZeroDivisionError:")
+            body.append("    " + leave(start))
+
+        def pop(count):
+            nonlocal depth, height
+            depth = max(depth, count - height)
+            height -= count
+
+        codels = [codel]
+        for state in states:
+            next_codel = table[state][3]
+            codels.append(codel if next_codel is None else next_codel)
+            codel = codels[-1]
+
+        start = 0
+        for position, state in enumerate(states):
+            command, next_state, value = table[state][:3]
+            following = states[(position + 1) % len(states)]
+            if command in FUSED_COMMANDS:
+                if segment is None:
+                    segment, start = _SymbolicStack(constants), position
+                if segment.apply(FUSED_COMMANDS[command], value):
+                    continue
+                if command != ROLL:
+                    # a division by a zero folded into the trace
+                    return None
+            if command == COMMAND_NONE:
+                continue
+            flush()
+            segment = None
+            if command == POINTER:
+                pop(1)
+                dp, cc = table[state][5:7]
+                body.append("top = stack.pop()")
+                body.append(f"if (top + {int(dp)}) % 4 != "
+                            f"{following % 8 // 2}:")
+                body.append("    stack.append(top)")
+                body.append("    " + leave(position))
+            elif command == SWITCH:
+                pop(1)
+                dp, cc = table[state][5:7]
+                expected = CC.RIGHT if following % 2 else CC.LEFT
+                body.append("top = stack.pop()")
+                body.append(f"if {int(cc)} * (-1 ** top) != "
+                            f"{int(expected)}:")
+                body.append("    stack.append(top)")
+                body.append("    " + leave(position))
+            elif command == ROLL:
+                pop(2)
+                body.append("if stack[-2] == 0:")
+                body.append("    " + leave(position))
+                body.append("top = stack.pop()")
+                body.append("second = stack.pop()")
+                body.append("top %= second")
+                body.append("if second > 0 and top:")
+                body.append("    roll(stack, second, top)")
+            elif command == OUTNUM:
+                pop(1)
+                body.append("write(str(stack.pop()))")
+            elif command == OUTCHAR:
+                pop(1)
+                body.append("if not 0 <= stack[-1] < 0x110000:")
+                body.append("    " + leave(position))
+                body.append("write(chr(stack.pop()))")
+            else:
+                # input, or getting trapped
+                return None
+        flush()
+
+        length = len(states)
+        lines = ["def trace(stack, write, steps):",
+                 "    done = 0",
+                 f"    while done <= steps - {length}:",
+                 f"        if len(stack) < {depth}:",
+                 "            return done, 0"]
+        lines.extend("        " + line for line in body)
+        lines.append(f"        done += {length}")
+        lines.append("    return done, 0")
+        return PietTrace(length, depth, exits, "\n".join(lines), constants)
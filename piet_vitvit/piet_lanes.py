@@ -0,0 +1,204 @@
+import io
+
+from piet_vitvit.piet_api import PietResult, REASON_ERROR, REASON_LIMIT, \
+    REASON_TRAPPED
+from piet_vitvit.piet_engine import COMMAND_NAMES, COMMAND_NONE, \
+    COMMAND_TRAP, get_state
+from piet_vitvit.piet_vm import PietVM
+
+
+class _Lane:
+    __slots__ = ("index", "vm", "stack")
+
+    def __init__(self, index, input):
+        if isinstance(input, str):
+            input = input.encode()
+        self.index = index
+        self.vm = PietVM(io.BytesIO(input), io.BytesIO())
+        self.vm.input.interactive = False
+        self.stack = self.vm.stack
+
+
+# every command takes the lanes in the same state and the value of the
+# block, and returns the lanes it failed in, with the errors, if any; the
+# values are popped just like in PietVM, even if the command fails
+
+def _push(lanes, value):
+    for lane in lanes:
+        lane.stack.append(value)
+
+
+def _pop(lanes, value):
+    for lane in lanes:
+        if lane.stack:
+            lane.stack.pop()
+
+
+def _arithmetic(function):
+    def command(lanes, value):
+        for lane in lanes:
+            stack = lane.stack
+            if len(stack) >= 2:
+                top = stack.pop()
+                stack[-1] = function(stack[-1], top)
+            elif stack:
+                stack.pop()
+    return command
+
+
+def _division(function):
+    def command(lanes, value):
+        failed = None
+        for lane in lanes:
+            stack = lane.stack
+            if len(stack) >= 2:
+                top = stack.pop()
+                second = stack.pop()
+                try:
+                    stack.append(function(second, top))
+                except ZeroDivisionError as e:
+                    failed = failed or []
+                    failed.append((lane, e))
+            elif stack:
+                stack.pop()
+        return failed
+    return command
+
+
+def _not(lanes, value):
+    for lane in lanes:
+        if lane.stack:
+            lane.stack[-1] = int(not lane.stack[-1])
+
+
+def _dup(lanes, value):
+    for lane in lanes:
+        if lane.stack:
+            lane.stack.append(lane.stack[-1])
+
+
+def _each(name):
+    # the command of PietVM, run in every lane
+    method = getattr(PietVM, name)
+
+    def command(lanes, value):
+        failed = None
+        for lane in lanes:
+            try:
+                method(lane.vm)
+            except Exception as e:
+                failed = failed or []
+                failed.append((lane, e))
+        return failed
+    return command
+
+
+_COMMANDS = {
+    "piet_push": _push,
+    "piet_pop": _pop,
+    "piet_add": _arithmetic(lambda a, b: a + b),
+    "piet_sub": _arithmetic(lambda a, b: a - b),
+    "piet_mul": _arithmetic(lambda a, b: a * b),
+    "piet_div": _division(lambda a, b: a // b),
+    "piet_mod": _division(lambda a, b: a % b),
+    "piet_not": _not,
+    "piet_gt": _arithmetic(lambda a, b: int(a > b)),
+    "piet_dup": _dup,
+}
+COMMANDS = [_COMMANDS.get(name) or _each(name) for name in COMMAND_NAMES]
+
+
+class PietLanes:
+    def __init__(self, program, inputs):
+        # runs the program with every input at once, step by step; lanes
+        # in the same state share its transition and run its command
+        # together, and part only at pointer and switch
+        self.program = program
+        self.lanes = [_Lane(index, input) for index, input in
+                      enumerate(inputs)]
+        self.results = [None] * len(self.lanes)
+
+    def run(self, max_steps=10000):
+        transitions = self.program.transitions
+        table = transitions.table
+        resolve = transitions.resolve
+        skip_stays = transitions.skip_stays
+        commands = COMMANDS
+        finish = self._finish
+
+        step = 0
+        state = self.program.start_state
+        prefix = self.program.prefix
+        if prefix is not None and prefix.fits(max_steps):
+            step, state = prefix.steps, prefix.state
+            for lane in self.lanes:
+                lane.stack[:] = prefix.stack
+                if prefix.output:
+                    lane.vm.output.write(prefix.output)
+        groups = {state: self.lanes} if self.lanes else {}
+
+        while groups and step < max_steps:
+            step += 1
+            next_groups = {}
+            for state, lanes in groups.items():
+                try:
+                    entry = table[state] or resolve(state)
+                except Exception as e:
+                    for lane in lanes:
+                        finish(lane, REASON_ERROR, step, e)
+                    continue
+                command, next_state, value, codel, block, dp, cc = entry
+                if command == COMMAND_TRAP:
+                    for lane in lanes:
+                        finish(lane, REASON_TRAPPED, step)
+                    continue
+                if command == COMMAND_NONE:
+                    next_state = get_state(block, dp, cc)
+                    if skip_stays(next_state, 0) is not None:
+                        # white slides in the block, over and over
+                        for lane in lanes:
+                            finish(lane, REASON_LIMIT, max_steps)
+                        continue
+                elif next_state < 0:
+                    # pointer or switch, in every lane on its own
+                    for lane in lanes:
+                        vm = lane.vm
+                        vm.dp, vm.cc = dp, cc
+                        commands[command]([lane], value)
+                        lane_state = block * 8 + vm.dp * 2 + (vm.cc > 0)
+                        if lane_state in next_groups:
+                            next_groups[lane_state].append(lane)
+                        else:
+                            next_groups[lane_state] = [lane]
+                    continue
+                else:
+                    failed = commands[command](lanes, value)
+                    if failed:
+                        for lane, error in failed:
+                            finish(lane, REASON_ERROR, step, error)
+                        failed = {id(lane) for lane, error in failed}
+                        lanes = [lane for lane in lanes
+                                 if id(lane) not in failed]
+                if next_state in next_groups:
+                    next_groups[next_state].extend(lanes)
+                else:
+                    next_groups[next_state] = list(lanes)
+            groups = next_groups
+
+        for lanes in groups.values():
+            for lane in lanes:
+                finish(lane, REASON_LIMIT, step)
+        return self.results
+
+    def _finish(self, lane, reason, steps, error=None):
+        output = lane.vm.output
+        output.flush()
+        self.results[lane.index] = PietResult(output.stream.getvalue(),
+                                              reason, steps, lane.stack,
+                                              error)
+
+
+def run_lanes(program, inputs, max_steps=10000):
+    # the results of running the program with every input, the same as
+    # those of program.run
+    return PietLanes(program, inputs).run(max_steps)
@@ -0,0 +1,186 @@
+import operator
+
+from piet_vitvit.piet_engine import COMMAND_NAMES
+
+
+# commands, which only rearrange the stack, so that a straight run of them
+# can be replaced with one superinstruction
+FUSED_COMMANDS = {COMMAND_NAMES.index(name): name for name in (
+    "piet_pass", "piet_push", "piet_pop", "piet_add", "piet_sub", "piet_mul",
+    "piet_div", "piet_mod", "piet_not", "piet_gt", "piet_dup", "piet_roll")}
+
+BINARY_OPERATORS = {
+    "piet_add": ("{0} + {1}", operator.add),
+    "piet_sub": ("{0} - {1}", operator.sub),
+    "piet_mul": ("{0} * {1}", operator.mul),
+    "piet_div": ("{0} // {1}", operator.floordiv),
+    "piet_mod": ("{0} % {1}", operator.mod),
+    "piet_gt": ("int({0} > {1})", lambda a, b: int(a > b)),
+    }
+
+MAX_RUN_LENGTH = 64
+# rolls deeper than this are left to the VM
+MAX_ROLL_DEPTH = 64
+# larger folded constants are passed to the superinstruction as names
+MAX_LITERAL = 2 ** 63
+
+
+class PietRun:
+    def __init__(self, length, depth, next_state, codel, value, source,
+                 constants):
+        # the run executes the given number of commands, reading at most
+        # depth values of the stack it starts with
+        self.length = length
+        self.depth = depth
+        self.next_state = next_state
+        self.codel = codel
+        self.value = value
+        self.source = source
+        namespace = dict(constants)
+        exec(source, namespace)
+        self.function = namespace["fused"]
+
+
+class PietOptimizer:
+    def __init__(self, transitions):
+        self.transitions = transitions
+        # superinstructions or None, keyed by the state they start at
+        self.runs = {}
+        # superinstructions executed and the commands they replaced
+        self.fused = 0
+        self.eliminated = 0
+
+    def get_run(self, state):
+        if state not in self.runs:
+            self.runs[state] = self._build_run(state)
+        return self.runs[state]
+
+    def _build_run(self, state):
+        table = self.transitions.table
+        stack = _SymbolicStack()
+        seen = set()
+        length = 0
+        last = None
+
+        while length < MAX_RUN_LENGTH and state not in seen:
+            try:
+                entry = table[state] or self.transitions.resolve(state)
+            except Exception:
+                break
+            command, next_state, value, codel = entry[:4]
+            if command not in FUSED_COMMANDS or next_state < 0 \
+                    or not stack.apply(FUSED_COMMANDS[command], value):
+                break
+            seen.add(state)
+            length += 1
+            last = next_state, codel, value
+            state = next_state
+
+        if length < 2:
+            return None
+        return PietRun(length, stack.depth, *last, stack.get_source(),
+                       stack.constants)
+
+
+class _SymbolicStack:
+    # the stack a run leaves, as values and names of the computed ones,
+    # over the stack it starts with, with s1 being its top
+    def __init__(self, constants=None):
+        # constants may be shared by several stacks, compiled together
+        self.items = []
+        self.depth = 0
+        self.lines = []
+        self.constants = {} if constants is None else constants
+
+    def apply(self, name, value):
+        # returns False if the command can't be added to the run
+        if name == "piet_push":
+            self.items.append(value)
+        elif name == "piet_pop":
+            self._pop()
+        elif name == "piet_dup":
+            top = self._pop()
+            self.items.extend((top, top))
+        elif name == "piet_not":
+            top = self._pop()
+            self.items.append(
+                int(not top) if isinstance(top, int)
+                else self._compute("int(not {0})", top))
+        elif name == "piet_roll":
+            return self._roll()
+        elif name in BINARY_OPERATORS:
+            return self._binary(*BINARY_OPERATORS[name],
+                                name in ("piet_div", "piet_mod"))
+        return True
+
+    def get_source(self):
+        lines = ["def fused(stack):"]
+        lines.extend("    " + line for line in self.get_lines())
+        return "\n".join(lines)
+
+    def get_lines(self):
+        lines = [f"s{i} = stack[-{i}]" for i in range(1, self.depth + 1)]
+        lines.extend(self.lines)
+        items = ", ".join(self._get_name(item) for item in self.items)
+        if self.depth:
+            lines.append(f"stack[-{self.depth}:] = [{items}]")
+        else:
+            lines.append(f"stack.extend([{items}])")
+        return lines
+
+    def _binary(self, expression, function, divides):
+        if len(self.items) >= 2:
+            top2, top1 = self.items[-2:]
+            if isinstance(top1, int) and isinstance(top2, int):
+                if divides and top1 == 0:
+                    # the error has to be raised by the command itself
+                    return False
+                del self.items[-2:]
+                self.items.append(function(top2, top1))
+                return True
+        top1 = self._pop()
+        top2 = self._pop()
+        # dividing by zero raises before the stack is changed
+        self.items.append(self._compute(expression, top2, top1))
+        return True
+
+    def _roll(self):
+        # only rolls with known arguments are fused
+        if len(self.items) < 2 or not all(
+                isinstance(item, int) for item in self.items[-2:]):
+            return False
+        depth, count = self.items[-2:]
+        if depth == 0 or depth > MAX_ROLL_DEPTH:
+            # rolling to the depth of zero raises in the command itself
+            return False
+        del self.items[-2:]
+        if depth <= 0 or count % depth == 0:
+            return True
+        while len(self.items) < depth:
+            self._pull()
+        num = count % depth
+        window = self.items[-depth:]
+        self.items[-depth:] = window[-num:] + window[:-num]
+        return True
+
+    def _pop(self):
+        if not self.items:
+            self._pull()
+        return self.items.pop()
+
+    def _pull(self):
+        self.depth += 1
+        self.items.insert(0, f"s{self.depth}")
+
+    def _compute(self, expression, *operands):
+        name = f"t{len(self.lines)}"
+        operands = [self._get_name(operand) for operand in operands]
+        self.lines.append(f"{name} = {expression.format(*operands)}")
+        return name
+
+    def _get_name(self, item):
+        if isinstance(item, str) or -MAX_LITERAL < item < MAX_LITERAL:
+            return str(item)
+        name = f"c{len(self.constants)}"
+        self.constants[name] = item
+        return name
@@ -0,0 +1,83 @@
+import io
+import struct
+
+from piet_vitvit.piet_breakpoints import PietBreakpoints
+from piet_vitvit.piet_engine import COMMAND_TRAP, PietBreak, PietEngine
+from piet_vitvit.piet_snapshot import pack_values, unpack_values
+from piet_vitvit.piet_vm import PietVM
+
+
+# steps run at compile time, at most, before the first input
+PREFIX_STEPS = 100000
+
+_PREFIX = struct.Struct("<QqqqI?Q")
+
+
+class PietPrefix:
+    def __init__(self, steps, state, codel, stack, output, trapped=False):
+        # the state of a program after the steps it takes before reading
+        # any input, and the text it writes in them; if trapped, the next
+        # step ends the program
+        self.steps = steps
+        self.state = state
+        self.codel = codel
+        self.stack = stack
+        self.output = output
+        self.trapped = trapped
+
+    def fits(self, steps):
+        # whether a run of the given number of steps can start from it
+        return self.steps <= steps
+
+    def start(self, engine):
+        # puts a new engine where the prefix ends, as if it ran through it
+        engine.step = self.steps
+        engine.state = self.state
+        engine.codel = self.codel
+        engine.pvm.stack[:] = self.stack
+        if self.output:
+            engine.pvm.output.write(self.output)
+
+    def to_bytes(self):
+        output = self.output.encode("utf-8", "surrogatepass")
+        return _PREFIX.pack(self.steps, self.state, *self.codel,
+                            len(output), self.trapped,
+                            len(self.stack)) \
+            + output + pack_values(self.stack)
+
+    @classmethod
+    def from_bytes(cls, data):
+        try:
+            steps, state, x, y, output_size, trapped, depth = \
+                _PREFIX.unpack_from(data)
+        except struct.error:
+            raise ValueError("prefix is cut short") from None
+        position = _PREFIX.size
+        output = bytes(data[position:position + output_size]) \
+            .decode("utf-8", "surrogatepass")
+        stack, position = unpack_values(data, position + output_size, depth)
+        if position != len(data):
+            raise ValueError("prefix is damaged")
+        return cls(steps, state, (x, y), stack, output, trapped)
+
+
+def evaluate_prefix(transitions, codel, max_steps=PREFIX_STEPS):
+    # runs the program from the codel until it is about to read input or
+    # get trapped, or for the given number of steps; the prefix of a
+    # program failing in them is empty
+    output = io.BytesIO()
+    pvm = PietVM(io.BytesIO(), output)
+    engine = PietEngine(transitions, pvm, *codel)
+    engine.breakpoints = PietBreakpoints(commands=["innum", "inchar"])
+    engine.breakpoints.commands.add(COMMAND_TRAP)
+    start_state = engine.state
+    trapped = False
+    try:
+        engine.run(max_steps)
+    except PietBreak:
+        trapped = transitions.table[engine.state][0] == COMMAND_TRAP
+    except Exception:
+        return PietPrefix(0, start_state, codel, [], "")
+    return PietPrefix(engine.step, engine.state, engine.codel, pvm.stack,
+                      output.getvalue().decode("utf-8", "surrogatepass"),
+                      trapped)
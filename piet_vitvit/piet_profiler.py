@@ -0,0 +1,148 @@
+from collections import defaultdict
+
+import numpy as np
+from PIL import Image
+
+from piet_vitvit.piet_engine import get_command_name
+
+
+# one command in this many is timed by the table engine
+SAMPLE_EVERY = 64
+# blocks listed in the report
+TOP_BLOCKS = 10
+
+# heat-map colors of the least and the most visited blocks
+COLD_COLOR = np.array([255, 255, 0], dtype=np.float64)
+HOT_COLOR = np.array([255, 0, 0], dtype=np.float64)
+HEAT_OPACITY = 0.75
+
+
+class PietProfiler:
+    def __init__(self, sample_every=SAMPLE_EVERY):
+        self.sample_every = sample_every
+        self.steps = 0
+        # steps started in every block, keyed by its index, and commands
+        # executed, keyed by their index in COMMAND_NAMES, with white slides
+        # and traps after them
+        self.blocks = defaultdict(int)
+        self.commands = defaultdict(int)
+        # time of the commands that were timed and how many there were
+        self.command_times = defaultdict(float)
+        self.command_samples = defaultdict(int)
+        # time spent finding the next block, rotating DP and CC and sliding
+        # through white, and how many times that was done; the table engine
+        # finds it once for every state, and memoized the time is just the
+        # cost of that, not of the steps taking the transitions
+        self.resolve_time = 0.0
+        self.resolved = 0
+        self.memoized = False
+        self.max_depth = 0
+        self.max_depth_step = 0
+
+    def count(self, block, command, times=1):
+        self.steps += times
+        self.blocks[block] += times
+        self.commands[command] += times
+
+    def sample(self, command, seconds):
+        self.command_times[command] += seconds
+        self.command_samples[command] += 1
+
+    def resolving(self, seconds):
+        self.resolve_time += seconds
+        self.resolved += 1
+
+    def stack_depth(self, depth, step):
+        if depth > self.max_depth:
+            self.max_depth = depth
+            self.max_depth_step = step
+
+    def add_states(self, counts, table):
+        # counts of steps started in every state of a transition table
+        for state, times in counts.items():
+            entry = table[state] if state < len(table) else None
+            if entry is not None:
+                self.count(state // 8, entry[0], times)
+
+    def get_command_time(self, command):
+        # estimated from the commands timed
+        if not self.command_samples[command]:
+            return None
+        return self.command_times[command] / self.command_samples[command] \
+            * self.commands[command]
+
+    def get_report(self, blocks=None):
+        lines = [f"[PROFILE] {self.steps} steps"]
+        lines.append("[PROFILE] commands:")
+        for command, times in sorted(self.commands.items(),
+                                     key=lambda item: -item[1]):
+            seconds = self.get_command_time(command)
+            estimate = "" if seconds is None else f", ~{seconds:.6f}s"
+            lines.append(f"[PROFILE]   {get_command_name(command):<8} "
+                         f"{times:>10} ({times / self.steps:.1%}){estimate}")
+
+        lines.append(f"[PROFILE] most visited blocks (of "
+                     f"{len(self.blocks)}):")
+        for index, times in sorted(self.blocks.items(),
+                                   key=lambda item: -item[1])[:TOP_BLOCKS]:
+            where = ""
+            if blocks is not None:
+                block = blocks.blocks[index]
+                where = f" at {block.get_exit(0, -1)}, {block.size} codels"
+            lines.append(f"[PROFILE]   block {index}{where}: {times} "
+                         f"({times / self.steps:.1%})")
+
+        if self.memoized:
+            lines.append(f"[PROFILE] rotations and white slides: "
+                         f"{self.resolve_time:.6f}s resolving "
+                         f"{self.resolved} states once (one-time cost, "
+                         f"the steps reuse them)")
+        else:
+            lines.append(f"[PROFILE] rotations and white slides: "
+                         f"{self.resolve_time:.6f}s in {self.resolved} "
+                         f"resolutions")
+        lines.append(f"[PROFILE] stack high-water mark: {self.max_depth} "
+                     f"(step {self.max_depth_step})")
+        return "\n".join(lines)
+
+    def get_heat_map(self, image, blocks, codel_size=1):
+        # the image with every visited block painted from yellow to red by
+        # the logarithm of its visits, and the rest of it grayed out; the
+        # whole image is loaded for it, however large
+        labels = _label_codels(blocks)
+        visits = np.zeros(len(blocks) + 1, dtype=np.float64)
+        for index, times in self.blocks.items():
+            if index < len(blocks):
+                visits[index] = times
+        heat = np.log1p(visits)
+        if heat.max() > 0:
+            heat /= heat.max()
+        codel_heat = heat[labels]
+        visited = visits[labels] > 0
+        if codel_size > 1:
+            codel_heat = codel_heat.repeat(codel_size, 0) \
+                .repeat(codel_size, 1)
+            visited = visited.repeat(codel_size, 0).repeat(codel_size, 1)
+
+        pixels = np.asarray(image.convert("RGB"), dtype=np.float64).copy()
+        rows, cols = codel_heat.shape
+        area = pixels[:rows, :cols]
+        colors = COLD_COLOR + (HOT_COLOR - COLD_COLOR) * codel_heat[..., None]
+        area[visited] = area[visited] * (1 - HEAT_OPACITY) \
+            + colors[visited] * HEAT_OPACITY
+        area[~visited] = area[~visited] * 0.3 + 128 * 0.7
+        return Image.fromarray(pixels.astype(np.uint8), "RGB")
+
+
+def _label_codels(blocks):
+    # the index of the block of every codel, or the number of blocks for
+    # black ones; every row is labeled, so a tiled image is decoded whole
+    # here, tile by tile, as the heat map covers all of it anyway
+    labels = np.full((blocks.rows, blocks.cols), len(blocks), dtype=np.int64)
+    for y in range(blocks.rows):
+        for segment in range(blocks.segments):
+            starts, ends, colors, run_labels = blocks._get_runs(y, segment)
+            for start, end, label in zip(starts, ends, run_labels):
+                if label >= 0:
+                    labels[y, start:end + 1] = label
+    return labels
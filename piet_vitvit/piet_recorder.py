@@ -0,0 +1,300 @@
+import struct
+from bisect import bisect_right
+
+from piet_vitvit.piet_engine import COMMAND_NAMES, get_command_name, \
+    split_state
+from piet_vitvit.piet_snapshot import pack_values, unpack_values
+from piet_vitvit.piet_vm import roll
+
+
+# a trace is a header and segments, each a keyframe with the state and the
+# whole stack before its first step, followed by a record of every step:
+# a byte with the command and how many values it popped and pushed, the
+# change of the state and those values, as zigzag-encoded varints
+TRACE_MAGIC = b"PIETTRAC"
+TRACE_VERSION = 1
+TRACE_SUFFIX = ".piettrace"
+KEYFRAME_EVERY = 4096
+
+_HEADER = struct.Struct("<8sHI")
+_SEGMENT = struct.Struct("<QqQIII")
+
+COMMAND_ROLL = COMMAND_NAMES.index("piet_roll")
+COMMAND_OUTNUM = COMMAND_NAMES.index("piet_outnum")
+COMMAND_OUTCHAR = COMMAND_NAMES.index("piet_outchar")
+
+
+class PietRecorder:
+    def __init__(self, path, keyframe_every=KEYFRAME_EVERY):
+        # records the steps of PietEngine, with a keyframe every given
+        # number of them
+        self.keyframe_every = keyframe_every
+        self.file = open(path, "wb")
+        self.file.write(_HEADER.pack(TRACE_MAGIC, TRACE_VERSION,
+                                     keyframe_every))
+        # step after the last one recorded, None before the first
+        self.step = None
+        self._state = 0
+        self._stack = None
+        self._keyframe = None
+        self._data = bytearray()
+        self._count = 0
+
+    def begin(self, step, state, stack):
+        # called by PietEngine before every run; a run, which doesn't go on
+        # from the last step recorded, starts a new segment
+        if step == self.step and state == self._state \
+                and stack is self._stack:
+            return
+        self._write_segment()
+        self.step = step
+        self._state = state
+        self._stack = stack
+        self._start_segment()
+
+    def record(self, state, command, popped, pushed):
+        data = self._data
+        data.append(command * 9 + len(popped) * 3 + len(pushed))
+        _put_number(data, state - self._state)
+        for value in popped:
+            _put_number(data, value)
+        for value in pushed:
+            _put_number(data, value)
+        self._state = state
+        self.step += 1
+        self._count += 1
+        if self._count == self.keyframe_every:
+            self._write_segment()
+            self._start_segment()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self._write_segment()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _start_segment(self):
+        self._keyframe = (self.step, self._state, len(self._stack),
+                          pack_values(self._stack))
+        self._data = bytearray()
+        self._count = 0
+
+    def _write_segment(self):
+        if self._keyframe is None or not self._count:
+            return
+        step, state, depth, stack = self._keyframe
+        self.file.write(_SEGMENT.pack(step, state, depth, self._count,
+                                      len(stack), len(self._data)))
+        self.file.write(stack)
+        self.file.write(self._data)
+        self.file.flush()
+        self._count = 0
+
+
+class PietReplay:
+    def __init__(self, path):
+        # goes back and forth through a recorded trace, starting at its
+        # first step, reading a segment only once it is reached
+        self.file = open(path, "rb")
+        # (first step, state, depth, steps, position of the stack, sizes of
+        # the stack and of the records)
+        self.segments = []
+        try:
+            self._read_segments()
+        except ValueError:
+            self.file.close()
+            raise
+        self._starts = [segment[0] for segment in self.segments]
+        self.first_step = self.segments[0][0]
+        self.last_step = self.segments[-1][0] + self.segments[-1][3]
+
+        self.step = self.state = None
+        self.stack = []
+        # command of the last step and what it wrote, if anything
+        self.command = None
+        self.output = ""
+        self._segment = None
+        self._records = None
+        self._index = 0
+        self.seek(self.first_step)
+
+    @property
+    def block(self):
+        return split_state(self.state)[0]
+
+    @property
+    def dp(self):
+        return split_state(self.state)[1]
+
+    @property
+    def cc(self):
+        return split_state(self.state)[2]
+
+    def get_command_name(self):
+        if self.command is None:
+            return None
+        return get_command_name(self.command)
+
+    def seek(self, step):
+        # goes to the state after the given step, or the closest one
+        # recorded, from the keyframe before it
+        step = min(max(step, self.first_step), self.last_step)
+        segment = bisect_right(self._starts, step) - 1
+        # the next segment may start after steps that weren't recorded
+        step = min(step, self._starts[segment] + self.segments[segment][3])
+        self._load(segment)
+        while self.step < step:
+            self.forward()
+
+    def forward(self):
+        # returns whether there was a step to go to
+        if self._index == len(self._records):
+            if self._segment + 1 == len(self.segments):
+                return False
+            self._load(self._segment + 1)
+        state, command, popped, pushed = self._records[self._index]
+        stack = self.stack
+        if popped:
+            del stack[-len(popped):]
+        if command == COMMAND_ROLL and len(popped) == 2:
+            depth, count = popped
+            if depth > 0 and count % depth:
+                roll(stack, depth, count % depth)
+        stack.extend(pushed)
+        self._index += 1
+        self.step += 1
+        self.state = state
+        self._set_command(command, popped)
+        return True
+
+    def back(self):
+        if self._index == 0:
+            if self.step == self.first_step:
+                return False
+            self.seek(self.step - 1)
+            return True
+        self._index -= 1
+        state, command, popped, pushed = self._records[self._index]
+        stack = self.stack
+        if pushed:
+            del stack[-len(pushed):]
+        if command == COMMAND_ROLL and len(popped) == 2:
+            depth, count = popped
+            if depth > 0 and count % depth:
+                # rolled the other way over as many values as it was
+                count %= depth
+                depth = min(depth, len(stack))
+                if count < depth:
+                    roll(stack, depth, depth - count)
+        stack.extend(popped)
+        self.step -= 1
+        if self._index:
+            self.state, command, popped, _ = self._records[self._index - 1]
+            self._set_command(command, popped)
+        else:
+            self.state = self.segments[self._segment][1]
+            self._set_command(None, ())
+        return True
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _set_command(self, command, popped):
+        self.command = command
+        self.output = ""
+        if command == COMMAND_OUTNUM and popped:
+            self.output = str(popped[-1])
+        elif command == COMMAND_OUTCHAR and popped:
+            self.output = chr(popped[-1])
+
+    def _read_segments(self):
+        try:
+            magic, version, self.keyframe_every = \
+                _HEADER.unpack(self.file.read(_HEADER.size))
+        except struct.error:
+            raise ValueError("not a Piet trace") from None
+        if magic != TRACE_MAGIC or version != TRACE_VERSION:
+            raise ValueError("not a Piet trace")
+        position = _HEADER.size
+        while data := self.file.read(_SEGMENT.size):
+            try:
+                step, state, depth, count, stack_size, size = \
+                    _SEGMENT.unpack(data)
+            except struct.error:
+                raise ValueError("trace is cut short") from None
+            position += _SEGMENT.size
+            self.segments.append((step, state, depth, count, position,
+                                  stack_size, size))
+            position += stack_size + size
+            self.file.seek(position)
+        if not self.segments:
+            raise ValueError("trace is empty")
+
+    def _load(self, index):
+        step, state, depth, count, position, stack_size, size = \
+            self.segments[index]
+        self.file.seek(position)
+        data = self.file.read(stack_size + size)
+        if len(data) != stack_size + size:
+            raise ValueError("trace is cut short")
+        stack, offset = unpack_values(data, 0, depth)
+        if offset != stack_size:
+            raise ValueError("trace is damaged")
+
+        records = []
+        try:
+            for _ in range(count):
+                command, sizes = divmod(data[offset], 9)
+                delta, offset = _get_number(data, offset + 1)
+                state += delta
+                popped = []
+                for _ in range(sizes // 3):
+                    value, offset = _get_number(data, offset)
+                    popped.append(value)
+                pushed = []
+                for _ in range(sizes % 3):
+                    value, offset = _get_number(data, offset)
+                    pushed.append(value)
+                records.append((state, command, popped, pushed))
+        except IndexError:
+            raise ValueError("trace is damaged") from None
+        self._segment = index
+        self._records = records
+        self._index = 0
+        self.step = step
+        self.state = self.segments[index][1]
+        self.stack = stack
+        self._set_command(None, ())
+
+
+def _put_number(data, value):
+    # zigzag, so that small negative numbers stay short too
+    value = value * 2 if value >= 0 else -value * 2 - 1
+    while value >= 0x80:
+        data.append(value & 0x7f | 0x80)
+        value >>= 7
+    data.append(value)
+
+
+def _get_number(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            break
+    return (value >> 1) ^ -(value & 1), offset
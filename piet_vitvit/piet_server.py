@@ -0,0 +1,300 @@
+import asyncio
+import base64
+import binascii
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+
+from piet_vitvit.piet_api import REASON_ERROR, REASON_TIMEOUT
+from piet_vitvit.piet_batch import describe_error, describe_result, \
+    get_prefix_steps, get_program
+from piet_vitvit.piet_cache import dump_transitions, get_key
+
+
+DEFAULT_LIMIT = 10000
+DEFAULT_TIMEOUT = 10.0
+# seconds a worker may take past the timeout before the request gives up
+TIMEOUT_GRACE = 1.0
+MAX_BODY_SIZE = 64 * 1024 * 1024
+# latencies and finish times kept for the metrics
+METRICS_WINDOW = 1000
+THROUGHPUT_PERIOD = 60.0
+
+STATUS_TEXTS = {200: "OK", 400: "Bad Request", 404: "Not Found",
+                405: "Method Not Allowed", 413: "Payload Too Large",
+                503: "Service Unavailable"}
+
+
+def compile_rows(image_bytes, codel_size, prefix_steps):
+    # runs in a worker: returns the compiled program as bytes, or None if
+    # it can't be stored that way, and keeps it for the worker's own runs
+    program = get_program(image_bytes, codel_size,
+                          prefix_steps=prefix_steps)
+    rows = dump_transitions(program.transitions, program.start_state,
+                            program.start_codel, program.prefix)
+    return None if rows is None else rows.tobytes()
+
+
+def run_request(image_bytes, codel_size, rows, input_bytes, limit, timeout):
+    # runs in a worker
+    started = time.monotonic()
+    try:
+        program = get_program(image_bytes, codel_size, rows,
+                              get_prefix_steps(limit))
+        outcome = program.run(input_bytes, limit, timeout)
+    except Exception as e:
+        result = {"reason": REASON_ERROR, "error": describe_error(e)}
+    else:
+        result = describe_result(outcome)
+    result["time"] = round(time.monotonic() - started, 6)
+    return result
+
+
+class PietRequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class PietServer:
+    def __init__(self, workers=None, queue_size=64, cache_size=128,
+                 limit=DEFAULT_LIMIT, timeout=DEFAULT_TIMEOUT):
+        self.workers = workers or os.cpu_count() or 1
+        # the most steps and seconds a program may take, also used when a
+        # request doesn't ask for less
+        self.limit = limit
+        self.timeout = timeout
+        self.executor = None
+        # requests waiting for a worker; once it is full, new ones are
+        # turned away instead of piling up
+        self.queue = asyncio.Queue(queue_size)
+        # compiled programs as rows of their transitions, or None if they
+        # have to be compiled by the worker, keyed by get_key
+        self.programs = OrderedDict()
+        self.cache_size = cache_size
+        self._compiling = {}
+        self._dispatchers = []
+
+        self.started = time.monotonic()
+        self.requests = 0
+        self.rejected = 0
+        # requests given up on before a worker got to them
+        self.abandoned = 0
+        self.completed = 0
+        self.reasons = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.latencies = deque(maxlen=METRICS_WINDOW)
+        self.finished = deque(maxlen=METRICS_WINDOW)
+
+    async def start(self, host="127.0.0.1", port=8080, path=None):
+        self.executor = ProcessPoolExecutor(self.workers)
+        # the workers are started before any connection is accepted, so
+        # that forked ones don't hold connections open after they are closed
+        await asyncio.get_running_loop().run_in_executor(self.executor,
+                                                         os.getpid)
+        self._dispatchers = [asyncio.create_task(self._dispatch())
+                             for _ in range(self.workers)]
+        if path is not None:
+            return await asyncio.start_unix_server(self._handle, path)
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def close(self):
+        for dispatcher in self._dispatchers:
+            dispatcher.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+    async def run_program(self, image_bytes, codel_size=1, input_bytes=b"",
+                          limit=None, timeout=None):
+        limit = self.limit if limit is None else min(limit, self.limit)
+        timeout = self.timeout if timeout is None \
+            else min(timeout, self.timeout)
+        self.requests += 1
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((future, image_bytes, codel_size,
+                                   input_bytes, limit, timeout))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise PietRequestError(503, "too many programs waiting")
+
+        try:
+            result = await asyncio.wait_for(future, timeout + TIMEOUT_GRACE)
+        except asyncio.TimeoutError:
+            # a running worker can't be stopped, but nobody waits for it
+            # anymore, and a waiting request is never run
+            future.cancel()
+            result = {"reason": REASON_TIMEOUT}
+        except asyncio.CancelledError:
+            # the client went away
+            future.cancel()
+            raise
+        self.completed += 1
+        self.reasons[result["reason"]] = \
+            self.reasons.get(result["reason"], 0) + 1
+        self.latencies.append(time.monotonic() - started)
+        self.finished.append(time.monotonic())
+        return result
+
+    def get_metrics(self):
+        now = time.monotonic()
+        recent = [moment for moment in self.finished
+                  if now - moment <= THROUGHPUT_PERIOD]
+        period = min(THROUGHPUT_PERIOD, now - self.started) or 1.0
+        lookups = self.cache_hits + self.cache_misses
+        latencies = sorted(self.latencies)
+        return {
+            "uptime": round(now - self.started, 3),
+            "requests": self.requests,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "abandoned": self.abandoned,
+            "queued": self.queue.qsize(),
+            "reasons": self.reasons,
+            "throughput": round(len(recent) / period, 3),
+            "cache": {"programs": len(self.programs),
+                      "hits": self.cache_hits,
+                      "misses": self.cache_misses,
+                      "hit_rate": round(self.cache_hits / lookups, 4)
+                      if lookups else None},
+            "latency": {f"p{percent}": round(_percentile(
+                latencies, percent), 6) if latencies else None
+                for percent in (50, 90, 99)},
+            }
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            future, image_bytes, codel_size, input_bytes, limit, timeout = \
+                await self.queue.get()
+            if future.done():
+                self.abandoned += 1
+                continue
+            try:
+                rows = await self._get_rows(image_bytes, codel_size,
+                                            get_prefix_steps(limit))
+                result = await loop.run_in_executor(
+                    self.executor, run_request, image_bytes, codel_size,
+                    rows, input_bytes, limit, timeout)
+            except Exception as e:
+                result = {"reason": REASON_ERROR, "error": describe_error(e)}
+            if not future.done():
+                future.set_result(result)
+
+    async def _get_rows(self, image_bytes, codel_size, prefix_steps):
+        # programs are compiled with a prefix no longer than the limit of
+        # the request, and kept apart for different ones
+        key = get_key(image_bytes, codel_size, prefix_steps)
+        if key in self.programs:
+            self.cache_hits += 1
+            self.programs.move_to_end(key)
+            return self.programs[key]
+        if key in self._compiling:
+            # compiled for another request right now
+            self.cache_hits += 1
+            return await asyncio.shield(self._compiling[key])
+
+        self.cache_misses += 1
+        compiling = asyncio.get_running_loop().run_in_executor(
+            self.executor, compile_rows, image_bytes, codel_size,
+            prefix_steps)
+        self._compiling[key] = compiling
+        try:
+            rows = await compiling
+        finally:
+            del self._compiling[key]
+        self.programs[key] = rows
+        if len(self.programs) > self.cache_size:
+            self.programs.popitem(last=False)
+        return rows
+
+    async def _handle(self, reader, writer):
+        try:
+            status, body = await self._respond(reader)
+        except PietRequestError as e:
+            status, body = e.status, {"error": str(e)}
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        data = json.dumps(body).encode()
+        writer.write(f"HTTP/1.1 {status} {STATUS_TEXTS[status]}\r\n"
+                     f"Content-Type: application/json\r\n"
+                     f"Content-Length: {len(data)}\r\n"
+                     f"Connection: close\r\n\r\n".encode() + data)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def _respond(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").split()
+        if len(request_line) != 3:
+            raise PietRequestError(400, "malformed request line")
+        method, target, version = request_line
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        path = urlsplit(target).path
+        if path == "/metrics":
+            if method != "GET":
+                raise PietRequestError(405, "use GET")
+            return 200, self.get_metrics()
+        if path != "/run":
+            raise PietRequestError(404, f"no such endpoint: {path}")
+        if method != "POST":
+            raise PietRequestError(405, "use POST")
+
+        try:
+            size = int(headers.get("content-length", 0))
+            if size < 0:
+                raise ValueError(size)
+        except ValueError:
+            raise PietRequestError(400, "bad Content-Length") from None
+        if size > MAX_BODY_SIZE:
+            raise PietRequestError(413, "request is too large")
+        request = _parse_run_request(await reader.readexactly(size))
+        return 200, await self.run_program(*request)
+
+
+def _parse_run_request(body):
+    # {"image": base64, "codel_size": 1, "input": text,
+    #  "input_base64": base64, "limit": steps, "timeout": seconds}
+    try:
+        request = json.loads(body)
+        image_bytes = base64.b64decode(request["image"], validate=True)
+        if "input_base64" in request:
+            input_bytes = base64.b64decode(request["input_base64"],
+                                           validate=True)
+        else:
+            input_bytes = request.get("input", "").encode()
+        codel_size = int(request.get("codel_size", 1))
+        limit = request.get("limit")
+        timeout = request.get("timeout")
+        limit = None if limit is None else int(limit)
+        timeout = None if timeout is None else float(timeout)
+    except (ValueError, KeyError, TypeError, AttributeError,
+            binascii.Error) as e:
+        raise PietRequestError(400, f"bad request: {e}") from None
+    if codel_size <= 0 or limit is not None and limit <= 0 \
+            or timeout is not None and timeout <= 0:
+        raise PietRequestError(400, "codel size, limit and timeout must "
+                               "be positive")
+    return image_bytes, codel_size, input_bytes, limit, timeout
+
+
+def _percentile(values, percent):
+    # nearest rank of sorted values
+    index = max(0, -(-len(values) * percent // 100) - 1)
+    return values[index]
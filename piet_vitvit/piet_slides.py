@@ -0,0 +1,55 @@
+from piet_vitvit.piet_colors import COLOR_WHITE, COLOR_BLACK
+from piet_vitvit.piet_vm import CC, DP
+
+
+DP_STEPS = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+
+
+class PietSlides:
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self.rows, self.cols = matrix.shape
+        # outcomes of sliding through white, keyed by (x, y, DP, CC) of the
+        # white codel entered, as tuples of (trapped, x, y, DP, CC), where
+        # (x, y) is the colored codel the slide ends at, or the white codel
+        # the execution got trapped on
+        self._slides = {}
+
+    def slide(self, x, y, dp, cc):
+        key = x, y, dp, cc
+        if key not in self._slides:
+            self._walk(x, y, dp, cc)
+        return self._slides[key]
+
+    def _walk(self, x, y, dp, cc):
+        # every codel passed before the first turn is entered with the same
+        # DP and CC, so the slide from it has the same outcome
+        passed = []
+        outcome = None
+        iteration = 1
+        while iteration <= 8:
+            if iteration == 1:
+                if (x, y, dp, cc) in self._slides:
+                    outcome = self._slides[(x, y, dp, cc)]
+                    break
+                passed.append((x, y, dp, cc))
+
+            step_x, step_y = DP_STEPS[dp]
+            next_x, next_y = x + step_x, y + step_y
+            if not (0 <= next_x < self.cols and 0 <= next_y < self.rows) \
+                    or self.matrix[next_y, next_x] == COLOR_BLACK:
+                iteration += 1
+                if iteration % 2:
+                    dp = DP((dp + 1) % 4)
+                else:
+                    cc = CC(cc * -1)
+            elif self.matrix[next_y, next_x] == COLOR_WHITE:
+                x, y = next_x, next_y
+            else:
+                outcome = False, next_x, next_y, dp, cc
+                break
+        else:
+            outcome = True, x, y, dp, cc
+
+        for key in passed:
+            self._slides[key] = outcome
@@ -0,0 +1,196 @@
+import hashlib
+import os
+import struct
+import sys
+from array import array
+
+from piet_vitvit.piet_vm import CC, DP
+
+
+# a snapshot is a header, the input's state and the stack in chunks, each
+# either native 64-bit integers or, if any of them is larger, integers of
+# any size, each prefixed with its length in bytes
+SNAPSHOT_MAGIC = b"PIETSNAP"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_SUFFIX = ".pietsnap"
+CHUNK_SIZE = 4096
+
+_HEADER = struct.Struct("<8sH32sQIIBb??QIIQ")
+_CHUNK = struct.Struct("<BII")
+_LENGTH = struct.Struct("<I")
+CHUNK_SMALL = 0
+CHUNK_LARGE = 1
+
+
+def get_digest(image_bytes, codel_size):
+    # the program a snapshot belongs to
+    digest = hashlib.sha256(image_bytes)
+    digest.update(f":{codel_size}".encode())
+    return digest.digest()
+
+
+class PietSnapshot:
+    def __init__(self, digest, step, x, y, dp, cc, stack, input_state=None,
+                 line_start=True):
+        self.digest = digest
+        self.step = step
+        self.codel = x, y
+        self.dp = dp
+        self.cc = cc
+        self.stack = stack
+        # PietInput.get_state, if anything was read
+        self.input_state = input_state
+        self.line_start = line_start
+
+    @classmethod
+    def capture(cls, digest, step, x, y, pvm):
+        # the stack is not copied, the snapshot has to be written at once
+        input_state = pvm.input.get_state() if pvm.input.offset else None
+        return cls(digest, step, x, y, pvm.dp, pvm.cc, pvm.stack,
+                   input_state, pvm.output.line_start)
+
+    def restore(self, pvm):
+        pvm.dp = DP(self.dp)
+        pvm.cc = CC(self.cc)
+        pvm.stack = list(self.stack)
+        pvm.output.line_start = self.line_start
+        if self.input_state is not None:
+            pvm.input.set_state(self.input_state)
+
+
+class PietSnapshotWriter:
+    def __init__(self, path, digest):
+        self.path = path
+        self.digest = digest
+        # values of every chunk of the stack written last and their bytes,
+        # reused as long as that part of the stack stays the same
+        self._chunks = []
+
+    def save(self, step, x, y, pvm):
+        # the output is flushed, so that nothing before the snapshot is lost
+        pvm.output.flush()
+        self.write(PietSnapshot.capture(self.digest, step, x, y, pvm))
+
+    def write(self, snapshot):
+        stack = snapshot.stack
+        chunks = []
+        for index, start in enumerate(range(0, len(stack), CHUNK_SIZE)):
+            values = stack[start:start + CHUNK_SIZE]
+            if index < len(self._chunks) \
+                    and self._chunks[index][0] == values:
+                chunks.append(self._chunks[index])
+            else:
+                chunks.append((values, _encode_chunk(values)))
+        self._chunks = chunks
+
+        offset, text, pending, ended = snapshot.input_state \
+            or (0, "", b"", False)
+        text = text.encode("utf-8", "surrogatepass")
+        header = _HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION, snapshot.digest, snapshot.step,
+            *snapshot.codel, snapshot.dp, snapshot.cc, snapshot.line_start,
+            ended, offset, len(text), len(pending), len(stack))
+        # written next to the previous one and then put in its place, so
+        # that a crash leaves one of them whole
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(header)
+            file.write(text)
+            file.write(pending)
+            for _, data in chunks:
+                file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.path)
+
+
+def load_snapshot(path):
+    with open(path, "rb") as file:
+        data = file.read()
+    try:
+        magic, version, digest, step, x, y, dp, cc, line_start, ended, \
+            offset, text_size, pending_size, depth = \
+            _HEADER.unpack_from(data)
+    except struct.error:
+        raise ValueError("not a Piet snapshot") from None
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError("not a Piet snapshot")
+    position = _HEADER.size
+    text = data[position:position + text_size].decode("utf-8",
+                                                      "surrogatepass")
+    position += text_size
+    pending = data[position:position + pending_size]
+    position += pending_size
+
+    stack, position = unpack_values(data, position, depth)
+    if position != len(data):
+        raise ValueError("snapshot is damaged")
+
+    input_state = (offset, text, pending, ended) \
+        if offset or text or pending or ended else None
+    return PietSnapshot(digest, step, x, y, dp, cc, stack, input_state,
+                        line_start)
+
+
+def pack_values(values):
+    # integers in the chunks of a snapshot's stack
+    return b"".join(_encode_chunk(values[start:start + CHUNK_SIZE])
+                    for start in range(0, len(values), CHUNK_SIZE))
+
+
+def unpack_values(data, position, count):
+    # the given number of integers packed at the position, and the position
+    # after them
+    values = []
+    while len(values) < count:
+        try:
+            kind, size, length = _CHUNK.unpack_from(data, position)
+        except struct.error:
+            raise ValueError("snapshot is cut short") from None
+        position += _CHUNK.size
+        chunk = _decode_chunk(kind, data[position:position + length])
+        if len(chunk) != size:
+            raise ValueError("snapshot is damaged")
+        values.extend(chunk)
+        position += length
+    if len(values) != count:
+        raise ValueError("snapshot is damaged")
+    return values, position
+
+
+def _encode_chunk(values):
+    try:
+        numbers = array("q", values)
+    except OverflowError:
+        parts = []
+        for value in values:
+            number = value.to_bytes((value.bit_length() + 8) // 8,
+                                    "little", signed=True)
+            parts.append(_LENGTH.pack(len(number)))
+            parts.append(number)
+        data = b"".join(parts)
+        return _CHUNK.pack(CHUNK_LARGE, len(values), len(data)) + data
+    if sys.byteorder == "big":
+        numbers.byteswap()
+    data = numbers.tobytes()
+    return _CHUNK.pack(CHUNK_SMALL, len(values), len(data)) + data
+
+
+def _decode_chunk(kind, data):
+    if kind == CHUNK_SMALL:
+        numbers = array("q")
+        numbers.frombytes(data)
+        if sys.byteorder == "big":
+            numbers.byteswap()
+        return numbers.tolist()
+    if kind != CHUNK_LARGE:
+        raise ValueError("snapshot is damaged")
+    values = []
+    position = 0
+    while position < len(data):
+        size, = _LENGTH.unpack_from(data, position)
+        position += _LENGTH.size
+        values.append(int.from_bytes(data[position:position + size],
+                                     "little", signed=True))
+        position += size
+    return values
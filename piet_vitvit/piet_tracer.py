@@ -0,0 +1,124 @@
+from piet_vitvit.piet_engine import COMMAND_NAMES, COMMAND_POPS
+
+
+# operators printed between the operands of the binary commands
+OPERATORS = {"piet_add": "+", "piet_sub": "-", "piet_mul": "*",
+             "piet_div": "/", "piet_mod": "%", "piet_gt": ">"}
+
+
+class PietTracer:
+    # events of PietInterpreter, executed step by step with a tracer
+    # attached; none of them are reported when there is no tracer
+    def step_started(self, step):
+        pass
+
+    def block_entered(self, x, y, block, value, stack):
+        pass
+
+    def edge_chosen(self, edge_x, edge_y, next_x, next_y, dp, cc):
+        pass
+
+    def rotated(self, iteration, dp, cc):
+        pass
+
+    def white_slid(self, x, y, dp, cc):
+        pass
+
+    def trapped(self):
+        pass
+
+    def color_shifted(self, old, new):
+        # the colors, from piet_colors.COLORS, of the blocks the execution
+        # moves between
+        pass
+
+    def command_executed(self, command, value, popped, pushed, dp, cc):
+        # popped are the values the command took off the top of the stack,
+        # fewer than it needs on underflow, and pushed the ones it left in
+        # their place; DP and CC are the ones after it
+        pass
+
+    def stack_changed(self, stack):
+        pass
+
+    def step_finished(self, step):
+        pass
+
+
+class ConsoleTracer(PietTracer):
+    # the debug mode: prints every event and waits for the user to press
+    # ENTER before moving forward
+    def step_started(self, step):
+        self._log("-" * 40)
+        self._log(f"START STEP {step}")
+        self._prompt()
+
+    def block_entered(self, x, y, block, value, stack):
+        self._log("CURRENT STATE:")
+        self._log(f"pos: {x, y}")
+        self._log(f"block: {block.index} ({block.size} codels)")
+        self._log(f"value: {value}", "VM")
+        self._log(f"stack: {stack}", "VM")
+        self._prompt()
+
+    def edge_chosen(self, edge_x, edge_y, next_x, next_y, dp, cc):
+        self._log(f"DP: {dp.name}", "VM")
+        self._log(f"CC: {cc.name}", "VM")
+        self._log(f"current edge: {edge_x, edge_y}")
+        self._log(f"looking at: {next_x, next_y}")
+        self._prompt()
+
+    def rotated(self, iteration, dp, cc):
+        self._log("Can't move there. Rotating...")
+
+    def white_slid(self, x, y, dp, cc):
+        self._log("Entered WHITE. Passing through...")
+        self._log(f"Slid to: {x, y}")
+
+    def trapped(self):
+        self._log("Execution trapped!")
+
+    def color_shifted(self, old, new):
+        self._log("Moving there...")
+        self._log(f"{old['light'].name} {old['hue'].name} -> "
+                  f"{new['light'].name} {new['hue'].name}")
+
+    def command_executed(self, command, value, popped, pushed, dp, cc):
+        if len(popped) < COMMAND_POPS[COMMAND_NAMES.index(command)]:
+            self._log("Stack underflow!", "VM")
+            return
+        name = command[len("piet_"):].upper()
+        if command in OPERATORS:
+            message = f"{name} {popped[0]}{OPERATORS[command]}{popped[1]}"
+        elif command == "piet_push":
+            message = f"{name} {value}"
+        elif command == "piet_pointer":
+            message = f"{name} {dp.name}"
+        elif command == "piet_switch":
+            message = f"{name} {cc.name}"
+        elif command == "piet_roll":
+            message = f"{name} {popped[1]} {popped[0]}"
+        elif command in ("piet_innum", "piet_inchar"):
+            if not pushed:
+                # nothing was read
+                return
+            message = f"{name} {pushed[-1]}"
+        elif popped:
+            message = f"{name} {popped[0]}"
+        else:
+            message = name
+        self._log(message, "VM")
+
+    def stack_changed(self, stack):
+        self._log(f"stack: {stack}", "VM")
+        self._prompt()
+
+    def step_finished(self, step):
+        self._log(f"END STEP {step}")
+        self._prompt()
+
+    def _log(self, message, source="INTER"):
+        print(f"[{source}] {message}")
+
+    def _prompt(self):
+        input("...")
@@ -1,5 +1,7 @@
 from enum import IntEnum
 
+from piet_vitvit.piet_io import PietInput, PietOutput
+
 
 class DP(IntEnum):
     RIGHT = 0
@@ -13,26 +15,69 @@ class CC(IntEnum):
     RIGHT = 1
 
 
+# commands, indexed by [hue change][lightness change] between two blocks
+PIET_COMMANDS = [
+    ["piet_pass", "piet_push", "piet_pop"],
+    ["piet_add", "piet_sub", "piet_mul"],
+    ["piet_div", "piet_mod", "piet_not"],
+    ["piet_gt", "piet_pointer", "piet_switch"],
+    ["piet_dup", "piet_roll", "piet_innum"],
+    ["piet_inchar", "piet_outnum", "piet_outchar"],
+    ]
+
+
+class PietTrapped(Exception):
+    # raised once the program can't move anywhere, which ends it
+    def __init__(self, step=None):
+        super().__init__("trapped")
+        self.step = step
+
+
+class PietMemoryExceeded(Exception):
+    # raised once the stack grows past the limits set, which ends the program
+    pass
+
+
 class PietVM:
-    def __init__(self):
+    def __init__(self, stdin=None, stdout=None):
         self.dp = DP.RIGHT
         self.cc = CC.LEFT
         self.stack = []
         self.current_value = 1
-        self.debug = False
+        self.output = PietOutput(stdout)
+        self.input = PietInput(stdin, output=self.output)
+        # the most values the stack may hold and bits a value may take,
+        # checked by the commands, which can exceed them, only if set
+        self.max_depth = None
+        self.max_bits = None
+        self.limited = False
+
+    def limit_memory(self, max_depth=None, max_bits=None):
+        self.max_depth = max_depth
+        self.max_bits = max_bits
+        self.limited = max_depth is not None or max_bits is not None
+
+    def check_stack(self, count=1):
+        # the depth of the stack and the size of its top count values
+        if self.max_depth is not None and len(self.stack) > self.max_depth:
+            raise PietMemoryExceeded(
+                f"stack is deeper than {self.max_depth} values")
+        if self.max_bits is not None and count > 0:
+            for value in self.stack[-count:]:
+                if value.bit_length() > self.max_bits:
+                    raise PietMemoryExceeded(
+                        f"value is larger than {self.max_bits} bits")
 
     def piet_pass(self):
-        self._debug_log("PASS")
         pass
 
     def piet_push(self):
         self.stack.append(self.current_value)
-        self._debug_log(f"PUSH {self.current_value}")
+        if self.limited:
+            self.check_stack()
 
     def piet_pop(self):
-        top = self._safe_pop()
-        if top is not None:
-            self._debug_log(f"POP {top}")
+        self._safe_pop()
 
     def piet_add(self):
         top1 = self._safe_pop()
@@ -40,7 +85,8 @@ class PietVM:
         if top1 is None or top2 is None:
             return
         self.stack.append(top2 + top1)
-        self._debug_log(f"ADD {top2}+{top1}")
+        if self.limited:
+            self.check_stack()
 
     def piet_sub(self):
         top1 = self._safe_pop()
@@ -48,7 +94,8 @@ class PietVM:
         if top1 is None or top2 is None:
             return
         self.stack.append(top2 - top1)
-        self._debug_log(f"SUB {top2}-{top1}")
+        if self.limited:
+            self.check_stack()
 
     def piet_mul(self):
         top1 = self._safe_pop()
@@ -56,7 +103,8 @@ class PietVM:
         if top1 is None or top2 is None:
             return
         self.stack.append(top2 * top1)
-        self._debug_log(f"MUL {top2}*{top1}")
+        if self.limited:
+            self.check_stack()
 
     def piet_div(self):
         top1 = self._safe_pop()
@@ -64,7 +112,6 @@ class PietVM:
         if top1 is None or top2 is None:
             return
         self.stack.append(top2 // top1)
-        self._debug_log(f"DIV {top2}/{top1}")
 
     def piet_mod(self):
         top1 = self._safe_pop()
@@ -72,14 +119,12 @@ class PietVM:
         if top1 is None or top2 is None:
             return
         self.stack.append(top2 % top1)
-        self._debug_log(f"MOD {top2}%{top1}")
 
     def piet_not(self):
         top = self._safe_pop()
         if top is None:
             return
         self.stack.append(int(not top))
-        self._debug_log(f"NOT {top}")
 
     def piet_gt(self):
         top1 = self._safe_pop()
@@ -87,21 +132,18 @@ class PietVM:
         if top1 is None or top2 is None:
             return
         self.stack.append(int(top2 > top1))
-        self._debug_log(f"GT {top2}>{top1}")
 
     def piet_pointer(self):
         top = self._safe_pop()
         if top is None:
             return
         self.dp = DP((self.dp + top) % 4)
-        self._debug_log(f"POINTER {self.dp.name}")
 
     def piet_switch(self):
         top = self._safe_pop()
         if top is None:
             return
         self.cc = CC(self.cc * (-1 ** top))
-        self._debug_log(f"SWITCH {self.cc.name}")
 
     def piet_dup(self):
         top = self._safe_pop()
@@ -109,7 +151,8 @@ class PietVM:
             return
         self.stack.append(top)
         self.stack.append(top)
-        self._debug_log(f"DUP {top}")
+        if self.limited:
+            self.check_stack(0)
 
     def piet_roll(self):
         top1 = self._safe_pop()
@@ -119,59 +162,62 @@ class PietVM:
         num = top1 % top2
         if top2 <= 0 or num == 0:
             return
-        x = -abs(num) + top2 * (num < 0)
-        self.stack[-top2:] = self.stack[x:] + self.stack[-top2:x]
-        self._debug_log(f"ROLL {top1} {top2}")
+        roll(self.stack, top2, num)
 
     def piet_innum(self):
-        try:
-            number = int(input("Reading number: "))
-        except ValueError:
+        number = self.input.read_number()
+        if number is None:
             return
         self.stack.append(number)
-        self._debug_log(f"INNUM {number}")
+        if self.limited:
+            self.check_stack()
 
     def piet_inchar(self):
-        try:
-            char = ord(input("Reading character: "))
-        except TypeError:
+        char = self.input.read_char()
+        if char is None:
             return
         self.stack.append(char)
-        self._debug_log(f"INCHAR {char}")
+        if self.limited:
+            self.check_stack(0)
 
     def piet_outnum(self):
         top = self._safe_pop()
         if top is None:
             return
-        print(top)
-        self._debug_log(f"OUTNUM {top}")
+        self.output.write(str(top))
 
     def piet_outchar(self):
         top = self._safe_pop()
         if top is None:
             return
-        print(chr(top))
-        self._debug_log(f"OUTCHAR {top}")
-
-    def debug_log_value(self):
-        self._debug_log(f"value: {self.current_value}")
-
-    def debug_log_stack(self):
-        self._debug_log(f"stack: {self.stack}")
-
-    def debug_log_direction(self):
-        self._debug_log(f"DP: {self.dp.name}")
-        self._debug_log(f"CC: {self.cc.name}")
+        self.output.write(chr(top))
 
     def _safe_pop(self):
         if not self.stack:
-            self._debug_log("Stack underflow!")
             return
         return self.stack.pop()
 
-    def _debug_log(self, message):
-        if self.debug:
-            print(f"[VM] {message}")
-
     def _dispose(self):
         del self
+
+
+def roll(stack, depth, count):
+    # rolls the top depth values of the stack count times in place, by
+    # copying the shorter of its two parts aside and putting it back on the
+    # other side; a roll deeper than the stack rolls all of it, unless
+    # count is larger still. It is O(depth) all the same, as deleting and
+    # inserting the part shift the rest of the depth, but that is a single
+    # memmove of pointers, while only the copied part costs per value
+    depth = min(depth, len(stack))
+    if count >= depth:
+        return
+    if count <= depth - count:
+        moved = stack[-count:]
+        del stack[-count:]
+        start = len(stack) - depth + count
+        stack[start:start] = moved
+    else:
+        start = len(stack) - depth
+        moved = stack[start:start + depth - count]
+        del stack[start:start + depth - count]
+        stack.extend(moved)
@@ -0,0 +1,65 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir))
+
+from benchmarks import programs as bprograms
+from benchmarks import runner as brunner
+
+
+class BenchmarksTestCase(unittest.TestCase):
+    def test_programs_behave_as_known(self):
+        for benchmark in bprograms.generate(quick=True):
+            for engine in brunner.ENGINES:
+                with self.subTest(benchmark.name, engine=engine):
+                    result = brunner.run_benchmark(benchmark, engine,
+                                                   memory=False)
+                    self.assertTrue(result["correct"])
+                    self.assertLessEqual(result["steps"], benchmark.limit)
+
+    def test_engines_agree_on_steps(self):
+        benchmark = bprograms.nested_loops(3)
+        steps = {brunner.run_benchmark(benchmark, engine,
+                                       memory=False)["steps"]
+                 for engine in brunner.ENGINES}
+        self.assertEqual(len(steps), 1)
+
+    def test_printer_output(self):
+        benchmark = bprograms.printer(4)
+        self.assertEqual(benchmark.output, b"3\n2\n1\n")
+        self.assertTrue(brunner.run_benchmark(benchmark)["correct"])
+
+    def test_results(self):
+        results = brunner.run_benchmarks(
+            [bprograms.huge_block(10, 100)], "table")
+        result = results["benchmarks"]["huge_block"]
+        self.assertEqual(result["steps"], 100)
+        self.assertEqual(set(result["phases"]),
+                         {"decode", "blocks", "transitions", "run"})
+        self.assertGreater(result["peak_memory"], 0)
+
+    def test_compare(self):
+        baseline = {"benchmarks": {
+            "a": {"steps_per_second": 1000, "load_time": 1.0,
+                  "peak_memory": 100, "correct": True},
+            "b": {"steps_per_second": 1000, "load_time": 1.0,
+                  "peak_memory": 100, "correct": True}}}
+        results = {"benchmarks": {
+            "a": {"steps_per_second": 950, "load_time": 1.05,
+                  "peak_memory": 100, "correct": True},
+            "c": {"steps_per_second": 10, "load_time": 9.0,
+                  "peak_memory": 900, "correct": True}}}
+        lines, regressed = brunner.compare(results, baseline)
+        self.assertEqual(len(lines), 1)
+        self.assertFalse(regressed)
+
+        results["benchmarks"]["a"]["steps_per_second"] = 800
+        lines, regressed = brunner.compare(results, baseline)
+        self.assertTrue(regressed)
+        self.assertIn("steps_per_second -20.0% !", lines[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import io
+import json
+import os
+import sys
+import unittest
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir))
+
+from benchmarks import programs as bprograms
+from piet_vitvit import piet_blocks as pblocks
+from piet_vitvit import piet_analysis as panalysis
+from piet_vitvit import piet_api as papi
+from piet_vitvit import piet_colors as pcolors
+from piet_vitvit import piet_engine as pengine
+from piet_vitvit import piet_image as pimage
+from piet_vitvit import piet_interpreter as pinter
+from piet_vitvit import piet_slides as pslides
+
+
+def with_signature(benchmark, height=4):
+    # the program with colorful art under it, behind a black line
+    matrix = benchmark.matrix
+    art = np.arange(matrix.shape[1] * height, dtype=np.uint8) \
+        .reshape(height, -1) % 18
+    black = np.full((1, matrix.shape[1]), pcolors.COLOR_BLACK,
+                    dtype=np.uint8)
+    return bprograms.PietBenchmark(benchmark.name,
+                                   np.vstack((matrix, black, art)),
+                                   benchmark.limit), art.size
+
+
+class PietAnalysisTestCase(unittest.TestCase):
+    def analyze(self, benchmark):
+        program = papi.compile(benchmark.to_png())
+        return panalysis.PietAnalysis(program.transitions,
+                                      program.start_state)
+
+    def test_only_reachable_blocks_labeled(self):
+        benchmark, art = with_signature(bprograms.printer(30))
+        analysis = self.analyze(benchmark)
+        self.assertEqual(len(analysis.transitions.blocks),
+                         len(analysis.blocks))
+        reachable, colored = analysis.get_area()
+        self.assertEqual(colored - reachable, art)
+
+        whole = self.analyze(bprograms.printer(30))
+        self.assertEqual(analysis.get_area()[0], whole.get_area()[0])
+        self.assertEqual(len(analysis.entries), len(whole.entries))
+
+    def test_only_read_tiles_counted(self):
+        # the art far below the program is neither decoded nor counted
+        benchmark, art = with_signature(bprograms.printer(30), 64)
+        image = Image.open(io.BytesIO(benchmark.to_png()))
+        tiles = pimage.PietTiles(image, tile_size=8)
+        rows, cols = tiles.shape
+        blocks = pblocks.PietBlocks(tiles, cols, rows, 8, lazy=True)
+        transitions = pengine.PietTransitions(tiles, blocks,
+                                              pslides.PietSlides(tiles))
+        analysis = panalysis.PietAnalysis(
+            transitions, transitions.get_start_state(0, 0, 0, -1))
+        reachable, colored = analysis.get_area()
+        self.assertLess(colored - reachable, art)
+        self.assertLess(len(tiles.read), -(-rows // 8) * -(-cols // 8))
+        self.assertIn(f"in {len(tiles.read)} of ", analysis.get_report())
+
+    def test_branches_to_every_direction(self):
+        analysis = self.analyze(bprograms.nested_loops(5))
+        pointer = pengine.COMMAND_NAMES.index("piet_pointer")
+        pointers = [state for state, entry in analysis.entries.items()
+                    if entry[0] == pointer]
+        self.assertTrue(pointers)
+        for state in pointers:
+            self.assertEqual(len(analysis.get_successors(state)), 8)
+
+    def test_traps_and_dead_ends(self):
+        inter = pinter.PietInterpreter("tests/test_images/example_1_64.png",
+                                       64, lazy=True)
+        transitions = pengine.PietTransitions(inter.matrix, inter.blocks,
+                                              inter.slides)
+        analysis = panalysis.PietAnalysis(
+            transitions, transitions.get_start_state(0, 0, 0, -1))
+        self.assertEqual(len(analysis.traps), 1)
+        self.assertEqual(analysis.dead_ends, [analysis.traps[0] // 8])
+        self.assertIn("trap states: 1", analysis.get_report())
+
+    def test_export(self):
+        analysis = self.analyze(bprograms.printer(30))
+        graph = json.loads(analysis.to_json())
+        self.assertEqual(graph["start"], analysis.start_state)
+        self.assertEqual(len(graph["states"]), len(analysis.entries))
+        self.assertEqual([block["block"] for block in graph["blocks"]],
+                         analysis.blocks)
+        dot = analysis.to_dot()
+        self.assertTrue(dot.startswith("digraph piet {"))
+        for block in analysis.blocks:
+            self.assertIn(f"    b{block} [", dot)
+
+
+if __name__ == "__main__":
+    unittest.main()
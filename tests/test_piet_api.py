@@ -0,0 +1,91 @@
+import os
+import sys
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir))
+
+import piet_vitvit
+from piet_vitvit import piet_interpreter as pinter
+from piet_vitvit import piet_vm as pvm
+
+
+def compile_image(filename, codel_size=64):
+    with open(f"tests/test_images/{filename}", "rb") as file:
+        return piet_vitvit.compile(file.read(), codel_size)
+
+
+class PietAPITestCase(unittest.TestCase):
+    def test_same_as_interpreter(self):
+        for filename in ("example_1_64.png", "example_2_64.png",
+                         "example_3_64.png", "execution_trapped_64.png"):
+            with self.subTest(filename):
+                reference = pinter.PietInterpreter(
+                    f"tests/test_images/{filename}", 64)
+                with self.assertRaises(pvm.PietTrapped):
+                    for _ in range(1000):
+                        reference.piet_step()
+
+                result = compile_image(filename).run(max_steps=1000)
+                self.assertEqual(result.reason, piet_vitvit.REASON_TRAPPED)
+                self.assertEqual(result.steps, reference.step)
+                self.assertEqual(result.stack, reference.pvm.stack)
+
+    def test_output(self):
+        result = compile_image("!debug_1_100.png", 100).run()
+        self.assertEqual(result.output, b"5")
+
+    def test_steps_limit(self):
+        result = compile_image("example_3_64.png").run(max_steps=3)
+        self.assertEqual(result.reason, piet_vitvit.REASON_LIMIT)
+        self.assertEqual(result.steps, 3)
+        self.assertEqual(result.stack, [1, 2, 3])
+
+    def test_timeout(self):
+        program = compile_image("find_edge_1_64.png")
+        result = program.run(max_steps=10 ** 12, timeout=0.05)
+        self.assertEqual(result.reason, piet_vitvit.REASON_TIMEOUT)
+        self.assertLess(result.steps, 10 ** 12)
+
+    def test_cycle(self):
+        result = compile_image("find_edge_1_64.png").run(
+            max_steps=10 ** 12, detect_cycles=True)
+        self.assertEqual(result.reason, piet_vitvit.REASON_CYCLE)
+
+    def test_cycle_in_prefix(self):
+        # found where it starts, not past the steps run at compile time
+        result = compile_image("endless_loop_64.png").run(
+            max_steps=500000, detect_cycles=True)
+        self.assertEqual(result.reason, piet_vitvit.REASON_CYCLE)
+        self.assertLess(result.steps, 10)
+
+    def test_memory_limit(self):
+        result = compile_image("example_3_64.png").run(max_depth=2)
+        self.assertEqual(result.reason, piet_vitvit.REASON_MEMORY)
+        self.assertEqual(result.stack, [1, 2, 3])
+        self.assertIsInstance(result.error, pvm.PietMemoryExceeded)
+
+    def test_error(self):
+        result = compile_image("correct_matrix_2_64.png").run()
+        self.assertEqual(result.reason, piet_vitvit.REASON_ERROR)
+        self.assertIsInstance(result.error, IndexError)
+
+    def test_reusable_program(self):
+        program = compile_image("example_2_64.png")
+        first = program.run()
+        second = program.run()
+        self.assertEqual(first.stack, second.stack)
+        self.assertIsNot(first.stack, second.stack)
+
+    def test_run_in_threads(self):
+        program = compile_image("!debug_1_100.png", 100)
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(lambda _: program.run(), range(32)))
+        for result in results:
+            self.assertEqual((result.reason, result.output, result.steps),
+                             (piet_vitvit.REASON_TRAPPED, b"5", 5))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir))
+
+from piet_vitvit import piet_batch as pbatch
+from piet_vitvit import piet_cache as pcache
+
+
+class PietBatchTestCase(unittest.TestCase):
+    def test_read_manifest(self):
+        jobs = pbatch.read_manifest([
+            '{"image": "a.png", "codel_size": 64, "input": "a.txt"}',
+            '',
+            '{"image": "b.png", "id": "b"}'], "tests")
+        self.assertEqual(jobs, [
+            {"image": os.path.join("tests", "a.png"), "codel_size": 64,
+             "input": os.path.join("tests", "a.txt"), "id": 0},
+            {"image": os.path.join("tests", "b.png"), "id": "b"}])
+
+    def test_read_bad_manifest(self):
+        with self.assertRaises(ValueError):
+            pbatch.read_manifest(['{"image": "a.png"}', '{"codel_size": 1}'])
+        with self.assertRaises(ValueError):
+            pbatch.read_manifest(['not json'])
+
+    def test_run_job(self):
+        result = pbatch.run_job({"id": 0, "image":
+                                 "tests/test_images/!debug_1_100.png",
+                                 "codel_size": 100})
+        self.assertEqual(result["reason"], "trapped")
+        self.assertEqual(result["output"], "5")
+        self.assertEqual(result["steps"], 5)
+
+    def test_run_job_with_missing_image(self):
+        result = pbatch.run_job({"id": 0, "image": "missing.png"})
+        self.assertEqual(result["reason"], "error")
+        self.assertIn("FileNotFoundError", result["error"])
+
+    def test_prefix_within_limit(self):
+        # a job's program is compiled with no more prefix steps than it
+        # may run, and kept apart from the ones for other limits
+        path = "tests/test_images/endless_loop_64.png"
+        with open(path, "rb") as file:
+            image_bytes = file.read()
+        for limit in (50, 200):
+            with self.subTest(limit=limit):
+                result = pbatch.run_job({"id": 0, "image": path,
+                                         "codel_size": 64, "limit": limit})
+                self.assertEqual((result["reason"], result["steps"]),
+                                 ("limit", limit))
+                key = pcache.get_key(image_bytes, 64, limit - 1)
+                self.assertEqual(pbatch._programs[key].prefix.steps,
+                                 limit - 1)
+        self.assertEqual(pbatch.get_prefix_steps(10 ** 9),
+                         pbatch.PREFIX_STEPS)
+        self.assertEqual(pbatch.get_prefix_steps(0), 0)
+
+    def test_run_batch(self):
+        jobs = [{"id": i, "image": f"tests/test_images/{filename}",
+                 "codel_size": 64, "limit": limit}
+                for i, (filename, limit) in enumerate([
+                    ("example_1_64.png", 100), ("endless_loop_64.png", 50),
+                    ("example_3_64.png", 3)])]
+        with tempfile.TemporaryDirectory() as directory:
+            results = list(pbatch.run_batch(jobs, 2, directory))
+            self.assertTrue(os.listdir(directory))
+        results.sort(key=lambda result: result["id"])
+        self.assertEqual([(result["reason"], result["steps"])
+                          for result in results],
+                         [("trapped", 4), ("limit", 50), ("limit", 3)])
+        self.assertEqual(results[2]["stack"], [1, 2, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir))
+
+from benchmarks import programs as bprograms
+from piet_vitvit import piet_api as papi
+from piet_vitvit import piet_breakpoints as pbreak
+from piet_vitvit import piet_cache as pcache
+from piet_vitvit import piet_engine as pengine
+from piet_vitvit import piet_vm as pvm
+
+
+class PietBreakpointsTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.program = papi.compile(bprograms.printer(30).to_png())
+
+    def run_until(self, breakpoints, steps=1000):
+        self.vm = pvm.PietVM(io.BytesIO(), io.BytesIO())
+        self.engine = pengine.PietEngine(self.program.transitions, self.vm,
+                                         *self.program.start_codel)
+        self.engine.breakpoints = breakpoints
+        with self.assertRaises(pengine.PietBreak) as ecm:
+            self.engine.run(steps)
+        return ecm.exception
+
+    def get_output(self):
+        self.vm.output.flush()
+        return self.vm.output.stream.getvalue()
+
+    def test_break_on_command(self):
+        hit = self.run_until(pbreak.PietBreakpoints(commands=["outchar"]))
+        self.assertEqual(hit.reason, "command OUTCHAR")
+        self.assertEqual(self.vm.stack, [29, 10])
+        self.assertEqual(self.get_output(), b"29")
+        self.assertEqual(hit.step, self.engine.step)
+
+    def test_break_on_block(self):
+        vm = pvm.PietVM(io.BytesIO(), io.BytesIO())
+        engine = pengine.PietEngine(self.program.transitions, vm,
+                                    *self.program.start_codel)
+        engine.run(5)
+        hit = self.run_until(pbreak.PietBreakpoints(codels=[engine.codel]))
+        self.assertEqual(hit.reason, f"block of codel {engine.codel}")
+        self.assertEqual(self.engine.codel, engine.codel)
+        self.assertEqual(self.engine.step, 5)
+
+    def test_cached_program(self):
+        # the blocks of codels can't be found in a program from the cache,
+        # while the rest of the breakpoints work the same
+        with tempfile.TemporaryDirectory() as directory:
+            cache = pcache.PietCache(directory)
+            image = bprograms.printer(30).to_png()
+            papi.compile(image, cache=cache)
+            self.program = papi.compile(image, cache=cache)
+            self.assertIsInstance(self.program.transitions,
+                                  pcache.PietCachedTransitions)
+            hit = self.run_until(pbreak.PietBreakpoints(
+                commands=["outchar"]))
+            self.assertEqual(hit.reason, "command OUTCHAR")
+            self.assertEqual(self.vm.stack, [29, 10])
+            breakpoints = pbreak.PietBreakpoints(
+                codels=[self.program.start_codel])
+            self.engine.breakpoints = breakpoints
+            with self.assertRaisesRegex(ValueError, "from the cache"):
+                self.engine.run(1000)
+
+    def test_break_on_stack(self):
+        self.run_until(pbreak.PietBreakpoints(depth=1))
+        self.assertEqual(len(self.vm.stack), 2)
+        self.run_until(pbreak.PietBreakpoints(top=25))
+        self.assertEqual(self.vm.stack[-1], 25)
+        self.assertEqual(self.get_output(), b"29\n28\n27\n26\n")
+
+    def test_break_on_output(self):
+        self.run_until(pbreak.PietBreakpoints(output=ord("7")))
+        self.assertEqual(self.get_output(), b"29\n28\n")
+        self.assertEqual(self.vm.stack, [27, 27])
+
+    def test_continue_after_break(self):
+        self.run_until(pbreak.PietBreakpoints(top=20))
+        self.engine.breakpoints = None
+        self.engine.run(500 - self.engine.step)
+
+        reference = pvm.PietVM(io.BytesIO(), io.BytesIO())
+        pengine.PietEngine(self.program.transitions, reference,
+                           *self.program.start_codel).run(500)
+        self.assertEqual(self.vm.stack, reference.stack)
+
+    def test_no_break(self):
+        vm = pvm.PietVM(io.BytesIO(), io.BytesIO())
+        engine = pengine.PietEngine(self.program.transitions, vm,
+                                    *self.program.start_codel)
+        engine.breakpoints = pbreak.PietBreakpoints(commands=["roll"])
+        engine.run(500)
+        self.assertEqual(engine.step, 500)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir))
+
+from piet_vitvit import piet_cache as pcache
+from piet_vitvit import piet_engine as pengine
+from piet_vitvit import piet_interpreter as pinter
+from piet_vitvit import piet_vm as pvm
+
+
+def load_image(filename):
+    path = f"tests/test_images/{filename}"
+    with open(path, "rb") as file:
+        return file.read(), pinter.PietInterpreter(path, 64)
+
+
+class PietCacheTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = pcache.PietCache(self.directory.name)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def store(self, filename):
+        image_bytes, inter = load_image(filename)
+        key = self.cache.get_key(image_bytes, 64)
+        engine = pengine.PietEngine.from_interpreter(inter)
+        self.assertTrue(self.cache.store(key, engine.transitions,
+                                         engine.state, engine.codel))
+        return key
+
+    def test_key_depends_on_codel_size(self):
+        self.assertNotEqual(self.cache.get_key(b"image", 1),
+                            self.cache.get_key(b"image", 2))
+
+    def test_missing_program(self):
+        self.assertIsNone(self.cache.load(self.cache.get_key(b"image", 1)))
+
+    def test_run_cached_program(self):
+        key = self.store("example_3_64.png")
+        transitions = self.cache.load(key)
+        self.assertIsNotNone(transitions)
+        vm = pvm.PietVM()
+        engine = pengine.PietEngine(transitions, vm,
+                                    *transitions.start_codel)
+        with self.assertRaises(pvm.PietTrapped) as ecm:
+            engine.run(1000)
+        self.assertEqual(str(ecm.exception), "trapped")
+        self.assertEqual(vm.stack, [3, 1, 2])
+        self.assertEqual(engine.step, 7)
+
+    def test_ignore_broken_program(self):
+        key = self.store("example_1_64.png")
+        with open(os.path.join(self.directory.name,
+                               key + pcache.CACHE_SUFFIX), "r+b") as file:
+            file.write(b"\0" * 8)
+        self.assertIsNone(self.cache.load(key))
+
+    def test_evict_least_recently_used(self):
+        first = self.store("example_1_64.png")
+        second = self.store("example_2_64.png")
+        os.utime(os.path.join(self.directory.name,
+                              first + pcache.CACHE_SUFFIX), (0, 0))
+        self.cache.max_size = os.path.getsize(os.path.join(
+            self.directory.name, second + pcache.CACHE_SUFFIX))
+        self.cache._evict()
+        self.assertIsNone(self.cache.load(first))
+        self.assertIsNotNone(self.cache.load(second))
+
+    def test_store_fails_quietly(self):
+        # a directory that can't be created, and one that can't be written
+        blocker = os.path.join(self.directory.name, "file")
+        with open(blocker, "wb"):
+            pass
+        self.cache.directory = os.path.join(blocker, "cache")
+        image_bytes, inter = load_image("example_1_64.png")
+        engine = pengine.PietEngine.from_interpreter(inter)
+        key = self.cache.get_key(image_bytes, 64)
+        self.assertFalse(self.cache.store(key, engine.transitions,
+                                          engine.state, engine.codel))
+        self.cache.directory = self.directory.name
+        os.mkdir(self.cache._get_path(key))
+        self.assertFalse(self.cache.store(key, engine.transitions,
+                                          engine.state, engine.codel))
+        self.assertEqual(sorted(os.listdir(self.directory.name)),
+                         sorted(["file", key + pcache.CACHE_SUFFIX]))
+
+    def test_clear(self):
+        key = self.store("example_1_64.png")
+        self.cache.clear()
+        self.assertIsNone(self.cache.load(key))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import io
+import os
+import sys
+import unittest
+from contextlib import redirect_stdout
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir))
+
+from piet_vitvit import piet_compiler as pcompiler
+from piet_vitvit import piet_engine as pengine
+from piet_vitvit import piet_interpreter as pinter
+from piet_vitvit import piet_vm as pvm
+
+
+TEST_IMAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "test_images")
+
+
+def compile_image(filename, codel_size=64):
+    inter = pinter.PietInterpreter(os.path.join(TEST_IMAGES, filename),
+                                   codel_size)
+    transitions = pengine.PietTransitions(inter.matrix, inter.blocks,
+                                          inter.slides)
+    start_state = transitions.get_start_state(0, 0, inter.pvm.dp,
+                                              inter.pvm.cc)
+    return pcompiler.compile_program(transitions, start_state, filename,
+                                     codel_size)
+
+
+def run_reference(filename, steps, codel_size=64):
+    inter = pinter.PietInterpreter(os.path.join(TEST_IMAGES, filename),
+                                   codel_size)
+    output = io.StringIO()
+    with redirect_stdout(output):
+        try:
+            for _ in range(steps):
+                inter.piet_step()
+        except pvm.PietTrapped as e:
+            return str(e), inter.pvm.stack, output.getvalue()
+    return None, inter.pvm.stack, output.getvalue()
+
+
+def run_compiled(source, steps):
+    module = {"__name__": "compiled"}
+    exec(source, module)
+    output = io.StringIO()
+    with redirect_stdout(output):
+        try:
+            module["run"](steps)
+        except SystemExit as e:
+            return e.code, module["stack"], output.getvalue()
+    return None, module["stack"], output.getvalue()
+
+
+class PietCompilerTestCase(unittest.TestCase):
+    def test_same_as_interpreter(self):
+        for filename in sorted(os.listdir(TEST_IMAGES)):
+            if filename.startswith("correct_matrix_2"):
+                # starts on white, which can not be executed
+                continue
+            codel_size = 100 if filename.startswith("!debug") else 64
+            with self.subTest(filename):
+                source = compile_image(filename, codel_size)
+                self.assertEqual(run_compiled(source, 1000),
+                                 run_reference(filename, 1000, codel_size))
+
+    def test_no_interpreter_imports(self):
+        source = compile_image("example_2_64.png")
+        self.assertNotIn("PIL", source)
+        self.assertNotIn("piet_vitvit", source.split("\n", 2)[2])
+
+    def test_one_function_per_block(self):
+        source = compile_image("example_1_64.png")
+        self.assertIn("def block_0(dc):", source)
+        self.assertIn("push(1)", source)
+
+    def test_failed_state(self):
+        # a state that failed to resolve raises when the program gets to
+        # it, even if the type of the error is only defined in the package
+        class BrokenBlock(Exception):
+            pass
+
+        inter = pinter.PietInterpreter(
+            os.path.join(TEST_IMAGES, "example_1_64.png"), 64)
+        transitions = pengine.PietTransitions(inter.matrix, inter.blocks,
+                                              inter.slides)
+        start_state = transitions.get_start_state(0, 0, inter.pvm.dp,
+                                                  inter.pvm.cc)
+        entries = transitions.explore(start_state)
+        entries[start_state] = BrokenBlock("no way out")
+        transitions.explore = lambda state: entries
+        source = pcompiler.compile_program(transitions, start_state)
+        with self.assertRaisesRegex(RuntimeError,
+                                    "^BrokenBlock: no way out$"):
+            run_compiled(source, 10)
+
+    def test_endless_loop_stops_early(self):
+        source = compile_image("endless_loop_64.png")
+        self.assertEqual(run_compiled(source, 10 ** 9), (None, [], ""))
+
+
+if __name__ == "__main__":
+    unittest.main()
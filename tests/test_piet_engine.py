@@ -0,0 +1,104 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir))
+
+from piet_vitvit import piet_engine as pengine
+from piet_vitvit import piet_interpreter as pinter
+from piet_vitvit import piet_vm as pvm
+
+
+class PietEngineTestCase(unittest.TestCase):
+    def load(self, filename, codel_size=64):
+        self.inter = pinter.PietInterpreter(
+            f"tests/test_images/{filename}", codel_size)
+        self.engine = pengine.PietEngine.from_interpreter(self.inter)
+
+    def tearDown(self) -> None:
+        return self.inter._dispose()
+
+    def test_transition_resolved_once(self):
+        self.load("example_1_64.png")
+        self.engine.run(1)
+        table = self.engine.transitions.table
+        entry = table[0]
+        self.assertEqual(pengine.COMMAND_NAMES[entry[0]], "piet_push")
+        self.engine.run(1)
+        self.assertIs(table[0], entry)
+
+    def test_end_execution_on_single_block(self):
+        self.load("single_block_64.png")
+        with self.assertRaises(pvm.PietTrapped) as ecm:
+            self.engine.run(1)
+        self.assertEqual(str(ecm.exception), "trapped")
+        self.assertEqual(self.engine.step, 1)
+
+    def test_dont_break_on_endless_loop(self):
+        self.load("endless_loop_64.png")
+        self.engine.run(10000)
+        self.assertEqual(self.engine.step, 10000)
+
+    def test_skip_white_only_cycle(self):
+        self.load("endless_loop_64.png")
+        self.engine.run(10 ** 9)
+        self.assertEqual(self.engine.step, 10 ** 9)
+        self.assertEqual(self.engine.codel, (0, 0))
+
+    def test_same_as_interpreter(self):
+        for filename in ("example_1_64.png", "example_2_64.png",
+                         "example_3_64.png", "execution_trapped_64.png"):
+            with self.subTest(filename):
+                reference = pinter.PietInterpreter(
+                    f"tests/test_images/{filename}", 64)
+                with self.assertRaises(pvm.PietTrapped):
+                    for _ in range(1000):
+                        reference.piet_step()
+
+                self.load(filename)
+                with self.assertRaises(pvm.PietTrapped):
+                    self.engine.run(1000)
+                self.engine.sync(self.inter)
+                self.assertEqual(self.inter.pvm.stack, reference.pvm.stack)
+                self.assertEqual(self.inter.step, reference.step)
+                self.assertEqual((self.inter.curr_x, self.inter.curr_y),
+                                 (reference.curr_x, reference.curr_y))
+                self.assertEqual((self.inter.pvm.dp, self.inter.pvm.cc),
+                                 (reference.pvm.dp, reference.pvm.cc))
+
+    def test_continue_with_interpreter(self):
+        self.load("example_3_64.png")
+        self.engine.run(3)
+        self.engine.sync(self.inter)
+        with self.assertRaises(pvm.PietTrapped):
+            for _ in range(1000):
+                self.inter.piet_step()
+        self.assertEqual(self.inter.pvm.stack, [3, 1, 2])
+
+    def test_detect_white_only_cycle(self):
+        self.load("endless_loop_64.png")
+        self.engine.detect_cycles = True
+        with self.assertRaises(pengine.PietCycle) as ecm:
+            self.engine.run(10000)
+        self.assertEqual(ecm.exception.step, 1)
+        self.assertEqual(self.engine.step, 1)
+
+    def test_detect_cycle(self):
+        self.load("find_adjacent_2_64.png")
+        self.engine.detect_cycles = True
+        with self.assertRaises(pengine.PietCycle) as ecm:
+            self.engine.run(10000)
+        self.assertEqual(ecm.exception.period, 4)
+        self.assertLess(self.engine.step, 10)
+
+    def test_dont_detect_cycle_in_terminating_program(self):
+        self.load("example_3_64.png")
+        self.engine.detect_cycles = True
+        with self.assertRaises(pvm.PietTrapped) as ecm:
+            self.engine.run(10000)
+        self.assertEqual(str(ecm.exception), "trapped")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import io
+import os
+import sys
+import unittest
+
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir))
+
+from benchmarks import programs as bprograms
+from piet_vitvit import piet_blocks as pblocks
+from piet_vitvit import piet_engine as pengine
+from piet_vitvit import piet_image as pimage
+from piet_vitvit import piet_slides as pslides
+from piet_vitvit import piet_vm as pvm
+
+
+def get_image(benchmark, codel_size=1):
+    image = Image.open(io.BytesIO(benchmark.to_png()))
+    if codel_size > 1:
+        image = image.resize((image.width * codel_size,
+                              image.height * codel_size), Image.NEAREST)
+    return image
+
+
+def run(matrix, blocks, steps):
+    vm = pvm.PietVM(io.BytesIO(), io.BytesIO())
+    engine = pengine.PietEngine(
+        pengine.PietTransitions(matrix, blocks, pslides.PietSlides(matrix)),
+        vm)
+    try:
+        engine.run(steps)
+    except pvm.PietTrapped:
+        pass
+    vm.output.flush()
+    return engine.step, vm.stack, vm.output.stream.getvalue()
+
+
+class PietTilesTestCase(unittest.TestCase):
+    def test_same_codels(self):
+        image = get_image(bprograms.nested_loops(5), 3)
+        matrix = pimage.decode_codels(image, 3)
+        tiles = pimage.PietTiles(image, 3, tile_size=7, max_tiles=4)
+        self.assertEqual(tiles.shape, matrix.shape)
+        rows, cols = matrix.shape
+        for y in range(rows):
+            for x in range(cols):
+                self.assertEqual(tiles[y, x], matrix[y, x])
+        self.assertEqual(tiles[2, 7:14].tolist(), matrix[2, 7:14].tolist())
+        self.assertLessEqual(len(tiles.tiles), 4)
+
+    def test_same_blocks(self):
+        image = get_image(bprograms.nested_loops(5))
+        matrix = pimage.decode_codels(image)
+        rows, cols = matrix.shape
+        tiles = pimage.PietTiles(image, tile_size=5)
+        whole = pblocks.PietBlocks(matrix, cols, rows)
+        tiled = pblocks.PietBlocks(tiles, cols, rows, 5, lazy=True)
+        for y in range(rows):
+            for x in range(cols):
+                block = whole.block_at(x, y)
+                tiled_block = tiled.block_at(x, y)
+                self.assertEqual(tiled_block.size, block.size)
+                self.assertEqual(tiled_block.exits, block.exits)
+
+    def test_same_run(self):
+        for benchmark in (bprograms.printer(30), bprograms.deep_rolls(20, 15),
+                          bprograms.white_corridors(5, 40)):
+            with self.subTest(benchmark.name):
+                image = get_image(benchmark)
+                matrix = pimage.decode_codels(image)
+                rows, cols = matrix.shape
+                tiles = pimage.PietTiles(image, tile_size=8, max_tiles=6)
+                self.assertEqual(
+                    run(tiles, pblocks.PietBlocks(tiles, cols, rows, 8,
+                                                  lazy=True), 2000),
+                    run(matrix, pblocks.PietBlocks(matrix, cols, rows),
+                        2000))
+
+    def test_only_visited_tiles_decoded(self):
+        # the last column is a block of its own, so labeling it reads the
+        # tiles of that column alone
+        image = get_image(bprograms.huge_block(200))
+        tiles = pimage.PietTiles(image, tile_size=64)
+        blocks = pblocks.PietBlocks(tiles, 200, 200, 64, lazy=True)
+        self.assertEqual(blocks.block_at(199, 0).size, 200)
+        self.assertEqual(tiles.decoded, 4)
+        self.assertIsInstance(pimage.open_codels(image), type(
+            pimage.decode_codels(image)))
+
+    def test_uncompressed_not_loaded(self):
+        # tiles of BMP, PPM and TGA images are read from the file alone,
+        # while a PNG one is loaded whole
+        source = get_image(bprograms.nested_loops(5), 3)
+        for format, mode in (("BMP", "RGB"), ("BMP", "P"), ("PPM", "RGB"),
+                             ("TGA", "RGBA")):
+            with self.subTest(format, mode=mode):
+                stream = io.BytesIO()
+                source.convert(mode).save(stream, format)
+                image = Image.open(stream)
+                matrix = pimage.decode_codels(Image.open(stream), 3)
+                tiles = pimage.PietTiles(image, 3, tile_size=7)
+                rows, cols = matrix.shape
+                for y in range(rows):
+                    self.assertEqual([tiles[y, x] for x in range(cols)],
+                                     matrix[y].tolist())
+                self.assertTrue(image.tile)
+        image = get_image(bprograms.nested_loops(5))
+        self.assertTrue(image.tile)
+        pimage.PietTiles(image, tile_size=7).get_tile(0, 0)
+        self.assertFalse(image.tile)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,6 +6,7 @@ sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
                              os.path.pardir))
 
 from piet_vitvit import piet_interpreter as pinter
+from piet_vitvit import piet_vm as pvm
 
 
 class PietInterpreterTestCase(unittest.TestCase):
@@ -25,58 +26,93 @@ class PietInterpreterTestCase(unittest.TestCase):
     def test_init_correct_matrix_1(self):
         self.inter = pinter.PietInterpreter(
             "tests/test_images/correct_matrix_1_64.png", 64)
-        self.assertEqual(self.inter.matrix, [["#000000"]])
+        self.assertEqual(self.inter.matrix.tolist(), [[19]])
 
     def test_init_correct_matrix_2(self):
         self.inter = pinter.PietInterpreter(
             "tests/test_images/correct_matrix_2_64.png", 64)
-        self.assertEqual(self.inter.matrix, [
-            ["#ffffff", "#ffffff", "#ffffff"],
-            ["#0000ff", "#0000ff", "#0000ff"],
-            ["#ff0000", "#ff0000", "#ff0000"]])
+        self.assertEqual(self.inter.matrix.tolist(), [
+            [18, 18, 18],
+            [10, 10, 10],
+            [6, 6, 6]])
+
+    def assertBlockEqual(self, x, y, codels):
+        block = self.inter.blocks.block_at(x, y)
+        self.assertEqual(block.size, len(codels))
+        for codel in codels:
+            self.assertIs(self.inter.blocks.block_at(*codel), block)
 
     def test_find_adjacent_1(self):
         self.inter = pinter.PietInterpreter(
             "tests/test_images/find_adjacent_1_64.png", 64)
-        self.inter._add_adjacent_to_block(0, 0)
-        self.assertCountEqual(self.inter.block, [
+        self.assertBlockEqual(0, 0, [
             (0, 0), (1, 0), (2, 0), (1, 1), (2, 1), (2, 2)])
 
     def test_find_adjacent_2(self):
         self.inter = pinter.PietInterpreter(
             "tests/test_images/find_adjacent_2_64.png", 64)
-        self.inter._add_adjacent_to_block(0, 0)
-        self.assertCountEqual(self.inter.block, [
+        self.assertBlockEqual(0, 0, [
             (0, 0), (1, 0), (0, 1)])
 
     def test_find_edge_1(self):
         self.inter = pinter.PietInterpreter(
             "tests/test_images/find_edge_1_64.png", 64)
-        self.inter._add_adjacent_to_block(0, 0)
+        self.inter.block = self.inter.blocks.block_at(0, 0)
         edge = self.inter._get_block_edge()
         self.assertEqual(edge, (1, 0))
 
     def test_find_edge_2(self):
         self.inter = pinter.PietInterpreter(
             "tests/test_images/find_edge_2_64.png", 64)
-        self.inter._add_adjacent_to_block(0, 0)
+        self.inter.block = self.inter.blocks.block_at(0, 0)
         edge = self.inter._get_block_edge()
         self.assertEqual(edge, (4, 0))
 
+    def test_block_exits(self):
+        self.inter = pinter.PietInterpreter(
+            "tests/test_images/find_adjacent_1_64.png", 64)
+        block = self.inter.blocks.block_at(0, 0)
+        self.assertEqual(block.exits, [
+            [(2, 0), (2, 2)],
+            [(2, 2), (2, 2)],
+            [(0, 0), (0, 0)],
+            [(2, 0), (0, 0)]])
+
+    def test_blocks_labeled_once(self):
+        self.inter = pinter.PietInterpreter(
+            "tests/test_images/find_adjacent_2_64.png", 64)
+        self.assertEqual([[self.inter.blocks.block_at(x, y).index
+                           for x in range(3)] for y in range(3)], [
+            [0, 0, 1],
+            [0, 2, 3],
+            [4, 3, 3]])
+        self.assertEqual([block.size for block in self.inter.blocks.blocks],
+                         [3, 1, 1, 3, 1])
+
+    def test_white_slide_cached(self):
+        self.inter = pinter.PietInterpreter(
+            "tests/test_images/endless_loop_64.png", 64)
+        outcome = self.inter.slides.slide(1, 0, pinter.DP.RIGHT,
+                                          pinter.CC.LEFT)
+        self.assertEqual(outcome, (False, 2, 0, pinter.DP.RIGHT,
+                                   pinter.CC.LEFT))
+        self.assertIs(self.inter.slides.slide(1, 0, pinter.DP.RIGHT,
+                                              pinter.CC.LEFT), outcome)
+
     def test_end_execution_on_single_block(self):
         self.inter = pinter.PietInterpreter(
             "tests/test_images/single_block_64.png", 64)
-        with self.assertRaises(SystemExit) as ecm:
+        with self.assertRaises(pvm.PietTrapped) as ecm:
             self.inter.piet_step()
-        self.assertEqual(ecm.exception.code, "trapped")
+        self.assertEqual(str(ecm.exception), "trapped")
 
     def test_end_execution_on_trapped(self):
         self.inter = pinter.PietInterpreter(
             "tests/test_images/execution_trapped_64.png", 64)
-        with self.assertRaises(SystemExit) as ecm:
+        with self.assertRaises(pvm.PietTrapped) as ecm:
             for _ in range(3):
                 self.inter.piet_step()
-        self.assertEqual(ecm.exception.code, "trapped")
+        self.assertEqual(str(ecm.exception), "trapped")
 
     def test_dont_break_on_endless_loop(self):
         self.inter = pinter.PietInterpreter(
@@ -88,28 +124,28 @@ class PietInterpreterTestCase(unittest.TestCase):
     def test_example_program_1(self):
         self.inter = pinter.PietInterpreter(
             "tests/test_images/example_1_64.png", 64)
-        with self.assertRaises(SystemExit) as ecm:
+        with self.assertRaises(pvm.PietTrapped) as ecm:
             for _ in range(10000):
                 self.inter.piet_step()
-        self.assertEqual(ecm.exception.code, "trapped")
+        self.assertEqual(str(ecm.exception), "trapped")
         self.assertEqual(self.inter.pvm.stack, [2])
 
     def test_example_program_2(self):
         self.inter = pinter.PietInterpreter(
             "tests/test_images/example_2_64.png", 64)
-        with self.assertRaises(SystemExit) as ecm:
+        with self.assertRaises(pvm.PietTrapped) as ecm:
             for _ in range(1000):
                 self.inter.piet_step()
-        self.assertEqual(ecm.exception.code, "trapped")
+        self.assertEqual(str(ecm.exception), "trapped")
         self.assertEqual(self.inter.pvm.stack, [11])
 
     def test_example_program_3(self):
         self.inter = pinter.PietInterpreter(
             "tests/test_images/example_3_64.png", 64)
-        with self.assertRaises(SystemExit) as ecm:
+        with self.assertRaises(pvm.PietTrapped) as ecm:
             for _ in range(1000):
                 self.inter.piet_step()
-        self.assertEqual(ecm.exception.code, "trapped")
+        self.assertEqual(str(ecm.exception), "trapped")
         self.assertEqual(self.inter.pvm.stack, [3, 1, 2])
 
 
@@ -0,0 +1,66 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                    os.path.pardir)
+SCRIPT = os.path.join(ROOT, "piet_interpreter_task.py")
+TEST_IMAGES = os.path.join(ROOT, "tests", "test_images")
+
+
+class PietInterpreterTaskTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.environment = dict(os.environ,
+                                PIET_VITVIT_CACHE=self.directory.name)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def run_script(self, *args):
+        return subprocess.run([sys.executable, SCRIPT, *args],
+                              capture_output=True, text=True, timeout=60,
+                              env=self.environment, cwd=ROOT)
+
+    def test_detect_cycles_with_cache(self):
+        # the first run stores the program with its prefix in the cache,
+        # the second one loads it; both find the cycle at its start
+        image = os.path.join(TEST_IMAGES, "endless_loop_64.png")
+        for limit in (), ("-l", "500000"):
+            for run in range(2):
+                with self.subTest(limit=limit, run=run):
+                    result = self.run_script(image, "-s", "64", *limit,
+                                             "--detect-cycles")
+                    self.assertEqual(result.returncode, 3, result.stdout)
+                    self.assertIn("Endless loop detected at step 1 (",
+                                  result.stdout)
+        self.assertTrue(os.listdir(self.directory.name))
+
+    def test_detect_cycles_needs_table_engine(self):
+        result = self.run_script(
+            os.path.join(TEST_IMAGES, "endless_loop_64.png"), "-s", "64",
+            "-e", "step", "--detect-cycles")
+        self.assertEqual(result.returncode, 1)
+        self.assertIn("Detecting cycles needs the table engine",
+                      result.stdout)
+
+    def test_cache_not_writable(self):
+        # the program runs the same, without storing itself
+        image = os.path.join(TEST_IMAGES, "example_3_64.png")
+        expected = self.run_script(image, "-s", "64")
+        blocker = os.path.join(self.directory.name, "file")
+        with open(blocker, "wb"):
+            pass
+        self.environment["PIET_VITVIT_CACHE"] = os.path.join(blocker,
+                                                             "cache")
+        result = self.run_script(image, "-s", "64")
+        self.assertEqual((result.returncode, result.stdout, result.stderr),
+                         (expected.returncode, expected.stdout,
+                          expected.stderr))
+
+
+if __name__ == "__main__":
+    unittest.main()
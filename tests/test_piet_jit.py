@@ -0,0 +1,82 @@
+import io
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir))
+
+from benchmarks import programs as bprograms
+from piet_vitvit import piet_api as papi
+from piet_vitvit import piet_engine as pengine
+from piet_vitvit import piet_jit as pjit
+from piet_vitvit import piet_vm as pvm
+
+
+class PietJITTestCase(unittest.TestCase):
+    def run_engine(self, program, steps, jit=None, chunk=None):
+        vm = pvm.PietVM(io.BytesIO(), io.BytesIO())
+        vm.input.interactive = False
+        engine = pengine.PietEngine(program.transitions, vm,
+                                    *program.start_codel)
+        engine.jit = jit
+        try:
+            while engine.step < steps:
+                engine.run(min(chunk or steps, steps - engine.step))
+        except pvm.PietTrapped:
+            pass
+        vm.output.flush()
+        return (engine.step, engine.state, engine.codel, vm.stack,
+                vm.output.stream.getvalue())
+
+    def test_same_as_engine(self):
+        for benchmark in (bprograms.nested_loops(20),
+                          bprograms.deep_rolls(50, 30),
+                          bprograms.printer(300)):
+            program = papi.compile(benchmark.to_png(), prefix_steps=0)
+            for steps in (100, 997, benchmark.limit):
+                expected = self.run_engine(program, steps)
+                for hot in (1, pjit.HOT_LOOP):
+                    with self.subTest(benchmark.name, steps=steps, hot=hot):
+                        jit = pjit.PietJIT(program.transitions, hot)
+                        self.assertEqual(
+                            self.run_engine(program, steps, jit), expected)
+
+    def test_run_in_parts(self):
+        program = papi.compile(bprograms.nested_loops(20).to_png(),
+                               prefix_steps=0)
+        expected = self.run_engine(program, 20000)
+        jit = pjit.PietJIT(program.transitions, 3)
+        self.assertEqual(self.run_engine(program, 20000, jit, chunk=37),
+                         expected)
+        self.assertTrue(jit.entered)
+
+    def test_counters(self):
+        program = papi.compile(bprograms.nested_loops(20).to_png(),
+                               prefix_steps=0)
+        jit = pjit.PietJIT(program.transitions)
+        steps = self.run_engine(program, 100000, jit)[0]
+        traces = [trace for trace in jit.traces.values() if trace]
+        self.assertTrue(traces)
+        self.assertGreater(jit.steps, steps // 2)
+        # every inner loop ends through a failed guard
+        self.assertGreater(jit.exits, 0)
+        self.assertLessEqual(jit.exits, jit.entered)
+        for trace in traces:
+            self.assertIn("stack.append(top)", trace.source)
+
+    def test_not_used_with_memory_limits(self):
+        program = papi.compile(bprograms.printer(30).to_png(),
+                               prefix_steps=0)
+        vm = pvm.PietVM(io.BytesIO(), io.BytesIO())
+        vm.limit_memory(max_depth=1)
+        engine = pengine.PietEngine(program.transitions, vm,
+                                    *program.start_codel)
+        engine.jit = pjit.PietJIT(program.transitions, 1)
+        with self.assertRaises(pvm.PietMemoryExceeded):
+            engine.run(10000)
+        self.assertEqual(engine.jit.traces, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
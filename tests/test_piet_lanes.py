@@ -0,0 +1,69 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir))
+
+from benchmarks import programs as bprograms
+from piet_vitvit import piet_api as papi
+from piet_vitvit import piet_lanes as planes
+
+
+def divider():
+    # reads two numbers and prints the first divided by the second, then
+    # turns as many times as the remainder says, before it stops
+    canvas = bprograms._Canvas()
+    canvas.fill(0, 0, 1, 1, bprograms.START_COLOR)
+    x, color = canvas.chain(0, 1, bprograms.START_COLOR,
+                            ["innum", "innum", "div", "dup", "outnum"],
+                            first=True)
+    canvas.exit(x - 1, 1, 1, 0, color, ["pointer"])
+    return bprograms.PietBenchmark("divider", canvas.get_matrix(), 100)
+
+
+class PietLanesTestCase(unittest.TestCase):
+    def assertSameResults(self, program, inputs, max_steps):
+        results = program.run_many(inputs, max_steps)
+        self.assertEqual(len(results), len(inputs))
+        for input, result in zip(inputs, results):
+            expected = program.run(input, max_steps)
+            with self.subTest(input=input):
+                self.assertEqual((result.reason, result.steps, result.output,
+                                  result.stack, type(result.error)),
+                                 (expected.reason, expected.steps,
+                                  expected.output, expected.stack,
+                                  type(expected.error)))
+
+    def test_same_as_run(self):
+        program = papi.compile(divider().to_png())
+        inputs = ["7 2", "8 2", "9 0", "-5 3", "", "1", "x", "100 7"]
+        for max_steps in (3, 5, 100):
+            with self.subTest(max_steps=max_steps):
+                self.assertSameResults(program, inputs, max_steps)
+
+    def test_branching_lanes(self):
+        program = papi.compile(bprograms.nested_loops(5).to_png())
+        self.assertSameResults(program, ["", "", ""], 500)
+        self.assertSameResults(program, [""], 100000)
+
+    def test_prefix(self):
+        benchmark = bprograms.printer(30)
+        program = papi.compile(benchmark.to_png())
+        plain = papi.compile(benchmark.to_png(), prefix_steps=0)
+        for max_steps in (10, program.prefix.steps + 1, 10000):
+            with self.subTest(max_steps=max_steps):
+                self.assertSameResults(program, ["", "x"], max_steps)
+                self.assertSameResults(plain, ["", "x"], max_steps)
+
+    def test_white_corridors(self):
+        program = papi.compile(bprograms.white_corridors(10).to_png())
+        self.assertSameResults(program, ["", "1"], 1000)
+
+    def test_no_lanes(self):
+        program = papi.compile(bprograms.printer(3).to_png())
+        self.assertEqual(planes.run_lanes(program, []), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
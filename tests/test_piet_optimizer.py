@@ -0,0 +1,134 @@
+import io
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir))
+
+from benchmarks import programs as bprograms
+from piet_vitvit import piet_api as papi
+from piet_vitvit import piet_engine as pengine
+from piet_vitvit import piet_interpreter as pinter
+from piet_vitvit import piet_optimizer as popt
+from piet_vitvit import piet_vm as pvm
+
+
+class PietOptimizerTestCase(unittest.TestCase):
+    inter = None
+
+    def load(self, filename, codel_size=64):
+        self.inter = pinter.PietInterpreter(
+            f"tests/test_images/{filename}", codel_size)
+        self.engine = pengine.PietEngine.from_interpreter(self.inter)
+        self.engine.optimizer = popt.PietOptimizer(self.engine.transitions)
+
+    def tearDown(self) -> None:
+        if self.inter is not None:
+            self.inter._dispose()
+
+    def fuse(self, commands, stack):
+        symbolic = popt._SymbolicStack()
+        for name, value in commands:
+            self.assertTrue(symbolic.apply(name, value))
+        run = popt.PietRun(len(commands), symbolic.depth, 0, None, 0,
+                           symbolic.get_source(), symbolic.constants)
+        run.function(stack)
+        return run, stack
+
+    def test_fold_constants(self):
+        run, stack = self.fuse([("piet_push", 4), ("piet_dup", 0),
+                                ("piet_mul", 0), ("piet_push", 3),
+                                ("piet_sub", 0)], [7])
+        self.assertEqual(stack, [7, 13])
+        self.assertEqual(run.depth, 0)
+        self.assertNotIn("t0", run.source)
+
+    def test_fuse_dup_mul(self):
+        run, stack = self.fuse([("piet_dup", 0), ("piet_mul", 0)], [2, 5])
+        self.assertEqual(stack, [2, 25])
+        self.assertEqual(run.depth, 1)
+
+    def test_fuse_roll(self):
+        run, stack = self.fuse([("piet_push", 3), ("piet_push", 1),
+                                ("piet_roll", 0)], [1, 2, 3, 4])
+        self.assertEqual(stack, [1, 4, 2, 3])
+
+    def test_keep_big_constants(self):
+        run, stack = self.fuse([("piet_push", 10 ** 30), ("piet_dup", 0),
+                                ("piet_mul", 0)], [])
+        self.assertEqual(stack, [10 ** 60])
+
+    def test_leave_division_by_zero(self):
+        symbolic = popt._SymbolicStack()
+        symbolic.apply("piet_push", 1)
+        symbolic.apply("piet_push", 0)
+        self.assertFalse(symbolic.apply("piet_div", 0))
+        self.assertFalse(symbolic.apply("piet_mod", 0))
+
+        symbolic = popt._SymbolicStack()
+        symbolic.apply("piet_push", 0)
+        symbolic.apply("piet_push", 1)
+        self.assertFalse(symbolic.apply("piet_roll", 0))
+
+    def test_same_as_interpreter(self):
+        for filename in ("example_1_64.png", "example_2_64.png",
+                         "example_3_64.png", "execution_trapped_64.png"):
+            with self.subTest(filename):
+                reference = pinter.PietInterpreter(
+                    f"tests/test_images/{filename}", 64)
+                with self.assertRaises(pvm.PietTrapped):
+                    for _ in range(1000):
+                        reference.piet_step()
+
+                self.load(filename)
+                with self.assertRaises(pvm.PietTrapped):
+                    self.engine.run(1000)
+                self.assertEqual(self.engine.step, reference.step)
+                self.assertEqual(self.inter.pvm.stack, reference.pvm.stack)
+
+    def test_eliminate_commands(self):
+        self.load("example_3_64.png")
+        with self.assertRaises(pvm.PietTrapped):
+            self.engine.run(1000)
+        self.assertEqual(self.engine.optimizer.fused, 1)
+        self.assertEqual(self.engine.optimizer.eliminated, 5)
+
+    def test_dont_fuse_past_steps_limit(self):
+        self.load("example_3_64.png")
+        self.engine.run(3)
+        self.assertEqual(self.engine.step, 3)
+        self.assertEqual(self.engine.optimizer.fused, 0)
+        self.assertEqual(self.inter.pvm.stack, [1, 2, 3])
+
+    def test_memory_limits(self):
+        # the stack gets deeper than the limit within a run and back, so
+        # the run stops at the same step with the optimizer as without it
+        canvas = bprograms._Canvas()
+        canvas.fill(0, 0, 1, 1, bprograms.START_COLOR)
+        canvas.chain(0, 1, bprograms.START_COLOR,
+                     ["push", "push", "add", "outnum"], first=True)
+        program = papi.compile(bprograms.PietBenchmark(
+            "peak", canvas.get_matrix(), 100).to_png(), prefix_steps=0)
+        for optimizer in (None, popt.PietOptimizer(program.transitions)):
+            with self.subTest(optimized=optimizer is not None):
+                vm = pvm.PietVM(io.BytesIO(), io.BytesIO())
+                vm.limit_memory(max_depth=1)
+                engine = pengine.PietEngine(program.transitions, vm,
+                                            *program.start_codel)
+                engine.optimizer = optimizer
+                with self.assertRaises(pvm.PietMemoryExceeded):
+                    engine.run(100)
+                self.assertEqual(engine.step, 2)
+
+    def test_count_values_read(self):
+        # with fewer values on the stack, the commands are executed one by
+        # one, to underflow exactly as they would
+        run, stack = self.fuse([("piet_dup", 0), ("piet_add", 0),
+                                ("piet_add", 0)], [1, 5])
+        self.assertEqual(run.depth, 2)
+        self.assertEqual(stack, [11])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir))
+
+from benchmarks import programs as bprograms
+from piet_vitvit import piet_api as papi
+from piet_vitvit import piet_cache as pcache
+from piet_vitvit import piet_prefix as pprefix
+
+
+def reader():
+    # prints 4, then reads a number and prints it plus one
+    canvas = bprograms._Canvas()
+    canvas.fill(0, 0, 1, 1, bprograms.START_COLOR)
+    x, color = canvas.chain(0, 1, bprograms.START_COLOR,
+                            ["push", "dup", "add", "outnum"], first=True)
+    canvas.exit(x - 1, 1, 1, 0, color, ["innum", "push", "add", "outnum"])
+    return bprograms.PietBenchmark("reader", canvas.get_matrix(), 100)
+
+
+class PietPrefixTestCase(unittest.TestCase):
+    def test_stops_before_input(self):
+        program = papi.compile(reader().to_png())
+        prefix = program.prefix
+        self.assertEqual((prefix.steps, prefix.output, prefix.stack),
+                         (4, "4", []))
+        self.assertFalse(prefix.trapped)
+        result = program.run("41")
+        self.assertEqual(result.output, b"442")
+        self.assertEqual(result.reason, papi.REASON_TRAPPED)
+
+    def test_input_free_program(self):
+        benchmark = bprograms.printer(30)
+        program = papi.compile(benchmark.to_png())
+        plain = papi.compile(benchmark.to_png(), prefix_steps=0)
+        self.assertIsNone(plain.prefix)
+        self.assertTrue(program.prefix.trapped)
+        for max_steps in (10, program.prefix.steps,
+                          program.prefix.steps + 1, 10000):
+            with self.subTest(max_steps=max_steps):
+                result = program.run(max_steps=max_steps)
+                expected = plain.run(max_steps=max_steps)
+                self.assertEqual((result.reason, result.steps, result.output,
+                                  result.stack),
+                                 (expected.reason, expected.steps,
+                                  expected.output, expected.stack))
+
+    def test_step_budget(self):
+        benchmark = bprograms.printer(30)
+        program = papi.compile(benchmark.to_png(), prefix_steps=100)
+        self.assertEqual(program.prefix.steps, 100)
+        self.assertFalse(program.prefix.trapped)
+        self.assertEqual(program.run(max_steps=10000).output,
+                         benchmark.output)
+
+    def test_memory_limits_run_whole(self):
+        program = papi.compile(bprograms.printer(30).to_png())
+        result = program.run(max_steps=10000, max_depth=1)
+        self.assertEqual(result.reason, papi.REASON_MEMORY)
+        self.assertEqual(result.steps, 2)
+
+    def test_stored_with_program(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = pcache.PietCache(directory)
+            image = reader().to_png()
+            papi.compile(image, cache=cache)
+            program = papi.compile(image, cache=cache)
+            self.assertIsInstance(program.transitions,
+                                  pcache.PietCachedTransitions)
+            self.assertEqual(program.prefix.steps, 4)
+            self.assertEqual(program.run("1").output, b"42")
+
+    def test_steps_in_cache_key(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = pcache.PietCache(directory)
+            image = bprograms.printer(30).to_png()
+            short = papi.compile(image, cache=cache, prefix_steps=100)
+            full = papi.compile(image, cache=cache)
+            self.assertEqual(short.prefix.steps, 100)
+            self.assertTrue(full.prefix.trapped)
+            self.assertEqual(
+                papi.compile(image, cache=cache, prefix_steps=100)
+                .prefix.steps, 100)
+
+    def test_fits(self):
+        prefix = pprefix.PietPrefix(7, 0, (0, 0), [], "")
+        self.assertTrue(prefix.fits(7))
+        self.assertFalse(prefix.fits(6))
+
+    def test_round_trip(self):
+        prefix = pprefix.PietPrefix(7, 42, (3, 4), [1, -2, 2 ** 70],
+                                    "ab\udc80", True)
+        loaded = pprefix.PietPrefix.from_bytes(prefix.to_bytes())
+        self.assertEqual((loaded.steps, loaded.state, loaded.codel,
+                          loaded.stack, loaded.output, loaded.trapped),
+                         (7, 42, (3, 4), [1, -2, 2 ** 70], "ab\udc80", True))
+        with self.assertRaises(ValueError):
+            pprefix.PietPrefix.from_bytes(prefix.to_bytes()[:-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
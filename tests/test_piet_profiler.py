@@ -0,0 +1,95 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir))
+
+from piet_vitvit import piet_engine as pengine
+from piet_vitvit import piet_interpreter as pinter
+from piet_vitvit import piet_profiler as pprof
+from piet_vitvit import piet_vm as pvm
+
+
+class PietProfilerTestCase(unittest.TestCase):
+    def profile(self, filename, engine=True, steps=1000):
+        self.inter = pinter.PietInterpreter(
+            f"tests/test_images/{filename}", 64)
+        self.profiler = pprof.PietProfiler(sample_every=1)
+        self.inter.profiler = self.profiler
+        try:
+            if engine:
+                table_engine = pengine.PietEngine.from_interpreter(self.inter)
+                table_engine.profiler = self.profiler
+                table_engine.run(steps)
+            else:
+                for _ in range(steps):
+                    self.inter.piet_step()
+        except pvm.PietTrapped:
+            pass
+        return self.profiler
+
+    def tearDown(self) -> None:
+        return self.inter._dispose()
+
+    def test_engine_same_as_interpreter(self):
+        for filename in ("example_1_64.png", "example_2_64.png",
+                         "example_3_64.png", "execution_trapped_64.png"):
+            with self.subTest(filename):
+                reference = self.profile(filename, engine=False)
+                self.inter._dispose()
+                profiler = self.profile(filename)
+                self.assertEqual(profiler.steps, reference.steps)
+                self.assertEqual(dict(profiler.blocks),
+                                 dict(reference.blocks))
+                self.assertEqual(dict(profiler.commands),
+                                 dict(reference.commands))
+                self.assertEqual(profiler.max_depth, reference.max_depth)
+
+    def test_count_commands(self):
+        profiler = self.profile("example_1_64.png")
+        self.assertEqual(profiler.steps, 4)
+        push = pengine.COMMAND_NAMES.index("piet_push")
+        self.assertEqual(profiler.commands[push], 2)
+        self.assertEqual(profiler.commands[pengine.COMMAND_TRAP], 1)
+        self.assertEqual(profiler.command_samples[push], 2)
+
+    def test_stack_high_water_mark(self):
+        profiler = self.profile("example_1_64.png")
+        self.assertEqual(profiler.max_depth, 2)
+        self.assertEqual(profiler.max_depth_step, 2)
+
+    def test_count_skipped_white_steps(self):
+        profiler = self.profile("endless_loop_64.png", steps=10000)
+        self.assertEqual(profiler.steps, 10000)
+        self.assertEqual(sum(profiler.blocks.values()), 10000)
+
+    def test_report(self):
+        profiler = self.profile("example_1_64.png")
+        report = profiler.get_report(self.inter.blocks).splitlines()
+        self.assertEqual(report[0], "[PROFILE] 4 steps")
+        self.assertIn("PUSH", report[2])
+        self.assertIn("block 3 at (3, 0), 8 codels: 1 (25.0%)",
+                      "\n".join(report))
+
+    def test_resolution_time(self):
+        # the table engine times resolving each state once, the interpreter
+        # every step's
+        report = self.profile("example_2_64.png").get_report()
+        self.assertIn("states once (one-time cost", report)
+        self.inter._dispose()
+        profiler = self.profile("example_2_64.png", engine=False)
+        self.assertRegex(profiler.get_report(), r"s in \d+ resolutions")
+        self.assertEqual(profiler.resolved, profiler.steps)
+
+    def test_heat_map_size(self):
+        profiler = self.profile("example_1_64.png")
+        heat_map = profiler.get_heat_map(self.inter.image, self.inter.blocks,
+                                         self.inter.codel_size)
+        self.assertEqual(heat_map.size, self.inter.image.size)
+        red, green, blue = heat_map.getpixel((0, 0))
+        self.assertGreater(red, blue)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir))
+
+from benchmarks import programs as bprograms
+from piet_vitvit import piet_api as papi
+from piet_vitvit import piet_engine as pengine
+from piet_vitvit import piet_recorder as precorder
+from piet_vitvit import piet_vm as pvm
+
+
+class PietRecorderTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "run.piettrace")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def get_engine(self, program):
+        vm = pvm.PietVM(io.BytesIO(), io.BytesIO())
+        return pengine.PietEngine(program.transitions, vm,
+                                  *program.start_codel)
+
+    def record(self, benchmark, steps, keyframe_every=16):
+        # the state and the stack after every step, and the trace of them
+        program = papi.compile(benchmark.to_png())
+        engine = self.get_engine(program)
+        states = [(engine.state, [])]
+        for _ in range(steps):
+            engine.run(1)
+            states.append((engine.state, list(engine.pvm.stack)))
+
+        engine = self.get_engine(program)
+        with precorder.PietRecorder(self.path, keyframe_every) as recorder:
+            engine.recorder = recorder
+            engine.run(steps // 3)
+            engine.run(steps - steps // 3)
+        return states, engine
+
+    def assert_at(self, replay, states):
+        self.assertEqual((replay.state, replay.stack), states[replay.step])
+
+    def test_replay_forward(self):
+        states, engine = self.record(bprograms.printer(30), 300)
+        with precorder.PietReplay(self.path) as replay:
+            self.assertEqual(replay.last_step, 300)
+            output = []
+            while replay.forward():
+                self.assert_at(replay, states)
+                output.append(replay.output)
+        self.assertEqual("".join(output).encode(), self.get_output(engine))
+
+    def test_replay_backward(self):
+        states, _ = self.record(bprograms.deep_rolls(20, 15), 300)
+        with precorder.PietReplay(self.path) as replay:
+            replay.seek(300)
+            self.assert_at(replay, states)
+            while replay.back():
+                self.assert_at(replay, states)
+            self.assertEqual(replay.step, 0)
+
+    def test_seek(self):
+        states, _ = self.record(bprograms.nested_loops(5), 300)
+        with precorder.PietReplay(self.path) as replay:
+            for step in (250, 17, 16, 0, 299, 1000, 33):
+                replay.seek(step)
+                self.assertEqual(replay.step, min(step, 300))
+                self.assert_at(replay, states)
+
+    def test_trap_recorded(self):
+        program = papi.compile(bprograms.printer(2).to_png())
+        engine = self.get_engine(program)
+        with precorder.PietRecorder(self.path) as recorder:
+            engine.recorder = recorder
+            with self.assertRaises(pvm.PietTrapped):
+                engine.run(1000)
+        with precorder.PietReplay(self.path) as replay:
+            replay.seek(engine.step)
+            self.assertEqual(replay.step, engine.step)
+            self.assertEqual(replay.get_command_name(), "TRAP")
+
+    def test_damaged_trace(self):
+        self.record(bprograms.printer(30), 100)
+        with open(self.path, "rb") as file:
+            data = file.read()
+        for damaged in (data[:8], data[:-1], b"PIETTRAQ" + data[8:]):
+            with open(self.path, "wb") as file:
+                file.write(damaged)
+            with self.assertRaises(ValueError):
+                with precorder.PietReplay(self.path) as replay:
+                    replay.seek(100)
+
+    def get_output(self, engine):
+        engine.pvm.output.flush()
+        return engine.pvm.output.stream.getvalue()
+
+
+if __name__ == "__main__":
+    unittest.main()
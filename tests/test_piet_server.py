@@ -0,0 +1,157 @@
+import asyncio
+import base64
+import json
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir))
+
+from benchmarks import programs as bprograms
+from piet_vitvit import piet_server as pserver
+
+
+def read_image(filename):
+    with open(f"tests/test_images/{filename}", "rb") as file:
+        return file.read()
+
+
+class PietServerTestCase(unittest.TestCase):
+    def serve(self, test, **options):
+        async def run():
+            server = pserver.PietServer(**options)
+            listener = await server.start(port=0)
+            try:
+                return await test(server, listener.sockets[0].getsockname())
+            finally:
+                listener.close()
+                await server.close()
+        return asyncio.run(run())
+
+    def test_run_program(self):
+        async def test(server, address):
+            image = read_image("!debug_1_100.png")
+            first = await server.run_program(image, 100)
+            second = await server.run_program(image, 100, limit=2)
+            third = await server.run_program(image, 100)
+            return first, second, third, server.get_metrics()
+
+        first, second, third, metrics = self.serve(test, workers=1)
+        self.assertEqual((first["reason"], first["output"]), ("trapped", "5"))
+        self.assertEqual((second["reason"], second["steps"]), ("limit", 2))
+        self.assertEqual(third["output"], first["output"])
+        # a program is compiled again for another limit
+        self.assertEqual(metrics["cache"]["hits"], 1)
+        self.assertEqual(metrics["cache"]["misses"], 2)
+        self.assertEqual(metrics["completed"], 3)
+        self.assertIsNotNone(metrics["latency"]["p99"])
+
+    def test_limits_capped(self):
+        async def test(server, address):
+            return await server.run_program(read_image("endless_loop_64.png"),
+                                            64, limit=10 ** 9)
+
+        result = self.serve(test, workers=1, limit=100)
+        self.assertEqual((result["reason"], result["steps"]), ("limit", 100))
+
+    def test_prefix_within_limit(self):
+        async def test(server, address):
+            image = read_image("endless_loop_64.png")
+            await server.run_program(image, 64)
+            await server.run_program(image, 64, limit=100)
+            return image, list(server.programs)
+
+        image, keys = self.serve(test, workers=1)
+        self.assertEqual(keys, [
+            pserver.get_key(image, 64, pserver.DEFAULT_LIMIT - 1),
+            pserver.get_key(image, 64, 99)])
+
+    def test_reject_when_queue_full(self):
+        async def test(server, address):
+            image = read_image("example_1_64.png")
+            return await asyncio.gather(
+                *(server.run_program(image, 64) for _ in range(3)),
+                return_exceptions=True)
+
+        results = self.serve(test, workers=1, queue_size=1)
+        self.assertEqual(results[0]["reason"], "trapped")
+        for result in results[1:]:
+            self.assertIsInstance(result, pserver.PietRequestError)
+            self.assertEqual(result.status, 503)
+
+    def test_skip_abandoned(self):
+        async def test(server, address):
+            compiled = []
+            get_rows = server._get_rows
+
+            async def record_rows(image_bytes, *args):
+                compiled.append(image_bytes)
+                return await get_rows(image_bytes, *args)
+
+            server._get_rows = record_rows
+            busy = bprograms.huge_block(10).to_png()
+            waiting = read_image("example_1_64.png")
+            running = asyncio.create_task(
+                server.run_program(busy, limit=10 ** 9, timeout=1.0))
+            await asyncio.sleep(0.2)
+            # the worker is busy and the queue holds the waiting request
+            timed_out, rejected = await asyncio.gather(
+                server.run_program(waiting, 64, timeout=0.01),
+                server.run_program(waiting, 64),
+                return_exceptions=True)
+            await running
+            await asyncio.sleep(0.1)
+            return compiled, timed_out, rejected, server.get_metrics()
+
+        grace = pserver.TIMEOUT_GRACE
+        pserver.TIMEOUT_GRACE = 0.1
+        try:
+            compiled, timed_out, rejected, metrics = self.serve(
+                test, workers=1, queue_size=1, limit=10 ** 9)
+        finally:
+            pserver.TIMEOUT_GRACE = grace
+        self.assertEqual(timed_out["reason"], "timeout")
+        self.assertIsInstance(rejected, pserver.PietRequestError)
+        self.assertEqual(len(compiled), 1)
+        self.assertEqual(metrics["abandoned"], 1)
+        self.assertEqual(metrics["queued"], 0)
+
+    def test_http(self):
+        async def request(address, method, path, body=b"", size=None):
+            reader, writer = await asyncio.open_connection(*address[:2])
+            size = len(body) if size is None else size
+            writer.write(f"{method} {path} HTTP/1.1\r\n"
+                         f"Content-Length: {size}\r\n\r\n".encode()
+                         + body)
+            response = await reader.read()
+            writer.close()
+            head, _, data = response.partition(b"\r\n\r\n")
+            return int(head.split()[1]), json.loads(data)
+
+        async def test(server, address):
+            body = json.dumps({
+                "image": base64.b64encode(
+                    read_image("example_3_64.png")).decode(),
+                "codel_size": 64}).encode()
+            return [await request(address, "POST", "/run", body),
+                    await request(address, "POST", "/run", b"{}"),
+                    await request(address, "POST", "/run", b"{}", -1),
+                    await request(address, "GET", "/run"),
+                    await request(address, "GET", "/nothing"),
+                    await request(address, "GET", "/metrics")]
+
+        run, bad, negative, method, missing, metrics = self.serve(
+            test, workers=1)
+        self.assertEqual(run, (200, {**run[1], "reason": "trapped",
+                                     "stack": [3, 1, 2]}))
+        self.assertEqual(bad[0], 400)
+        self.assertEqual(negative, (400, {"error": "bad Content-Length"}))
+        self.assertEqual(method[0], 405)
+        self.assertEqual(missing[0], 404)
+        self.assertEqual(metrics[0], 200)
+        self.assertEqual(metrics[1]["requests"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
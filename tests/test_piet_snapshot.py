@@ -0,0 +1,114 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir))
+
+from benchmarks import programs as bprograms
+from piet_vitvit import piet_api as papi
+from piet_vitvit import piet_engine as pengine
+from piet_vitvit import piet_io as pio
+from piet_vitvit import piet_snapshot as psnap
+from piet_vitvit import piet_vm as pvm
+
+
+def get_vm(input_bytes=b""):
+    vm = pvm.PietVM(io.BytesIO(input_bytes), io.BytesIO())
+    vm.input.interactive = False
+    return vm
+
+
+class PietSnapshotTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "state.pietsnap")
+        self.writer = psnap.PietSnapshotWriter(self.path, b"d" * 32)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        vm = get_vm(b"12 34")
+        vm.dp, vm.cc = pvm.DP.LEFT, pvm.CC.RIGHT
+        vm.stack = [1, -2, 2 ** 100, -(3 ** 70)] + list(range(10000))
+        vm.piet_innum()
+        vm.output.write("x")
+        self.writer.save(42, 3, 4, vm)
+
+        snapshot = psnap.load_snapshot(self.path)
+        self.assertEqual(snapshot.digest, b"d" * 32)
+        self.assertEqual(snapshot.step, 42)
+        self.assertEqual(snapshot.codel, (3, 4))
+        restored = get_vm(b"12 34")
+        snapshot.restore(restored)
+        self.assertEqual(restored.dp, pvm.DP.LEFT)
+        self.assertEqual(restored.cc, pvm.CC.RIGHT)
+        self.assertEqual(restored.stack, vm.stack)
+        self.assertFalse(restored.output.line_start)
+        restored.piet_innum()
+        self.assertEqual(restored.stack[-1], 34)
+
+    def test_unchanged_chunks_reused(self):
+        vm = get_vm()
+        vm.stack = list(range(psnap.CHUNK_SIZE * 3))
+        self.writer.save(1, 0, 0, vm)
+        chunks = list(self.writer._chunks)
+        vm.stack[-1] = -1
+        self.writer.save(2, 0, 0, vm)
+        self.assertIs(self.writer._chunks[0], chunks[0])
+        self.assertIs(self.writer._chunks[1], chunks[1])
+        self.assertIsNot(self.writer._chunks[2], chunks[2])
+        self.assertEqual(psnap.load_snapshot(self.path).stack, vm.stack)
+
+    def test_damaged_snapshot(self):
+        vm = get_vm()
+        vm.stack = [1, 2, 3]
+        self.writer.save(1, 0, 0, vm)
+        with open(self.path, "rb") as file:
+            data = file.read()
+        for damaged in (data[:-1], data + b"\0", b"PIETSNAQ" + data[8:]):
+            with open(self.path, "wb") as file:
+                file.write(damaged)
+            with self.assertRaises(ValueError):
+                psnap.load_snapshot(self.path)
+
+    def test_input_state_of_text_stream(self):
+        reader = pio.PietInput(io.StringIO("ab 15 c"), interactive=False)
+        reader.read_char()
+        state = reader.get_state()
+        restored = pio.PietInput(io.StringIO("ab 15 c"), interactive=False)
+        restored.set_state(state)
+        self.assertEqual(restored.read_char(), ord("b"))
+        self.assertEqual(restored.read_number(), 15)
+
+    def test_resumed_run_same_as_whole(self):
+        benchmark = bprograms.printer(30)
+        program = papi.compile(benchmark.to_png())
+        whole = get_vm()
+        engine = pengine.PietEngine(program.transitions, whole,
+                                    *program.start_codel)
+        engine.run(500)
+
+        vm = get_vm()
+        engine = pengine.PietEngine(program.transitions, vm,
+                                    *program.start_codel)
+        engine.run(217)
+        self.writer.save(engine.step, *engine.codel, vm)
+        snapshot = psnap.load_snapshot(self.path)
+        resumed = get_vm()
+        snapshot.restore(resumed)
+        engine = pengine.PietEngine(program.transitions, resumed,
+                                    *snapshot.codel)
+        engine.step = snapshot.step
+        engine.run(500 - engine.step)
+        self.assertEqual(resumed.stack, whole.stack)
+        self.assertEqual(vm.output.stream.getvalue()
+                         + resumed.output.stream.getvalue(),
+                         whole.output.stream.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
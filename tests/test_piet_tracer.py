@@ -0,0 +1,112 @@
+import io
+import os
+import sys
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir))
+
+from piet_vitvit import piet_colors as pcolors
+from piet_vitvit import piet_interpreter as pinter
+from piet_vitvit import piet_tracer as ptracer
+from piet_vitvit import piet_vm as pvm
+
+
+class RecordingTracer(ptracer.PietTracer):
+    def __init__(self):
+        self.events = []
+
+    def step_started(self, step):
+        self.events.append(("step", step))
+
+    def rotated(self, iteration, dp, cc):
+        self.events.append(("rotated", iteration))
+
+    def white_slid(self, x, y, dp, cc):
+        self.events.append(("slid", x, y))
+
+    def trapped(self):
+        self.events.append(("trapped",))
+
+    def command_executed(self, command, value, popped, pushed, dp, cc):
+        self.events.append((command, value))
+
+    def stack_changed(self, stack):
+        self.events.append(("stack", list(stack)))
+
+
+class PietTracerTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.inter = pinter.PietInterpreter(
+            "tests/test_images/example_3_64.png", 64)
+
+    def tearDown(self) -> None:
+        return self.inter._dispose()
+
+    def run_program(self, inter):
+        with self.assertRaises(pvm.PietTrapped):
+            for _ in range(1000):
+                inter.piet_step()
+
+    def test_same_as_untraced(self):
+        reference = pinter.PietInterpreter(
+            "tests/test_images/example_3_64.png", 64)
+        self.run_program(reference)
+        self.inter.tracer = RecordingTracer()
+        self.run_program(self.inter)
+        self.assertEqual(self.inter.step, reference.step)
+        self.assertEqual(self.inter.pvm.stack, reference.pvm.stack)
+
+    def test_report_events(self):
+        tracer = self.inter.tracer = RecordingTracer()
+        self.run_program(self.inter)
+        self.assertEqual(tracer.events[:3], [
+            ("step", 1), ("piet_push", 1), ("stack", [1])])
+        self.assertEqual(tracer.events[-1], ("trapped",))
+        self.assertIn(("rotated", 9), tracer.events)
+
+    def test_no_events_without_tracer(self):
+        with mock.patch.object(ptracer.PietTracer, "step_started") as event:
+            self.run_program(self.inter)
+        event.assert_not_called()
+
+    def test_console_tracer(self):
+        self.inter.start_debug()
+        output = io.StringIO()
+        with mock.patch("builtins.input") as prompt, \
+                redirect_stdout(output):
+            self.inter.piet_step()
+        self.assertIn("[INTER] START STEP 1", output.getvalue())
+        self.assertIn("[VM] PUSH 1", output.getvalue())
+        self.assertIn("[VM] stack: [1]", output.getvalue())
+        prompt.assert_called_with("...")
+
+    def test_console_operands(self):
+        tracer = ptracer.ConsoleTracer()
+        output = io.StringIO()
+        with redirect_stdout(output):
+            tracer.color_shifted(pcolors.COLORS[0], pcolors.COLORS[6])
+            tracer.command_executed("piet_add", 1, [2, 3], [5],
+                                    pvm.DP.RIGHT, pvm.CC.LEFT)
+            tracer.command_executed("piet_roll", 1, [3, 1], [],
+                                    pvm.DP.RIGHT, pvm.CC.LEFT)
+            tracer.command_executed("piet_pointer", 1, [1], [],
+                                    pvm.DP.DOWN, pvm.CC.LEFT)
+            tracer.command_executed("piet_outchar", 1, [65], [],
+                                    pvm.DP.DOWN, pvm.CC.LEFT)
+            tracer.command_executed("piet_sub", 1, [4], [],
+                                    pvm.DP.DOWN, pvm.CC.LEFT)
+        self.assertEqual(output.getvalue().splitlines(), [
+            "[INTER] Moving there...",
+            "[INTER] LIGHT RED -> NORMAL RED",
+            "[VM] ADD 2+3",
+            "[VM] ROLL 1 3",
+            "[VM] POINTER DOWN",
+            "[VM] OUTCHAR 65",
+            "[VM] Stack underflow!"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,7 @@
+import io
 import os
 import sys
 import unittest
-from contextlib import contextmanager
 
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
                              os.path.pardir))
@@ -9,30 +9,6 @@ sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
 from piet_vitvit import piet_vm as pvm
 
 
-last_mocked_output = ""
-
-
-def mock_print(output):
-    global last_mocked_output
-    last_mocked_output = str(output)
-
-
-@contextmanager
-def mocked_input(input):
-    original_input = pvm.__builtins__["input"]
-    pvm.__builtins__["input"] = lambda _: input
-    yield
-    pvm.__builtins__["input"] = original_input
-
-
-@contextmanager
-def mocked_print():
-    original_print = pvm.__builtins__["print"]
-    pvm.__builtins__["print"] = lambda output: mock_print(output)
-    yield
-    pvm.__builtins__["print"] = original_print
-
-
 class PietVMCommandsTestCase(unittest.TestCase):
     def setUp(self) -> None:
         self.vm = pvm.PietVM()
@@ -183,57 +159,127 @@ class PietVMCommandsTestCase(unittest.TestCase):
         self.assertEqual(self.vm.stack, [10, 20, 30, 40, 50],
                          "Should skip on non-positive depth!")
 
+    def test_roll_deeper_than_stack(self):
+        self.vm.stack = [10, 20, 30, 5, 1]
+        self.vm.piet_roll()
+        self.assertEqual(self.vm.stack, [30, 10, 20])
+        self.vm.stack = [10, 20, 30, 5, 4]
+        self.vm.piet_roll()
+        self.assertEqual(self.vm.stack, [10, 20, 30])
+
+    def test_roll_in_place(self):
+        stack = list(range(1000)) + [1000, 999]
+        self.vm.stack = stack
+        self.vm.piet_roll()
+        self.assertIs(self.vm.stack, stack)
+        self.assertEqual(stack, list(range(1, 1000)) + [0])
+
+    def test_max_depth(self):
+        self.vm.limit_memory(max_depth=2)
+        self.vm.stack = [42]
+        self.vm.piet_dup()
+        with self.assertRaises(pvm.PietMemoryExceeded):
+            self.vm.piet_push()
+
+    def test_max_bits(self):
+        self.vm.limit_memory(max_bits=64)
+        self.vm.stack = [2 ** 40, 2 ** 20]
+        self.vm.piet_mul()
+        self.vm.piet_dup()
+        with self.assertRaises(pvm.PietMemoryExceeded):
+            self.vm.piet_mul()
+
     def test_innum(self):
-        with mocked_input("42"):
-            self.vm.stack = []
-            self.vm.piet_innum()
-            self.assertEqual(self.vm.stack, [42])
+        self.vm = pvm.PietVM(io.StringIO("42"))
+        self.vm.stack = []
+        self.vm.piet_innum()
+        self.assertEqual(self.vm.stack, [42])
 
     def test_innum_on_bad_input(self):
-        with mocked_input("bad input"):
-            self.vm.stack = []
+        self.vm = pvm.PietVM(io.StringIO("bad input"))
+        self.vm.stack = []
+        self.vm.piet_innum()
+        self.assertEqual(self.vm.stack, [],
+                         "Should skip on bad input!")
+
+    def test_innum_reads_tokens(self):
+        self.vm = pvm.PietVM(io.StringIO(" 12 -3\n\n7"))
+        self.vm.stack = []
+        for _ in range(4):
             self.vm.piet_innum()
-            self.assertEqual(self.vm.stack, [],
-                             "Should skip on bad input!")
+        self.assertEqual(self.vm.stack, [12, -3, 7])
 
     def test_inchar(self):
-        with mocked_input("*"):
-            self.vm.stack = []
-            self.vm.piet_inchar()
-            self.assertEqual(self.vm.stack, [42])
-
-    def test_inchar_on_bad_input(self):
-        with mocked_input("bad input"):
-            self.vm.stack = []
-            self.vm.piet_inchar()
-            self.assertEqual(self.vm.stack, [],
-                             "Should skip on bad input!")
+        self.vm = pvm.PietVM(io.StringIO("*"))
+        self.vm.stack = []
+        self.vm.piet_inchar()
+        self.assertEqual(self.vm.stack, [42])
+
+    def test_inchar_on_end_of_input(self):
+        self.vm = pvm.PietVM(io.StringIO(""))
+        self.vm.stack = []
+        self.vm.piet_inchar()
+        self.assertEqual(self.vm.stack, [],
+                         "Should skip on end of input!")
+
+    def test_inchar_from_binary_stream(self):
+        self.vm = pvm.PietVM(io.BytesIO("\u00e9\n".encode()))
+        self.vm.stack = []
+        self.vm.piet_inchar()
+        self.vm.piet_inchar()
+        self.assertEqual(self.vm.stack, [233, 10])
 
     def test_outnum(self):
-        with mocked_print():
-            self.vm.stack = [42]
-            self.vm.piet_outnum()
-            self.assertEqual(last_mocked_output, "42")
+        output = io.StringIO()
+        self.vm = pvm.PietVM(stdout=output)
+        self.vm.stack = [42, 42]
+        self.vm.piet_outnum()
+        self.vm.piet_outnum()
+        self.vm.output.flush()
+        self.assertEqual(output.getvalue(), "4242")
 
     def test_outnum_should_pop(self):
-        with mocked_print():
-            self.vm.stack = [42]
-            self.vm.piet_outnum()
-            self.assertEqual(self.vm.stack, [],
-                             "outnum() should pop from stack!")
+        self.vm = pvm.PietVM(stdout=io.StringIO())
+        self.vm.stack = [42]
+        self.vm.piet_outnum()
+        self.assertEqual(self.vm.stack, [],
+                         "outnum() should pop from stack!")
 
     def test_outchar(self):
-        with mocked_print():
-            self.vm.stack = [42]
-            self.vm.piet_outchar()
-            self.assertEqual(last_mocked_output, "*")
+        output = io.BytesIO()
+        self.vm = pvm.PietVM(stdout=output)
+        self.vm.stack = [233, 42]
+        self.vm.piet_outchar()
+        self.vm.piet_outchar()
+        self.vm.output.flush()
+        self.assertEqual(output.getvalue(), "*\u00e9".encode())
 
     def test_outchar_should_pop(self):
-        with mocked_print():
-            self.vm.stack = [42]
-            self.vm.piet_outchar()
-            self.assertEqual(self.vm.stack, [],
-                             "outchar() should pop from stack!")
+        self.vm = pvm.PietVM(stdout=io.StringIO())
+        self.vm.stack = [42]
+        self.vm.piet_outchar()
+        self.assertEqual(self.vm.stack, [],
+                         "outchar() should pop from stack!")
+
+    def test_output_flushed_on_newline(self):
+        output = io.StringIO()
+        self.vm = pvm.PietVM(stdout=output)
+        self.vm.output.flush_policy = "line"
+        self.vm.stack = [10, 42]
+        self.vm.piet_outchar()
+        self.assertEqual(output.getvalue(), "")
+        self.vm.piet_outchar()
+        self.assertEqual(output.getvalue(), "*\n")
+
+    def test_output_flushed_when_full(self):
+        output = io.StringIO()
+        self.vm = pvm.PietVM(stdout=output)
+        self.vm.output.buffer_size = 4
+        self.vm.stack = [123, 10]
+        self.vm.piet_outnum()
+        self.assertEqual(output.getvalue(), "")
+        self.vm.piet_outnum()
+        self.assertEqual(output.getvalue(), "10123")
 
 
 if __name__ == "__main__":